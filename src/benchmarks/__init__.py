@@ -0,0 +1,52 @@
+"""Micro-benchmarks of the hot paths of the pipeline. Each one is a module
+run from `src/`, with the same environment as `manage.py`:
+
+    python -m benchmarks.parsed_messages
+"""
+
+import gc
+import os
+import timeit
+import tracemalloc
+from pathlib import Path
+from typing import Callable
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core_config.settings")
+django.setup()
+
+# The saved course pages of the parser tests
+TEST_DATA = Path(__file__).parent.parent / "lms_public" / "test_data"
+
+
+def time_per_call(function: Callable, number: int, repeat: int = 5) -> float:
+    """Time a function, best of `repeat` runs
+
+    Args:
+        function (Callable): The function, called without arguments
+        number (int): Calls per run
+        repeat (int, optional): Runs. Defaults to 5.
+
+    Returns:
+        (float): Microseconds per call
+    """
+    best = min(timeit.repeat(function, number=number, repeat=repeat))
+    return best / number * 1e6
+
+
+def memory_per_item(build: Callable[[], list]) -> float:
+    """Measure the memory held by the items a function builds
+
+    Args:
+        build (Callable[[], list]): Builds and returns the items
+
+    Returns:
+        (float): Bytes held per item
+    """
+    gc.collect()
+    tracemalloc.start()
+    items = build()
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return held / len(items)
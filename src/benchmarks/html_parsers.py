@@ -0,0 +1,31 @@
+"""Parsing the saved course page of the parser tests with each tree builder
+`settings.LMS_HTML_PARSER` takes, per page and per wall item
+
+    python -m benchmarks.html_parsers
+"""
+
+from django.test import override_settings
+
+from benchmarks import TEST_DATA, time_per_call
+from lms_public.services.parsers import parse_wall
+
+# The tree builders bs4 takes for LMS pages
+HTML_PARSERS = ("html.parser", "lxml")
+
+
+def main() -> None:
+    page = (TEST_DATA / "course_wall.html").read_text()
+    item_count = len(parse_wall(page))
+
+    print(f"A page of {len(page)} characters and {item_count} items:")
+    for html_parser in HTML_PARSERS:
+        with override_settings(LMS_HTML_PARSER=html_parser):
+            seconds = time_per_call(lambda: parse_wall(page), number=200)
+        print(
+            f"  {html_parser:<12} {seconds:8.1f} us/page "
+            f"{seconds / item_count:6.1f} us/item"
+        )
+
+
+if __name__ == "__main__":
+    main()
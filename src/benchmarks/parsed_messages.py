@@ -0,0 +1,39 @@
+"""Building scraped wall items as slotted `ParsedMessage` records against
+building them as unsaved `WallItem` models, per item, in time and memory
+
+    python -m benchmarks.parsed_messages
+"""
+
+from dataclasses import asdict
+
+from benchmarks import TEST_DATA, memory_per_item, time_per_call
+from lms_public.models import WallItem
+from lms_public.services.parsers import ParsedMessage, parse_wall
+
+# About the items of 100 course pages
+ITEM_COUNT = 3000
+
+
+def main() -> None:
+    page = (TEST_DATA / "course_wall.html").read_text()
+    scraped = [asdict(message) for message in parse_wall(page)]
+    items = (scraped * ITEM_COUNT)[:ITEM_COUNT]
+
+    def build_records() -> list:
+        return [ParsedMessage(**fields) for fields in items]
+
+    def build_models() -> list:
+        return [WallItem(suffix_url="/group/1", **fields) for fields in items]
+
+    print(f"{ITEM_COUNT} items of {len(scraped)} kinds, per item:")
+    for name, build in (
+        ("ParsedMessage", build_records),
+        ("unsaved WallItem", build_models),
+    ):
+        seconds = time_per_call(build, number=10) / ITEM_COUNT
+        size = memory_per_item(build)
+        print(f"  {name:<17} {seconds:6.2f} us {size:6.0f} B")
+
+
+if __name__ == "__main__":
+    main()
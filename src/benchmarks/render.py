@@ -0,0 +1,145 @@
+"""Rendering 100k notification bodies with the compiled message layout,
+against the f-string function it replaced, which did not escape
+
+    python -m benchmarks.render
+"""
+
+from html import escape
+from itertools import cycle, islice
+
+from benchmarks import time_per_call
+from common.services import constants
+from lms_public.models import WallItem
+from lms_public.services.render import MESSAGE_BODY_TEMPLATE
+
+MESSAGE_COUNT = 100_000
+
+# One of each kind of message; a few have text to escape
+MESSAGE_KINDS = (
+    dict(text="کلاس فردا تشکیل نمی‌شود.", sent_at="2 ساعت پیش"),
+    dict(
+        text="نمرات <میان‌ترم> & پایان‌ترم",
+        header="متن پیام تغییر کرد.",
+        footer="تغییر زمان ارسال",
+        sent_at="1403/01/15 10:30",
+    ),
+    dict(
+        text="جزوه‌ی فصل اول",
+        has_attachment=True,
+        attachment_name="jozve-1.pdf",
+        attachment_link="/files/103/jozve-1.pdf",
+        sent_at="دیروز ساعت 18:20",
+    ),
+    dict(
+        text="تمرین سری دوم",
+        is_exercise=True,
+        is_exercise_finished=True,
+        exercise_name="تمرین ۲",
+        exercise_start="1403/01/10 08:00",
+        exercise_deadline="پایان یافته",
+        has_attachment=True,
+        attachment_name="hw2.zip",
+        attachment_link="/exercise/105/hw2.zip",
+        sent_at="1403/01/10 08:00",
+    ),
+    dict(
+        is_online_session=True,
+        online_session_name="کلاس رفع اشکال",
+        online_session_link="/meeting/107",
+        online_session_status="در حال برگزاری",
+        online_session_start="1403/01/20 10:00",
+        online_session_end="1403/01/20 11:30",
+        sent_at="لحظاتی پیش",
+    ),
+)
+
+
+def render_before(message: WallItem) -> str:
+    """The f-string function the compiled layout replaced, as it was"""
+    author = f"\n\n👤  {message.author}"
+    header = f"\n\n▫️<b>{message.header}</b>" if message.header else ""
+    text = (
+        f"\n\n✍🏻  {message.text}"
+        if hasattr(message, "text") and message.text
+        else ""
+    )
+    footer = ""
+    if hasattr(message, "footer") and message.footer:
+        footer = f"\n\nتغییرات جزئی: \n{message.footer}"
+    exercise_description = ""
+    if message.is_exercise:
+        exercise_description = (
+            f"\n\nنام تمرین: {message.exercise_name}\n"
+            f"زمان شروع: {message.exercise_start}\n"
+            f"مهلت ارسال: {message.exercise_deadline}"
+        )
+        if message.is_exercise_finished:
+            exercise_description += "(پایان یافته) "
+    attachment_description = ""
+    if message.has_attachment:
+        attachment_description = (
+            "\n\nفایل: "
+            f'<a href="{constants.BASE_URL + message.attachment_link}">'
+            f"{message.attachment_name}</a>"
+        )
+    online_session_description = ""
+    if message.is_online_session:
+        online_session_status_icon = "⏳"
+        if "در حال" in message.online_session_status:
+            online_session_status_icon = "🟢"
+        elif "ضبط" in message.online_session_status:
+            online_session_status_icon = "🔴"
+        online_session_description = (
+            "\n\n🌐 عنوان جلسه: "
+            f'<a href="{constants.BASE_URL + message.online_session_link}">'
+            f"{message.online_session_name}</a>"
+            f"\n{online_session_status_icon} وضعیت: "
+            f"{message.online_session_status}"
+            f"\n🚀 زمان شروع: {message.online_session_start}"
+            f"\n🏁 زمان پایان: {message.online_session_end}"
+        )
+    date = (
+        f"\n\n🕑  {message.sent_at}"
+        if hasattr(message, "sent_at") and message.sent_at
+        else ""
+    )
+    white_space = "‌"  # Zero-width non-joiner character
+    return (
+        f"{author}{header}{text}{footer}{exercise_description}"
+        f"{attachment_description}{online_session_description}{date}"
+        f"{white_space}\n"
+    )
+
+
+def main() -> None:
+    kinds = [
+        WallItem(
+            suffix_url="/group/1", item_id=str(index), author="استاد", **fields
+        )
+        for index, fields in enumerate(MESSAGE_KINDS)
+    ]
+    messages = list(islice(cycle(kinds), MESSAGE_COUNT))
+    for message in kinds:
+        # Without markup characters, the output is the same as before
+        if message.text == escape(message.text):
+            assert MESSAGE_BODY_TEMPLATE.render(message) == render_before(
+                message
+            )
+
+    print(f"{MESSAGE_COUNT} messages of {len(kinds)} kinds, per message:")
+    for name, render in (
+        (
+            "f-string function, no escaping",
+            lambda: list(map(render_before, messages)),
+        ),
+        (
+            "compiled layout, escaping",
+            lambda: MESSAGE_BODY_TEMPLATE.render_many(messages),
+        ),
+    ):
+        seconds = time_per_call(render, number=1, repeat=3) / MESSAGE_COUNT
+        print(f"  {name:<31} {seconds:5.2f} us")
+
+
+if __name__ == "__main__":
+    main()
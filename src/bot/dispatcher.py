@@ -0,0 +1,114 @@
+import asyncio
+import logging
+import os
+import sys
+
+import django
+from django.conf import settings
+from dotenv import load_dotenv
+
+
+def setup_django():
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core_config.settings")
+    django.setup()
+
+
+# Call this function before importing Django models
+setup_django()
+
+from bot.sender import TelegramSender  # noqa
+from bot.services import send_notifications_service  # noqa
+from common.services import constants  # noqa
+from lms_public.services.outbox import claim_deliveries  # noqa
+from lms_public.services.outbox import complete_deliveries  # noqa
+
+load_dotenv(override=True)
+
+logger = logging.getLogger(__name__)
+
+
+async def dispatch_batch(sender: TelegramSender) -> int:
+    """Claim a batch of due notifications and send them, one digest per
+    chat and course. Chats are served concurrently; the sender keeps them
+    all within Telegram's rate limits.
+
+    Args:
+        sender (TelegramSender): The sender to send them through
+
+    Returns:
+        (int): The number of notifications claimed
+    """
+
+    deliveries = await claim_deliveries(
+        limit=constants.NOTIFICATION_BATCH_SIZE
+    )
+    chat_msg_ids: dict[str, list[int]] = dict()
+    for delivery in deliveries:
+        chat_msg_ids.setdefault(delivery.chat_id, list()).append(
+            delivery.message_id
+        )
+
+    results = await asyncio.gather(
+        *(
+            send_notifications_service(
+                chat_id=int(chat_id), lms_msg_ids=lms_msg_ids, sender=sender
+            )
+            for chat_id, lms_msg_ids in chat_msg_ids.items()
+        ),
+        return_exceptions=True,
+    )
+    sent_msg_ids = set()
+    for chat_id, result in zip(chat_msg_ids, results):
+        if isinstance(result, BaseException):
+            logger.error(
+                "Sending to chat %s failed",
+                chat_id,
+                exc_info=result,
+            )
+        else:
+            sent_msg_ids.update(result)
+
+    await complete_deliveries(
+        deliveries=deliveries, sent_message_ids=sent_msg_ids
+    )
+    return len(deliveries)
+
+
+async def run_dispatch_worker(sender: TelegramSender) -> None:
+    """Dispatch batches for as long as the process lives, waiting
+    `NOTIFICATION_POLL_SECONDS` whenever nothing is due
+
+    Args:
+        sender (TelegramSender): The sender to send them through
+    """
+
+    while True:
+        try:
+            claimed = await dispatch_batch(sender=sender)
+        except Exception:
+            logger.exception("Dispatching notifications failed")
+            claimed = 0
+        if not claimed:
+            await asyncio.sleep(constants.NOTIFICATION_POLL_SECONDS)
+
+
+async def run_dispatcher() -> None:
+    """Send pending notifications from the outbox (`PublicMessageDelivery`)
+    with `settings.NOTIFICATION_DISPATCH_WORKERS` workers. Workers never
+    claim the same rows, so more of them claim more batches at once; they
+    share one sender, which holds the rate limits of the bot, so run a
+    single dispatcher process per bot.
+    """
+
+    async with TelegramSender() as sender:
+        await asyncio.gather(
+            *(
+                run_dispatch_worker(sender=sender)
+                for _ in range(settings.NOTIFICATION_DISPATCH_WORKERS)
+            )
+        )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, stream=sys.stdout)
+    asyncio.run(run_dispatcher())
@@ -0,0 +1,190 @@
+import asyncio
+import logging
+import os
+import time
+
+import aiohttp
+
+from common.services import constants
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Allow `rate` acquisitions per second on average, and bursts of up to
+    `capacity` acquisitions at once.
+
+    Args:
+        rate (float): Tokens added per second
+        capacity (float): The size of the bucket. Defaults to 1, i.e. evenly
+            spaced acquisitions
+    """
+
+    def __init__(self, rate: float, capacity: float = 1) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated_at) * self.rate
+        )
+        self.updated_at = now
+
+    @property
+    def is_full(self) -> bool:
+        self._refill()
+        return self.tokens >= self.capacity
+
+    async def acquire(self) -> None:
+        """Take a token, waiting until one is available"""
+
+        while True:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds: float) -> None:
+        """Take no tokens for some time, e.g. when asked to by the server
+
+        Args:
+            seconds (float): How long to pause
+        """
+
+        self._refill()
+        self.tokens = min(self.tokens, 0) - seconds * self.rate
+
+
+class TelegramSender:
+    """A long-lived Telegram Bot API client. All messages go through one
+    pooled session and are paced by a global token bucket and one token
+    bucket per chat, so a busy poll cycle is sent as fast as Telegram allows
+    without getting flood-limited. Use it as an async context manager.
+
+    Args:
+        token (str | None): The bot token. Defaults to `BOT_TOKEN`
+    """
+
+    def __init__(self, token: str | None = None) -> None:
+        self.token = token or os.environ.get("BOT_TOKEN")
+        self.global_bucket = TokenBucket(
+            rate=constants.TELEGRAM_GLOBAL_RATE_PER_SECOND
+        )
+        self.chat_buckets: dict[int, TokenBucket] = dict()
+        self.chat_locks: dict[int, asyncio.Lock] = dict()
+        self.session: aiohttp.ClientSession | None = None
+
+    async def __aenter__(self) -> "TelegramSender":
+        connector = aiohttp.TCPConnector(
+            limit=constants.TELEGRAM_CONNECTION_LIMIT,
+            keepalive_timeout=constants.LMS_KEEPALIVE_TIMEOUT_SECONDS,
+        )
+        self.session = aiohttp.ClientSession(
+            base_url=constants.TELEGRAM_API_URL, connector=connector
+        )
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.session.close()
+
+    def get_chat_limiter(
+        self, chat_id: int
+    ) -> tuple[asyncio.Lock, TokenBucket]:
+        """Get the lock and the token bucket of a chat. Those of idle chats
+        are dropped once there are many of them, as a full bucket is the
+        same as a new one.
+
+        Args:
+            chat_id (int): A Telegram chat id
+
+        Returns:
+            (tuple[asyncio.Lock, TokenBucket]): The lock and the bucket
+        """
+
+        if chat_id not in self.chat_buckets:
+            if len(self.chat_buckets) >= constants.TELEGRAM_IDLE_CHATS_LIMIT:
+                idle_chats = [
+                    key
+                    for key, bucket in self.chat_buckets.items()
+                    if bucket.is_full and not self.chat_locks[key].locked()
+                ]
+                for key in idle_chats:
+                    del self.chat_buckets[key]
+                    del self.chat_locks[key]
+            self.chat_buckets[chat_id] = TokenBucket(
+                rate=constants.TELEGRAM_CHAT_RATE_PER_SECOND
+            )
+            self.chat_locks[chat_id] = asyncio.Lock()
+        return self.chat_locks[chat_id], self.chat_buckets[chat_id]
+
+    async def send_message(self, chat_id: int, text: str, **params) -> bool:
+        """Send a message, waiting for the rate limits. Messages to the same
+        chat are sent one at a time, in the order this is called. A 429
+        response pauses the sender for the `retry_after` it asks for; it and
+        other temporary failures (5xx, network errors) are retried up to
+        `TELEGRAM_MAX_ATTEMPTS` times.
+
+        Args:
+            chat_id (int): A Telegram chat id
+            text (str): The text of the message
+            **params: Other `sendMessage` parameters, e.g. `parse_mode`
+
+        Returns:
+            (bool): Whether the message was sent. False means Telegram
+                refused it, or it kept failing.
+        """
+
+        chat_lock, chat_bucket = self.get_chat_limiter(chat_id)
+        async with chat_lock:
+            return await self._send_message(
+                chat_bucket=chat_bucket,
+                payload={"chat_id": chat_id, "text": text, **params},
+            )
+
+    async def _send_message(
+        self, chat_bucket: TokenBucket, payload: dict
+    ) -> bool:
+        for attempt in range(1, constants.TELEGRAM_MAX_ATTEMPTS + 1):
+            await chat_bucket.acquire()
+            await self.global_bucket.acquire()
+            # Waiting for the global bucket must not shorten the gap to the
+            # next message to this chat, so its refill starts over from now
+            chat_bucket.pause(0)
+            try:
+                async with self.session.post(
+                    f"/bot{self.token}/sendMessage", json=payload
+                ) as response:
+                    if response.status == 200:
+                        return True
+                    if response.status == 429:
+                        body = await response.json(content_type=None)
+                        retry_after = body.get("parameters", dict()).get(
+                            "retry_after",
+                            constants.TELEGRAM_RETRY_BACKOFF_SECONDS,
+                        )
+                        logger.warning(
+                            "Flood limited by Telegram, pausing %ss",
+                            retry_after,
+                        )
+                        # Flood limits may be per chat or for the whole bot
+                        self.global_bucket.pause(retry_after)
+                        chat_bucket.pause(retry_after)
+                        continue
+                    if response.status < 500:
+                        logger.warning(
+                            "Telegram refused a message to chat %s: %s %s",
+                            payload["chat_id"],
+                            response.status,
+                            await response.text(),
+                        )
+                        return False
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.warning("Sending to Telegram failed: %r", e)
+            await asyncio.sleep(
+                constants.TELEGRAM_RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1)
+            )
+        return False
@@ -3,36 +3,47 @@ import os
 import aiohttp
 from aiogram.enums import ParseMode
 
+from bot.sender import TelegramSender
 from lms_public.models import PublicMessage
-from lms_public.services.change_handler import public_message_to_html
+from lms_public.services.change_handler import public_messages_to_html_pages
 
 
-async def send_notifications_service(chat_id: int, lms_msg_id: int) -> None:
-    """Send a previously saved message to a certain chat id
+async def send_notifications_service(
+    chat_id: int, lms_msg_ids: list[int], sender: TelegramSender
+) -> set[int]:
+    """Send previously saved messages to a certain chat id. The messages of
+    each course are merged into one digest, in the order of their ids, and
+    split into pages when too long for one Telegram message.
 
     Args:
         chat_id (int): A Telegram chat id
-        lms_msg_id (int): The id of the message in database
+        lms_msg_ids (list[int]): The ids of the messages in database
+        sender (TelegramSender): The sender to send them through
+
+    Returns:
+        (set[int]): The ids of the messages sent
     """
 
-    lms_msg = await PublicMessage.objects.aget(id=lms_msg_id)
-    BOT_TOKEN = os.environ.get("BOT_TOKEN")
-    html_message = await public_message_to_html(message=lms_msg)
-    async with aiohttp.ClientSession() as session:
-        async with session.post(
-            f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage",
-            json={
-                "chat_id": chat_id,
-                "text": html_message,
-                "parse_mode": ParseMode.HTML,
-            },
-        ) as response:
-            if response.status == 200:
-                lms_msg.is_sent = True
-                await lms_msg.asave()
-            else:
-                # Delete it, to be fetched again
-                await lms_msg.adelete()
+    lms_msgs = await PublicMessage.objects.select_related(
+        "lms_course", "wall_item"
+    ).ain_bulk(lms_msg_ids)
+    course_msgs: dict[int, list[PublicMessage]] = dict()
+    for lms_msg_id in sorted(lms_msgs):
+        lms_msg = lms_msgs[lms_msg_id]
+        course_msgs.setdefault(lms_msg.lms_course_id, list()).append(lms_msg)
+
+    sent_msg_ids = set()
+    for digest_msgs in course_msgs.values():
+        pages = public_messages_to_html_pages(messages=digest_msgs)
+        for page in pages:
+            is_sent = await sender.send_message(
+                chat_id=chat_id, text=page, parse_mode=ParseMode.HTML
+            )
+            if not is_sent:
+                break
+        if is_sent:
+            sent_msg_ids.update(lms_msg.pk for lms_msg in digest_msgs)
+    return sent_msg_ids
 
 
 async def send_welcome_message_service(msg_count: int, chat_id: int) -> None:
@@ -2,3 +2,60 @@ COOKIE_KEY_NAME = "TIARASESSID"
 BASE_URL = "https://lms.ui.ac.ir"
 LOGIN_SUFFIX_URL = "/login"
 HOME_SUFFIX_URL = "/members/home"
+
+# Shared LMS connection pool
+LMS_CONNECTION_LIMIT_PER_HOST = 8
+LMS_DNS_CACHE_TTL_SECONDS = 300
+LMS_KEEPALIVE_TIMEOUT_SECONDS = 30
+
+# Upper bounds of the buckets of the course fetch latency histograms
+LMS_FETCH_LATENCY_BUCKETS_SECONDS = (0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# Parsed course walls are kept this long for conditional requests
+WALL_CACHE_TTL_SECONDS = 3600
+
+# Known-good cookies are reused from memory for this long
+COOKIE_CACHE_TTL_SECONDS = 600
+
+# Coordination between workers
+SINGLE_FLIGHT_TIMEOUT_SECONDS = 30
+# A held lock is renewed this often, so it never expires while in use
+SINGLE_FLIGHT_RENEW_SECONDS = 10
+HOURLY_COUNTER_TTL_SECONDS = 7 * 24 * 3600
+
+# Telegram Bot API
+TELEGRAM_API_URL = "https://api.telegram.org"
+TELEGRAM_MESSAGE_MAX_LENGTH = 4096
+TELEGRAM_GLOBAL_RATE_PER_SECOND = 30
+TELEGRAM_CHAT_RATE_PER_SECOND = 1
+TELEGRAM_CONNECTION_LIMIT = 30
+TELEGRAM_IDLE_CHATS_LIMIT = 1000
+TELEGRAM_MAX_ATTEMPTS = 5
+TELEGRAM_RETRY_BACKOFF_SECONDS = 1
+
+# Notification outbox, drained by `bot.dispatcher`
+NOTIFICATION_BATCH_SIZE = 100
+NOTIFICATION_POLL_SECONDS = 2
+NOTIFICATION_CLAIM_LEASE_SECONDS = 300
+NOTIFICATION_MAX_ATTEMPTS = 8
+NOTIFICATION_RETRY_BACKOFF_SECONDS = 30
+NOTIFICATION_RETRY_BACKOFF_MAX_SECONDS = 3600
+
+# Adaptive polling of course pages, see `lms_public.services.polling`
+POLL_HISTORY_DAYS = 14
+POLL_ONBOARDING_SECONDS = 3600
+POLL_HOT_BEFORE_DEADLINE_SECONDS = 6 * 3600
+POLL_HOT_BEFORE_SESSION_SECONDS = 3600
+POLL_BACKOFF_FACTOR = 2
+POLL_CLAIM_LEASE_SECONDS = 300
+POLL_PLAN_MINUTES = 15
+# Halvings of the scale of the planned intervals, far finer than a second
+POLL_PLAN_BISECTIONS = 50
+# One-off polls around the times of exercises and online sessions, in
+# seconds from each time, e.g. to see an exercise finished right after its
+# deadline, or the recording of a session posted after it
+POLL_WAKE_UP_OFFSETS_SECONDS = {
+    "exercise_deadline": (-600, 30),
+    "online_session_start": (-300, 30),
+    "online_session_end": (30, 1800),
+}
@@ -1,7 +1,23 @@
-import aiohttp
+import logging
+import time
 
 from common.models import LMSCookie, LMSUser
 from common.services import constants
+from common.services.coordination import (
+    increment_hourly_counter,
+    single_flight,
+)
+from common.services.http import lms_session
+
+logger = logging.getLogger(__name__)
+
+# user id -> (cookie, expiry on the monotonic clock)
+_cookie_cache: dict[int, tuple[str, float]] = dict()
+
+
+class CookieExpiredError(Exception):
+    """Raised when the LMS sends a request to the login page, which means
+    the cookie it was made with has expired"""
 
 
 async def login(user: LMSUser) -> LMSCookie:
@@ -17,11 +33,10 @@ async def login(user: LMSUser) -> LMSCookie:
         (LMSCookie): An LMSCookie
     """
 
-    BASE_URL = constants.BASE_URL
     LOGIN_SUFFIX_URL = constants.LOGIN_SUFFIX_URL
     json_body = {"username": user.username, "password": user.decoded_password}
 
-    async with aiohttp.ClientSession(base_url=BASE_URL) as session:
+    async with lms_session() as session:
         async with session.post(
             url=LOGIN_SUFFIX_URL, data=json_body, allow_redirects=False
         ) as response:
@@ -47,20 +62,108 @@ async def is_cookie_valid(cookie: LMSCookie) -> bool:
         False if redirected.
     """
 
-    BASE_URL = constants.BASE_URL
     HOME_SUFFIX_URL = constants.HOME_SUFFIX_URL
 
-    async with aiohttp.ClientSession(
-        base_url=BASE_URL, cookies=cookie.as_dict
-    ) as session:
+    async with lms_session() as session:
         async with session.get(
-            url=HOME_SUFFIX_URL, allow_redirects=False
+            url=HOME_SUFFIX_URL, cookies=cookie.as_dict, allow_redirects=False
         ) as response:
             if response.status == 302:
                 return False
             return True
 
 
+def cache_cookie(cookie: LMSCookie) -> None:
+    """Remember a known-good cookie in this process for
+    `COOKIE_CACHE_TTL_SECONDS`: one just given by a login, or one a request
+    has just succeeded with
+
+    Args:
+        cookie (LMSCookie): An LMSCookie with its user set
+    """
+    expires_at = time.monotonic() + constants.COOKIE_CACHE_TTL_SECONDS
+    _cookie_cache[cookie.user_id] = (cookie.cookie, expires_at)
+
+
+def is_cookie_cached(user_id: int) -> bool:
+    """Whether a known-good cookie of a user is cached in this process
+
+    Args:
+        user_id (int): The id of the LMS User
+    """
+    cached = _cookie_cache.get(user_id)
+    return cached is not None and cached[1] > time.monotonic()
+
+
+async def refresh_cookie(
+    user: LMSUser, expired_cookie: LMSCookie | None = None
+) -> LMSCookie:
+    """Login to get a new cookie, store it in the database and cache it.
+    Only one worker logs a user in at a time; a login invalidates the
+    cookies of the previous ones. If another worker has already replaced
+    `expired_cookie` meanwhile, its cookie is reused instead, and only
+    cached once a request succeeds with it.
+
+    Args:
+        user (LMSUser): LMS User instance
+        expired_cookie (LMSCookie | None, optional): The cookie which was
+            found expired. Defaults to None, which always logins.
+
+    Returns:
+        (LMSCookie): An LMSCookie; its cookie is empty if login failed
+    """
+
+    async with single_flight(key=f"login:{user.pk}"):
+        _cookie_cache.pop(user.pk, None)
+        if expired_cookie is not None:
+            stored_cookie = await LMSCookie.objects.filter(user=user).afirst()
+            if (
+                stored_cookie
+                and stored_cookie.cookie
+                and stored_cookie.cookie != expired_cookie.cookie
+            ):
+                return LMSCookie(user=user, cookie=stored_cookie.cookie)
+
+        cookie = await login(user=user)
+        cookie.user = user
+        login_count = await increment_hourly_counter(name="login")
+        logger.info(
+            "Logged in user %s, %d LMS logins this hour", user.pk, login_count
+        )
+        await LMSCookie.objects.aupdate_or_create(
+            user=user,
+            defaults={"cookie": cookie.cookie},
+        )
+    if cookie.cookie:
+        cache_cookie(cookie=cookie)
+    return cookie
+
+
+async def get_stored_cookie(user: LMSUser) -> LMSCookie:
+    """Get the last known cookie without checking it against the LMS.
+    Looks in the in-process cache, then in the database, and only logins
+    if there is no cookie at all. Requests made with it raise
+    `CookieExpiredError` if it has expired; then use `refresh_cookie`. A
+    cookie from the database is not cached until a request succeeds with
+    it (see `lms_public.services.scrapers.get_page`).
+
+    Args:
+        user (LMSUser): LMS User instance
+
+    Returns:
+        (LMSCookie): An LMSCookie
+    """
+
+    cached = _cookie_cache.get(user.pk)
+    if cached and cached[1] > time.monotonic():
+        return LMSCookie(user=user, cookie=cached[0])
+
+    stored_cookie = await LMSCookie.objects.filter(user=user).afirst()
+    if not stored_cookie or not stored_cookie.cookie:
+        return await refresh_cookie(user=user)
+    return LMSCookie(user=user, cookie=stored_cookie.cookie)
+
+
 async def get_cookie(user: LMSUser) -> LMSCookie:
     """Find cookie in database. if not found or invalid,
     logins to get a new cookie str and stores it in the database.
@@ -77,10 +180,6 @@ async def get_cookie(user: LMSUser) -> LMSCookie:
     cookie = LMSCookie(user=user, cookie=cookie_value)
     is_valid = await is_cookie_valid(cookie=cookie)
     if is_valid:
+        cache_cookie(cookie=cookie)
         return cookie
-    cookie = await login(user=user)
-    await LMSCookie.objects.aupdate_or_create(
-        user=user,
-        defaults={"cookie": cookie.cookie},
-    )
-    return cookie
+    return await refresh_cookie(user=user, expired_cookie=cookie)
@@ -0,0 +1,314 @@
+import asyncio
+import logging
+import time
+import weakref
+from collections import Counter
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import AsyncIterator
+
+import redis.asyncio as redis
+from redis.asyncio.lock import Lock
+from redis.exceptions import LockError
+from django.conf import settings
+from django.utils import timezone
+
+from common.services import constants
+
+logger = logging.getLogger(__name__)
+
+# The Redis client of each event loop, see `get_redis_client`
+_redis_clients: weakref.WeakKeyDictionary[
+    asyncio.AbstractEventLoop, redis.Redis
+] = weakref.WeakKeyDictionary()
+
+# Fallbacks used when no Redis is configured (e.g. in tests). They only
+# coordinate within this process. A lock is kept with the number of its
+# holders and waiters, and dropped when the last one is done.
+_local_locks: weakref.WeakKeyDictionary[
+    asyncio.AbstractEventLoop, dict[str, tuple[asyncio.Lock, int]]
+] = weakref.WeakKeyDictionary()
+_local_counters: Counter[str] = Counter()
+_local_histograms: dict[str, Counter[str]] = dict()
+_local_values: dict[str, tuple[str, float]] = dict()
+
+
+def get_redis_url() -> str | None:
+    """Get the URL of the Redis used for coordination between workers
+
+    Returns:
+        (str | None): The URL, or None to coordinate within this process
+    """
+    url = settings.REDIS_URL
+    if url and url.startswith(("redis://", "rediss://", "unix://")):
+        return url
+    return None
+
+
+def get_redis_client() -> redis.Redis | None:
+    """Get the Redis client of the current event loop. Its connection pool
+    is shared by every coordination call running in the loop, e.g. all
+    pages of a poll tick. The clients of closed loops (e.g. of earlier
+    `asyncio.run` calls of a Celery worker) are dropped, since they keep
+    their loop alive.
+
+    Returns:
+        (redis.Redis | None): The client, or None to coordinate within
+        this process (see `get_redis_url`)
+    """
+
+    url = get_redis_url()
+    if url is None:
+        return None
+    loop = asyncio.get_running_loop()
+    if loop not in _redis_clients:
+        for closed_loop in [
+            other_loop
+            for other_loop in _redis_clients
+            if other_loop.is_closed()
+        ]:
+            del _redis_clients[closed_loop]
+        _redis_clients[loop] = redis.from_url(url)
+    return _redis_clients[loop]
+
+
+async def keep_lock(lock: Lock) -> None:
+    """Renew a held lock every `SINGLE_FLIGHT_RENEW_SECONDS` to a full
+    `SINGLE_FLIGHT_TIMEOUT_SECONDS`, until cancelled
+
+    Args:
+        lock (Lock): The held lock
+    """
+    while True:
+        await asyncio.sleep(constants.SINGLE_FLIGHT_RENEW_SECONDS)
+        try:
+            await lock.reacquire()
+        except LockError:
+            logger.warning("Lost the lock %s while holding it", lock.name)
+            return
+
+
+@asynccontextmanager
+async def single_flight(key: str) -> AsyncIterator[None]:
+    """Hold a lock shared by every worker, so only one of them runs the
+    block at a time for a given key. The others wait for it to finish.
+    The lock expires after `SINGLE_FLIGHT_TIMEOUT_SECONDS` if its worker
+    dies, but is renewed for as long as the block runs (see `keep_lock`),
+    however long it waits for the LMS.
+
+    Args:
+        key (str): What to lock, e.g. `login:<user id>`
+
+    Raises:
+        LockError: If not acquired within
+            `SINGLE_FLIGHT_TIMEOUT_SECONDS`
+    """
+
+    client = get_redis_client()
+    if client is None:
+        locks = _local_locks.setdefault(asyncio.get_running_loop(), dict())
+        lock, users = locks.get(key, (asyncio.Lock(), 0))
+        locks[key] = (lock, users + 1)
+        try:
+            async with lock:
+                yield
+        finally:
+            lock, users = locks.pop(key)
+            if users > 1:
+                locks[key] = (lock, users - 1)
+        return
+
+    lock = client.lock(
+        f"unif:lock:{key}",
+        timeout=constants.SINGLE_FLIGHT_TIMEOUT_SECONDS,
+        blocking_timeout=constants.SINGLE_FLIGHT_TIMEOUT_SECONDS,
+    )
+    if not await lock.acquire():
+        raise LockError(f"Unable to acquire {lock.name}")
+    keeper = asyncio.create_task(keep_lock(lock))
+    try:
+        yield
+    finally:
+        keeper.cancel()
+        await asyncio.gather(keeper, return_exceptions=True)
+        try:
+            await lock.release()
+        except LockError:
+            logger.warning("Lost the lock %s before release", lock.name)
+
+
+async def get_shared_value(key: str) -> str | None:
+    """Get a value stored with `set_shared_value`
+
+    Args:
+        key (str): The key of the value
+
+    Returns:
+        (str | None): The value, or None if missing or expired
+    """
+
+    client = get_redis_client()
+    if client is None:
+        value, expires_at = _local_values.get(key, (None, 0))
+        return value if expires_at > time.monotonic() else None
+
+    value = await client.get(f"unif:value:{key}")
+    return value.decode() if value is not None else None
+
+
+async def set_shared_value(key: str, value: str, ttl_seconds: int) -> None:
+    """Store a value for every worker to read, for some time
+
+    Args:
+        key (str): The key of the value, e.g. `wall:<suffix url>`
+        value (str): The value
+        ttl_seconds (int): How long to keep it
+    """
+
+    client = get_redis_client()
+    if client is None:
+        _local_values[key] = (value, time.monotonic() + ttl_seconds)
+        return
+
+    await client.set(f"unif:value:{key}", value, ex=ttl_seconds)
+
+
+def get_hourly_counter_key(name: str, hour: datetime) -> str:
+    """Build the key of an hourly counter
+
+    Args:
+        name (str): The name of the counter
+        hour (datetime): Any time within the hour
+
+    Returns:
+        (str): The key
+    """
+    return f"unif:count:{name}:{hour:%Y%m%d%H}"
+
+
+async def increment_hourly_counter(name: str, amount: int = 1) -> int:
+    """Count events in the bucket of the current hour (UTC)
+
+    Args:
+        name (str): The name of the counter, e.g. `login`
+        amount (int, optional): The number of events. Defaults to 1.
+
+    Returns:
+        (int): The count of the current hour, including these events
+    """
+
+    key = get_hourly_counter_key(name=name, hour=timezone.now())
+    client = get_redis_client()
+    if client is None:
+        _local_counters[key] += amount
+        return _local_counters[key]
+
+    count = await client.incrby(key, amount)
+    await client.expire(key, constants.HOURLY_COUNTER_TTL_SECONDS)
+    return count
+
+
+async def get_hourly_count(name: str, hour: datetime) -> int:
+    """Get the count of an event in an hour (UTC)
+
+    Args:
+        name (str): The name of the counter, e.g. `login`
+        hour (datetime): Any time within the hour
+
+    Returns:
+        (int): The count of that hour
+    """
+
+    key = get_hourly_counter_key(name=name, hour=hour)
+    client = get_redis_client()
+    if client is None:
+        return _local_counters[key]
+
+    return int(await client.get(key) or 0)
+
+
+def get_hourly_histogram_key(name: str, hour: datetime) -> str:
+    """Build the key of an hourly histogram
+
+    Args:
+        name (str): The name of the histogram
+        hour (datetime): Any time within the hour
+
+    Returns:
+        (str): The key
+    """
+    return f"unif:hist:{name}:{hour:%Y%m%d%H}"
+
+
+def get_histogram_bucket(value: float, buckets: tuple[float, ...]) -> str:
+    """Find the bucket of a value
+
+    Args:
+        value (float): The observed value
+        buckets (tuple[float, ...]): Upper bounds of the buckets, ascending
+
+    Returns:
+        (str): The upper bound of the first bucket holding the value, or
+            `+Inf`
+    """
+    for upper_bound in buckets:
+        if value <= upper_bound:
+            return str(upper_bound)
+    return "+Inf"
+
+
+async def observe_hourly_histograms(
+    observations: dict[str, float], buckets: tuple[float, ...]
+) -> None:
+    """Count values in the buckets of histograms of the current hour (UTC),
+    one histogram per name, in a single round trip. Each histogram also
+    keeps the `count` and `sum` of its values.
+
+    Args:
+        observations (dict[str, float]): A value by histogram name, e.g.
+            the fetch latency of each course
+        buckets (tuple[float, ...]): Upper bounds of the buckets, ascending
+    """
+
+    if not observations:
+        return
+    hour = timezone.now()
+    client = get_redis_client()
+    if client is None:
+        for name, value in observations.items():
+            key = get_hourly_histogram_key(name=name, hour=hour)
+            histogram = _local_histograms.setdefault(key, Counter())
+            histogram[get_histogram_bucket(value, buckets)] += 1
+            histogram["count"] += 1
+            histogram["sum"] += value
+        return
+
+    async with client.pipeline(transaction=False) as pipe:
+        for name, value in observations.items():
+            key = get_hourly_histogram_key(name=name, hour=hour)
+            pipe.hincrby(key, get_histogram_bucket(value, buckets), 1)
+            pipe.hincrby(key, "count", 1)
+            pipe.hincrbyfloat(key, "sum", value)
+            pipe.expire(key, constants.HOURLY_COUNTER_TTL_SECONDS)
+        await pipe.execute()
+
+
+async def get_hourly_histogram(name: str, hour: datetime) -> dict[str, float]:
+    """Get a histogram of an hour (UTC)
+
+    Args:
+        name (str): The name of the histogram
+        hour (datetime): Any time within the hour
+
+    Returns:
+        (dict[str, float]): The count of each non-empty bucket by its upper
+            bound, and the `count` and `sum` of the values
+    """
+
+    key = get_hourly_histogram_key(name=name, hour=hour)
+    client = get_redis_client()
+    if client is None:
+        return dict(_local_histograms.get(key, Counter()))
+
+    histogram = await client.hgetall(key)
+    return {field.decode(): float(value) for field, value in histogram.items()}
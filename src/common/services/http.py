@@ -0,0 +1,88 @@
+import asyncio
+import weakref
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator
+
+import aiohttp
+from django.conf import settings
+
+from common.services import constants
+
+_current_session: ContextVar[aiohttp.ClientSession | None] = ContextVar(
+    "lms_session", default=None
+)
+_host_semaphores: weakref.WeakKeyDictionary[
+    asyncio.AbstractEventLoop, dict[str, asyncio.Semaphore]
+] = weakref.WeakKeyDictionary()
+
+
+def create_lms_session() -> aiohttp.ClientSession:
+    """Create a pooled session for LMS requests. Connections are kept alive
+    and limited per host, and DNS lookups are cached. The session has no
+    cookie jar of its own: every request carries the cookie of the user it
+    is made for, so one session can serve many `LMSCookie`s without leaking
+    cookies between them.
+
+    Returns:
+        (aiohttp.ClientSession): A new session bound to `BASE_URL`
+    """
+
+    connector = aiohttp.TCPConnector(
+        limit_per_host=constants.LMS_CONNECTION_LIMIT_PER_HOST,
+        ttl_dns_cache=constants.LMS_DNS_CACHE_TTL_SECONDS,
+        keepalive_timeout=constants.LMS_KEEPALIVE_TIMEOUT_SECONDS,
+    )
+    return aiohttp.ClientSession(
+        base_url=constants.BASE_URL,
+        connector=connector,
+        cookie_jar=aiohttp.DummyCookieJar(),
+    )
+
+
+@asynccontextmanager
+async def lms_session() -> AsyncIterator[aiohttp.ClientSession]:
+    """Yield the LMS session of the current scope. The outermost call opens
+    a session and closes it on exit; nested calls (including those in tasks
+    created inside the scope) reuse it. Wrap a whole poll cycle in this so
+    all of its requests share the same connections.
+
+    Yields:
+        (aiohttp.ClientSession): The shared LMS session
+    """
+
+    session = _current_session.get()
+    if session is not None and not session.closed:
+        yield session
+        return
+
+    session = create_lms_session()
+    token = _current_session.set(session)
+    try:
+        yield session
+    finally:
+        _current_session.reset(token)
+        await session.close()
+
+
+def get_host_semaphore(host: str = constants.BASE_URL) -> asyncio.Semaphore:
+    """Get the semaphore which caps the requests in flight to a host at
+    `settings.LMS_FETCH_CONCURRENCY_PER_HOST`. It is shared by everything
+    running in the current event loop, e.g. all users of a poll bucket, so
+    a user with many courses cannot take all of the connections.
+
+    Args:
+        host (str, optional): The host. Defaults to the LMS (`BASE_URL`).
+
+    Returns:
+        (asyncio.Semaphore): The semaphore of the host
+    """
+
+    semaphores = _host_semaphores.setdefault(
+        asyncio.get_running_loop(), dict()
+    )
+    if host not in semaphores:
+        semaphores[host] = asyncio.Semaphore(
+            settings.LMS_FETCH_CONCURRENCY_PER_HOST
+        )
+    return semaphores[host]
@@ -0,0 +1,59 @@
+import asyncio
+
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from common.models import LMSCookie, LMSUser
+from common.services import cookie, coordination
+
+
+@override_settings(REDIS_URL="")
+class SingleFlightTests(SimpleTestCase):
+    def test_one_at_a_time(self):
+        running = list()
+        overlaps = list()
+
+        async def run(key: str) -> None:
+            async with coordination.single_flight(key=key):
+                overlaps.append(key in running)
+                running.append(key)
+                await asyncio.sleep(0.01)
+                running.remove(key)
+
+        async def main() -> dict:
+            await asyncio.gather(*(run(f"wall:{i % 2}") for i in range(6)))
+            return coordination._local_locks[asyncio.get_running_loop()]
+
+        locks = asyncio.run(main())
+        self.assertEqual(overlaps, [False] * 6)
+        self.assertEqual(locks, dict())
+
+    def test_cancelled_waiter(self):
+        async def main() -> dict:
+            async with coordination.single_flight(key="login:1"):
+                waiter = asyncio.create_task(
+                    coordination.single_flight(key="login:1").__aenter__()
+                )
+                await asyncio.sleep(0)
+                waiter.cancel()
+                await asyncio.gather(waiter, return_exceptions=True)
+            return coordination._local_locks[asyncio.get_running_loop()]
+
+        self.assertEqual(asyncio.run(main()), dict())
+
+
+class StoredCookieTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = LMSUser.objects.create(username="4001", password="p")
+        LMSCookie.objects.create(user=cls.user, cookie="stored")
+
+    def setUp(self):
+        cookie._cookie_cache.clear()
+
+    async def test_not_cached_until_used(self):
+        stored_cookie = await cookie.get_stored_cookie(user=self.user)
+        self.assertEqual(stored_cookie.cookie, "stored")
+        self.assertFalse(cookie.is_cookie_cached(user_id=self.user.pk))
+
+        cookie.cache_cookie(cookie=stored_cookie)
+        self.assertTrue(cookie.is_cookie_cached(user_id=self.user.pk))
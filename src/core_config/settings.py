@@ -151,6 +151,56 @@ CELERY_BROKER_TRANSPORT_OPTIONS = {
 }
 CELERY_BEAT_SCHEDULER = "django_celery_beat.schedulers:DatabaseScheduler"
 
+# Redis for locks and counters shared by workers; without one they only
+# work within a process
+REDIS_URL = os.environ.get("REDIS_URL", CELERY_BROKER_URL)
+
+# bs4 tree builder for LMS pages: "html.parser", or "lxml" if installed,
+# which is no faster on them (see `benchmarks.html_parsers`). Checked at
+# startup.
+LMS_HTML_PARSER = os.environ.get("LMS_HTML_PARSER", "html.parser")
+# Processes for parsing LMS pages off the event loop; 0 parses in-loop.
+# Worker processes cannot fork, so use it with a non-prefork Celery pool.
+LMS_PARSE_WORKERS = int(os.environ.get("LMS_PARSE_WORKERS", "0"))
+# Course page polls sent to the LMS per second, for all workers. The
+# polling intervals of the courses are planned to fit it.
+LMS_POLL_REQUESTS_PER_SECOND = float(
+    os.environ.get("LMS_POLL_REQUESTS_PER_SECOND", "1")
+)
+# Bounds of the polling interval of a course page
+LMS_POLL_MIN_SECONDS = int(os.environ.get("LMS_POLL_MIN_SECONDS", "60"))
+LMS_POLL_MAX_SECONDS = int(os.environ.get("LMS_POLL_MAX_SECONDS", "3600"))
+# Course pages due for a poll are claimed this often
+LMS_POLL_TICK_SECONDS = int(os.environ.get("LMS_POLL_TICK_SECONDS", "15"))
+# Poll buckets per polling interval of the former per-user polling. Only
+# read by migration 0005_poll_buckets, for databases migrated from before it
+LMS_POLL_SHARDS = 4
+# LMS page requests in flight at a time per host, for all users of a process
+LMS_FETCH_CONCURRENCY_PER_HOST = int(
+    os.environ.get("LMS_FETCH_CONCURRENCY_PER_HOST", "4")
+)
+# An LMS page request fails if it takes longer than this
+LMS_REQUEST_TIMEOUT_SECONDS = float(
+    os.environ.get("LMS_REQUEST_TIMEOUT_SECONDS", "20")
+)
+# Courses of a user which are not fetched within this long are skipped
+# until the next poll
+LMS_FETCH_CYCLE_TIMEOUT_SECONDS = float(
+    os.environ.get("LMS_FETCH_CYCLE_TIMEOUT_SECONDS", "60")
+)
+# A course page fetched for one user is reused for the other users enrolled
+# in the course for this long
+LMS_SHARED_WALL_SECONDS = int(os.environ.get("LMS_SHARED_WALL_SECONDS", "60"))
+# Notifications wait this long before being sent, so that a burst of them
+# is sent as one digest per chat and course
+NOTIFICATION_DEBOUNCE_SECONDS = int(
+    os.environ.get("NOTIFICATION_DEBOUNCE_SECONDS", "30")
+)
+# Concurrent claim-and-send loops of the notification dispatcher
+NOTIFICATION_DISPATCH_WORKERS = int(
+    os.environ.get("NOTIFICATION_DISPATCH_WORKERS", "4")
+)
+
 if ENVIRONMENT == "production":
     CORS_ALLOW_ALL_ORIGINS = False
     CORS_ORIGIN_WHITELIST = []
@@ -1,7 +1,18 @@
 from django.contrib import admin
 
-from lms_public.models import LMSCourse, PublicMessage
+from lms_public.models import (
+    CoursePollSchedule,
+    CourseWakeUp,
+    LMSCourse,
+    PublicMessage,
+    PublicMessageDelivery,
+    WallItem,
+)
 
 # Register your models here.
 admin.site.register(PublicMessage)
 admin.site.register(LMSCourse)
+admin.site.register(PublicMessageDelivery)
+admin.site.register(WallItem)
+admin.site.register(CoursePollSchedule)
+admin.site.register(CourseWakeUp)
@@ -1,6 +1,18 @@
+from bs4.builder import builder_registry
 from django.apps import AppConfig
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
 
 
 class LmsPublicConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "lms_public"
+
+    def ready(self):
+        # bs4 only has the tree builders of the parsers installed, and lxml
+        # is not a dependency: fail at startup rather than on the first page
+        if builder_registry.lookup(settings.LMS_HTML_PARSER) is None:
+            raise ImproperlyConfigured(
+                f"LMS_HTML_PARSER {settings.LMS_HTML_PARSER!r} is not an "
+                "installed bs4 tree builder"
+            )
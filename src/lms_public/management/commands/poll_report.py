@@ -0,0 +1,57 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from lms_public.models import CoursePollSchedule
+from lms_public.services.polling import get_plan_cost, plan_poll_intervals
+
+# Budgets compared, as multiples of LMS_POLL_REQUESTS_PER_SECOND
+BUDGET_FACTORS = (0.25, 0.5, 1, 2, 4)
+
+
+class Command(BaseCommand):
+    help = (
+        "Report the expected detection latency of course page changes "
+        "against the request cost, for the planned polling intervals and "
+        "for other request budgets, compared with polling every page at "
+        "one fixed interval for the same cost. Backing off of dormant "
+        "pages is not included."
+    )
+
+    def handle(self, *args, **options):
+        schedules = list(CoursePollSchedule.objects.all())
+        if not schedules:
+            self.stdout.write("No course page is scheduled yet")
+            return
+
+        changes_per_day = {
+            schedule.suffix_url: schedule.changes_per_day
+            for schedule in schedules
+        }
+        hot_suffix_urls = {
+            schedule.suffix_url for schedule in schedules if schedule.is_hot
+        }
+        self.stdout.write(
+            f"{len(schedules)} course pages, {len(hot_suffix_urls)} hot, "
+            f"{sum(changes_per_day.values()):.1f} changes per day"
+        )
+        self.stdout.write(
+            f"{'budget req/s':>12} {'planned req/s':>14} "
+            f"{'req/day':>9} {'latency':>9} {'fixed':>9}"
+        )
+        for factor in BUDGET_FACTORS:
+            budget = settings.LMS_POLL_REQUESTS_PER_SECOND * factor
+            cost = get_plan_cost(
+                changes_per_day=changes_per_day,
+                intervals=plan_poll_intervals(
+                    changes_per_day=changes_per_day,
+                    hot_suffix_urls=hot_suffix_urls,
+                    requests_per_second=budget,
+                ),
+            )
+            fixed_seconds = len(schedules) / cost.requests_per_second
+            self.stdout.write(
+                f"{budget:>12.3f} {cost.requests_per_second:>14.3f} "
+                f"{cost.requests_per_second * 24 * 3600:>9.0f} "
+                f"{cost.expected_latency_seconds:>8.0f}s "
+                f"{fixed_seconds / 2:>8.0f}s"
+            )
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.7 on 2026-10-18 07:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("common", "0001_initial"),
+        ("lms_public", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="publicmessage",
+            index=models.Index(
+                fields=[
+                    "user",
+                    "lms_course",
+                    "item_id",
+                    "author",
+                    "sent_at",
+                    "-id",
+                ],
+                name="public_message_version_idx",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="lmscourse",
+            constraint=models.UniqueConstraint(
+                fields=("user", "suffix_url"), name="unique_user_course"
+            ),
+        ),
+    ]
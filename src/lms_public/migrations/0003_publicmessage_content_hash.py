@@ -0,0 +1,65 @@
+# Generated by Django 5.1.7 on 2026-10-18 07:58
+
+import hashlib
+
+from django.db import migrations, models
+
+BATCH_SIZE = 2000
+
+# Frozen copies of lms_public.services.fingerprint as of this migration,
+# so that later changes to it do not change what this migration does
+TRACKED_FIELDS = (
+    "is_exercise",
+    "is_exercise_finished",
+    "exercise_deadline",
+    "has_attachment",
+    "attachment_link",
+    "attachment_name",
+    "exercise_name",
+    "exercise_start",
+    "is_online_session",
+    "online_session_name",
+    "online_session_link",
+    "online_session_status",
+    "online_session_start",
+    "online_session_end",
+)
+FIELD_SEPARATOR = "\x1f"
+
+
+def compute_content_hash(values: dict) -> str:
+    content = FIELD_SEPARATOR.join(
+        str(values[field]) for field in TRACKED_FIELDS
+    )
+    return hashlib.blake2b(content.encode(), digest_size=16).hexdigest()
+
+
+def backfill_content_hash(apps, schema_editor):
+    PublicMessage = apps.get_model("lms_public", "PublicMessage")
+    batch = list()
+    for message in PublicMessage.objects.only(*TRACKED_FIELDS).iterator(
+        chunk_size=BATCH_SIZE
+    ):
+        message.content_hash = compute_content_hash(
+            {field: getattr(message, field) for field in TRACKED_FIELDS}
+        )
+        batch.append(message)
+        if len(batch) == BATCH_SIZE:
+            PublicMessage.objects.bulk_update(batch, ["content_hash"])
+            batch = list()
+    PublicMessage.objects.bulk_update(batch, ["content_hash"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("lms_public", "0002_version_lookup_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="publicmessage",
+            name="content_hash",
+            field=models.CharField(blank=True, max_length=32),
+        ),
+        migrations.RunPython(backfill_content_hash, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.7 on 2026-10-18 08:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("lms_public", "0003_publicmessage_content_hash"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="lmscourse",
+            name="etag",
+            field=models.CharField(blank=True, max_length=256),
+        ),
+        migrations.AddField(
+            model_name="lmscourse",
+            name="last_modified",
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name="lmscourse",
+            name="page_hash",
+            field=models.CharField(blank=True, max_length=32),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.1.7 on 2026-10-18 08:20
+
+from django.conf import settings
+from django.db import migrations
+from django.utils import timezone
+
+
+def move_to_poll_buckets(apps, schema_editor):
+    IntervalSchedule = apps.get_model("django_celery_beat", "IntervalSchedule")
+    PeriodicTask = apps.get_model("django_celery_beat", "PeriodicTask")
+    PeriodicTasks = apps.get_model("django_celery_beat", "PeriodicTasks")
+    UserNotificationPreference = apps.get_model(
+        "lms_public", "UserNotificationPreference"
+    )
+
+    intervals = (
+        UserNotificationPreference.objects.values_list(
+            "public_lms_interval_minutes", flat=True
+        )
+        .order_by()
+        .distinct()
+    )
+    for interval_minutes in intervals:
+        interval_schedule, _ = IntervalSchedule.objects.get_or_create(
+            every=interval_minutes, period="minutes"
+        )
+        for shard in range(settings.LMS_POLL_SHARDS):
+            PeriodicTask.objects.update_or_create(
+                name=(
+                    f"Check messages every {interval_minutes} min, "
+                    f"shard {shard}"
+                ),
+                task="lms_public.tasks.check_new_messages_bucket_task",
+                defaults={
+                    "interval": interval_schedule,
+                    "args": f"[{interval_minutes}, {shard}]",
+                },
+            )
+    PeriodicTask.objects.filter(
+        task="lms_public.tasks.check_new_messages_task",
+        name__startswith="Check messages for user ",
+    ).delete()
+    # Tell beat that the schedule has changed
+    PeriodicTasks.objects.update_or_create(
+        ident=1, defaults={"last_update": timezone.now()}
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("django_celery_beat", "0019_alter_periodictasks_options"),
+        ("lms_public", "0004_lmscourse_page_validators"),
+    ]
+
+    operations = [
+        migrations.RunPython(move_to_poll_buckets, migrations.RunPython.noop),
+    ]
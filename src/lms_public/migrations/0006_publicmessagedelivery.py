@@ -0,0 +1,52 @@
+# Generated by Django 5.1.7 on 2026-10-18 08:19
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("lms_public", "0005_poll_buckets"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PublicMessageDelivery",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("chat_id", models.CharField(max_length=64)),
+                ("attempts", models.PositiveSmallIntegerField(default=0)),
+                (
+                    "next_attempt_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                (
+                    "message",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="delivery",
+                        to="lms_public.publicmessage",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["next_attempt_at"], name="delivery_due_idx"
+                    ),
+                    models.Index(fields=["chat_id"], name="delivery_chat_idx"),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,105 @@
+# Generated by Django 5.1.7 on 2026-10-18 08:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("lms_public", "0006_publicmessagedelivery"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="WallItem",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("suffix_url", models.CharField(max_length=32)),
+                ("item_id", models.CharField(max_length=64)),
+                ("author", models.CharField(max_length=64)),
+                ("text", models.TextField(blank=True)),
+                ("header", models.TextField(blank=True)),
+                ("footer", models.TextField(blank=True)),
+                ("sent_at", models.CharField(max_length=64)),
+                ("has_attachment", models.BooleanField(default=False)),
+                (
+                    "attachment_name",
+                    models.CharField(blank=True, max_length=128),
+                ),
+                (
+                    "attachment_link",
+                    models.CharField(blank=True, max_length=256),
+                ),
+                ("is_exercise", models.BooleanField(default=False)),
+                ("is_exercise_finished", models.BooleanField(default=False)),
+                (
+                    "exercise_name",
+                    models.CharField(blank=True, max_length=128),
+                ),
+                (
+                    "exercise_start",
+                    models.CharField(blank=True, max_length=64),
+                ),
+                (
+                    "exercise_deadline",
+                    models.CharField(blank=True, max_length=64),
+                ),
+                ("is_online_session", models.BooleanField(default=False)),
+                (
+                    "online_session_name",
+                    models.CharField(blank=True, max_length=128),
+                ),
+                (
+                    "online_session_link",
+                    models.CharField(blank=True, max_length=256),
+                ),
+                (
+                    "online_session_status",
+                    models.CharField(blank=True, max_length=64),
+                ),
+                (
+                    "online_session_start",
+                    models.CharField(blank=True, max_length=64),
+                ),
+                (
+                    "online_session_end",
+                    models.CharField(blank=True, max_length=64),
+                ),
+                ("content_hash", models.CharField(blank=True, max_length=32)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=[
+                            "suffix_url",
+                            "item_id",
+                            "author",
+                            "sent_at",
+                            "-id",
+                        ],
+                        name="wall_item_version_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.AddField(
+            model_name="publicmessage",
+            name="wall_item",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="messages",
+                to="lms_public.wallitem",
+            ),
+        ),
+    ]
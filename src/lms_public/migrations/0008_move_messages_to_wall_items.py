@@ -0,0 +1,113 @@
+# Generated by Django 5.1.7 on 2026-10-18 08:41
+
+from itertools import count
+
+from django.db import migrations
+
+BATCH_SIZE = 2000
+
+# The fields of a wall item version, stored once for every user who has it
+CONTENT_FIELDS = (
+    "item_id",
+    "author",
+    "text",
+    "header",
+    "footer",
+    "sent_at",
+    "has_attachment",
+    "attachment_name",
+    "attachment_link",
+    "is_exercise",
+    "is_exercise_finished",
+    "exercise_name",
+    "exercise_start",
+    "exercise_deadline",
+    "is_online_session",
+    "online_session_name",
+    "online_session_link",
+    "online_session_status",
+    "online_session_start",
+    "online_session_end",
+    "content_hash",
+)
+# Tell the changes from the version a user had before, so users who saw
+# the same version may differ in them. Versions are told apart without
+# them, as `sync_wall_items` does.
+CHANGE_FIELDS = ("header", "footer")
+VERSION_FIELDS = tuple(
+    field for field in CONTENT_FIELDS if field not in CHANGE_FIELDS
+)
+
+
+def move_messages_to_wall_items(apps, schema_editor):
+    """Store every distinct version of a wall item once per course page,
+    and point the messages of every user at it. A version keeps the header
+    and footer of its first message. Versions are numbered in the pk order
+    of their first messages, and inserted in that order, so later versions
+    get higher pks, as the version lookups expect.
+    """
+    PublicMessage = apps.get_model("lms_public", "PublicMessage")
+    WallItem = apps.get_model("lms_public", "WallItem")
+
+    version_numbers = count()
+    latest_versions = dict()
+    user_versions = set()
+    wall_item_pks = dict()
+
+    def move_batch(batch):
+        new_wall_items = dict()
+        message_versions = list()
+        for message in batch:
+            key = (message.lms_course.suffix_url,) + tuple(
+                getattr(message, field) for field in VERSION_FIELDS
+            )
+            version = latest_versions.get(key)
+            if version is None or (message.user_id, version) in user_versions:
+                # New content, or content a user sees again, e.g. an edit
+                # that was reverted: each time is a version of its own,
+                # shared by the users who see it then
+                version = next(version_numbers)
+                latest_versions[key] = version
+                new_wall_items[version] = WallItem(
+                    suffix_url=message.lms_course.suffix_url,
+                    **{
+                        field: getattr(message, field)
+                        for field in CONTENT_FIELDS
+                    },
+                )
+            user_versions.add((message.user_id, version))
+            message_versions.append(version)
+
+        WallItem.objects.bulk_create(new_wall_items.values())
+        wall_item_pks.update(
+            (version, wall_item.pk)
+            for version, wall_item in new_wall_items.items()
+        )
+        for message, version in zip(batch, message_versions):
+            message.wall_item_id = wall_item_pks[version]
+        PublicMessage.objects.bulk_update(batch, ["wall_item"])
+
+    batch = list()
+    messages = (
+        PublicMessage.objects.select_related("lms_course")
+        .only("user_id", "lms_course__suffix_url", *CONTENT_FIELDS)
+        .order_by("pk")
+    )
+    for message in messages.iterator(chunk_size=BATCH_SIZE):
+        batch.append(message)
+        if len(batch) == BATCH_SIZE:
+            move_batch(batch)
+            batch = list()
+    move_batch(batch)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("lms_public", "0007_wallitem"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            move_messages_to_wall_items, migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,117 @@
+# Generated by Django 5.1.7 on 2026-10-18 08:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("common", "0001_initial"),
+        ("lms_public", "0008_move_messages_to_wall_items"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="publicmessage",
+            name="public_message_version_idx",
+        ),
+        migrations.RemoveField(
+            model_name="publicmessage",
+            name="attachment_link",
+        ),
+        migrations.RemoveField(
+            model_name="publicmessage",
+            name="attachment_name",
+        ),
+        migrations.RemoveField(
+            model_name="publicmessage",
+            name="author",
+        ),
+        migrations.RemoveField(
+            model_name="publicmessage",
+            name="content_hash",
+        ),
+        migrations.RemoveField(
+            model_name="publicmessage",
+            name="exercise_deadline",
+        ),
+        migrations.RemoveField(
+            model_name="publicmessage",
+            name="exercise_name",
+        ),
+        migrations.RemoveField(
+            model_name="publicmessage",
+            name="exercise_start",
+        ),
+        migrations.RemoveField(
+            model_name="publicmessage",
+            name="footer",
+        ),
+        migrations.RemoveField(
+            model_name="publicmessage",
+            name="has_attachment",
+        ),
+        migrations.RemoveField(
+            model_name="publicmessage",
+            name="header",
+        ),
+        migrations.RemoveField(
+            model_name="publicmessage",
+            name="is_exercise",
+        ),
+        migrations.RemoveField(
+            model_name="publicmessage",
+            name="is_exercise_finished",
+        ),
+        migrations.RemoveField(
+            model_name="publicmessage",
+            name="is_online_session",
+        ),
+        migrations.RemoveField(
+            model_name="publicmessage",
+            name="item_id",
+        ),
+        migrations.RemoveField(
+            model_name="publicmessage",
+            name="online_session_end",
+        ),
+        migrations.RemoveField(
+            model_name="publicmessage",
+            name="online_session_link",
+        ),
+        migrations.RemoveField(
+            model_name="publicmessage",
+            name="online_session_name",
+        ),
+        migrations.RemoveField(
+            model_name="publicmessage",
+            name="online_session_start",
+        ),
+        migrations.RemoveField(
+            model_name="publicmessage",
+            name="online_session_status",
+        ),
+        migrations.RemoveField(
+            model_name="publicmessage",
+            name="sent_at",
+        ),
+        migrations.RemoveField(
+            model_name="publicmessage",
+            name="text",
+        ),
+        migrations.AlterField(
+            model_name="publicmessage",
+            name="wall_item",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="messages",
+                to="lms_public.wallitem",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="publicmessage",
+            constraint=models.UniqueConstraint(
+                fields=("user", "wall_item"), name="unique_user_wall_item"
+            ),
+        ),
+    ]
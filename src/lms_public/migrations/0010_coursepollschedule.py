@@ -0,0 +1,49 @@
+# Generated by Django 5.1.7 on 2026-10-18 08:46
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("lms_public", "0009_remove_publicmessage_content"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CoursePollSchedule",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("suffix_url", models.CharField(max_length=32, unique=True)),
+                ("changes_per_day", models.FloatField(default=0)),
+                ("is_hot", models.BooleanField(default=False)),
+                ("planned_interval_seconds", models.PositiveIntegerField()),
+                ("unchanged_polls", models.PositiveIntegerField(default=0)),
+                (
+                    "last_polled_at",
+                    models.DateTimeField(blank=True, null=True),
+                ),
+                (
+                    "next_poll_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["next_poll_at"], name="course_poll_due_idx"
+                    )
+                ],
+            },
+        ),
+    ]
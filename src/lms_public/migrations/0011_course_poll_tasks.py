@@ -0,0 +1,50 @@
+# Generated by Django 5.1.7 on 2026-10-18 08:52
+
+from django.db import migrations
+from django.utils import timezone
+
+# The defaults of POLL_PLAN_MINUTES and LMS_POLL_TICK_SECONDS. Signing a
+# user up schedules the tasks again with the current settings.
+PLAN_MINUTES = 15
+TICK_SECONDS = 15
+
+
+def move_to_course_polls(apps, schema_editor):
+    IntervalSchedule = apps.get_model("django_celery_beat", "IntervalSchedule")
+    PeriodicTask = apps.get_model("django_celery_beat", "PeriodicTask")
+    PeriodicTasks = apps.get_model("django_celery_beat", "PeriodicTasks")
+
+    PeriodicTask.objects.filter(
+        task="lms_public.tasks.check_new_messages_bucket_task"
+    ).delete()
+    plan_schedule, _ = IntervalSchedule.objects.get_or_create(
+        every=PLAN_MINUTES, period="minutes"
+    )
+    PeriodicTask.objects.update_or_create(
+        name="Plan course polls",
+        task="lms_public.tasks.plan_course_polls_task",
+        defaults={"interval": plan_schedule},
+    )
+    tick_schedule, _ = IntervalSchedule.objects.get_or_create(
+        every=TICK_SECONDS, period="seconds"
+    )
+    PeriodicTask.objects.update_or_create(
+        name="Poll due course pages",
+        task="lms_public.tasks.poll_due_courses_task",
+        defaults={"interval": tick_schedule},
+    )
+    # Tell beat that the schedule has changed
+    PeriodicTasks.objects.update_or_create(
+        ident=1, defaults={"last_update": timezone.now()}
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("django_celery_beat", "0019_alter_periodictasks_options"),
+        ("lms_public", "0010_coursepollschedule"),
+    ]
+
+    operations = [
+        migrations.RunPython(move_to_course_polls, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.1.7 on 2026-10-18 08:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("lms_public", "0011_course_poll_tasks"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CourseWakeUp",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("suffix_url", models.CharField(max_length=32)),
+                ("wake_at", models.DateTimeField()),
+                ("reason", models.CharField(max_length=32)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(fields=["wake_at"], name="course_wake_up_idx")
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("suffix_url", "wake_at"),
+                        name="unique_course_wake_up",
+                    )
+                ],
+            },
+        ),
+    ]
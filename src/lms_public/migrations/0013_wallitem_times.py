@@ -0,0 +1,57 @@
+# Generated by Django 5.1.7 on 2026-10-18 08:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("lms_public", "0012_coursewakeup"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="wallitem",
+            name="exercise_deadline_time",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="wallitem",
+            name="exercise_start_time",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="wallitem",
+            name="online_session_end_time",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="wallitem",
+            name="online_session_start_time",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="wallitem",
+            name="sent_time",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="wallitem",
+            index=models.Index(
+                fields=["sent_time"], name="wall_item_sent_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="wallitem",
+            index=models.Index(
+                fields=["exercise_deadline_time"],
+                name="wall_item_deadline_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="wallitem",
+            index=models.Index(
+                fields=["online_session_start_time"],
+                name="wall_item_session_idx",
+            ),
+        ),
+    ]
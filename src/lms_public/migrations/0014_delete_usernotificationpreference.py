@@ -0,0 +1,15 @@
+# Generated by Django 5.1.7 on 2026-10-18 09:40
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("lms_public", "0013_wallitem_times"),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name="UserNotificationPreference",
+        ),
+    ]
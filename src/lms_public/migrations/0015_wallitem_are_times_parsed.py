@@ -0,0 +1,42 @@
+# Generated by Django 5.1.7 on 2026-10-18 09:58
+
+from django.db import migrations, models
+from django.db.models import Q
+
+# The times of a wall item were parsed if any of them is set
+TIME_COLUMNS = (
+    "sent_time",
+    "exercise_start_time",
+    "exercise_deadline_time",
+    "online_session_start_time",
+    "online_session_end_time",
+)
+
+
+def mark_parsed_times(apps, schema_editor):
+    WallItem = apps.get_model("lms_public", "WallItem")
+    has_time = Q()
+    for column in TIME_COLUMNS:
+        has_time |= Q(**{f"{column}__isnull": False})
+    WallItem.objects.filter(has_time).update(are_times_parsed=True)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("lms_public", "0014_delete_usernotificationpreference"),
+    ]
+
+    operations = [
+        # The stored wall items are left to backfill_wall_item_times
+        migrations.AddField(
+            model_name="wallitem",
+            name="are_times_parsed",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(mark_parsed_times, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="wallitem",
+            name="are_times_parsed",
+            field=models.BooleanField(default=True),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 from common.models import LMSUser, TimeStampBaseModel
 
@@ -10,19 +11,31 @@ class LMSCourse(TimeStampBaseModel):
     name = models.CharField(max_length=128)
     suffix_url = models.CharField(max_length=32)
     is_active = models.BooleanField(default=True)
+    # Validators of the last fetched course page
+    etag = models.CharField(max_length=256, blank=True)
+    last_modified = models.CharField(max_length=64, blank=True)
+    page_hash = models.CharField(max_length=32, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "suffix_url"], name="unique_user_course"
+            ),
+        ]
 
     def __str__(self):
         return f"{self.name}"
 
 
-class PublicMessage(TimeStampBaseModel):
-    user = models.ForeignKey(
-        LMSUser, related_name="public_messages", on_delete=models.CASCADE
-    )
+class WallItem(TimeStampBaseModel):
+    """A version of an item of a course wall. It is stored once for all
+    the users enrolled in the course, who each get a PublicMessage of it.
+    See lms_public.services.wall_items
+    """
+
+    # The course page, shared by the LMSCourses of its users
+    suffix_url = models.CharField(max_length=32)
     item_id = models.CharField(max_length=64)
-    lms_course = models.ForeignKey(
-        LMSCourse, related_name="messages", on_delete=models.CASCADE
-    )
     author = models.CharField(max_length=64)
     text = models.TextField(blank=True)  # For online sessions
     header = models.TextField(blank=True)
@@ -43,12 +56,138 @@ class PublicMessage(TimeStampBaseModel):
     online_session_start = models.CharField(max_length=64, blank=True)
     online_session_end = models.CharField(max_length=64, blank=True)
 
+    # The times above, parsed (see lms_public.services.dates); null if
+    # there is none, or it could not be parsed
+    sent_time = models.DateTimeField(null=True, blank=True)
+    exercise_start_time = models.DateTimeField(null=True, blank=True)
+    exercise_deadline_time = models.DateTimeField(null=True, blank=True)
+    online_session_start_time = models.DateTimeField(null=True, blank=True)
+    online_session_end_time = models.DateTimeField(null=True, blank=True)
+    # False for the items stored before their times were parsed, until
+    # `manage.py backfill_wall_item_times` has tried to parse them
+    are_times_parsed = models.BooleanField(default=True)
+
+    # See lms_public.services.fingerprint
+    content_hash = models.CharField(max_length=32, blank=True)
+
+    class Meta:
+        indexes = [
+            # Serves "latest version of this wall item" lookups
+            models.Index(
+                fields=["suffix_url", "item_id", "author", "sent_at", "-id"],
+                name="wall_item_version_idx",
+            ),
+            # Serve range queries on the times, e.g. upcoming deadlines
+            models.Index(fields=["sent_time"], name="wall_item_sent_idx"),
+            models.Index(
+                fields=["exercise_deadline_time"],
+                name="wall_item_deadline_idx",
+            ),
+            models.Index(
+                fields=["online_session_start_time"],
+                name="wall_item_session_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.suffix_url} <-> {self.author}"
+
+
+class PublicMessage(TimeStampBaseModel):
+    """A version of a wall item, as a message of one user"""
+
+    user = models.ForeignKey(
+        LMSUser, related_name="public_messages", on_delete=models.CASCADE
+    )
+    lms_course = models.ForeignKey(
+        LMSCourse, related_name="messages", on_delete=models.CASCADE
+    )
+    wall_item = models.ForeignKey(
+        WallItem, related_name="messages", on_delete=models.CASCADE
+    )
     is_sent = models.BooleanField(default=False)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "wall_item"], name="unique_user_wall_item"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user} <-> {self.wall_item_id}"
+
+
+class PublicMessageDelivery(TimeStampBaseModel):
+    """A notification of a PublicMessage waiting to be sent to Telegram,
+    written in the same transaction as the message (an outbox). It is
+    deleted once sent. See lms_public.services.outbox
+    """
+
+    message = models.OneToOneField(
+        PublicMessage, related_name="delivery", on_delete=models.CASCADE
+    )
+    chat_id = models.CharField(max_length=64)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # Not sent before this time: debounced, claimed, or backing off
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["next_attempt_at"], name="delivery_due_idx"),
+            models.Index(fields=["chat_id"], name="delivery_chat_idx"),
+        ]
+
     def __str__(self):
-        return f"{self.user} <-> {self.author}"
+        return f"{self.chat_id} <- {self.message_id}"
 
 
-class UserNotificationPreference(models.Model):
-    user = models.OneToOneField(LMSUser, on_delete=models.CASCADE)
-    public_lms_interval_minutes = models.PositiveIntegerField(default=5)
+class CoursePollSchedule(TimeStampBaseModel):
+    """When a course page is polled next, shared by the LMSCourses of its
+    users. See lms_public.services.polling
+    """
+
+    suffix_url = models.CharField(max_length=32, unique=True)
+    # Estimated from the history of its wall items
+    changes_per_day = models.FloatField(default=0)
+    # A deadline or an online session of the course is close
+    is_hot = models.BooleanField(default=False)
+    # Interval given by the planner, before backing off
+    planned_interval_seconds = models.PositiveIntegerField()
+    # Polls in a row which found the page unchanged
+    unchanged_polls = models.PositiveIntegerField(default=0)
+    last_polled_at = models.DateTimeField(null=True, blank=True)
+    # Not polled before this time: waiting, or claimed by a worker
+    next_poll_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["next_poll_at"], name="course_poll_due_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.suffix_url} @ {self.next_poll_at}"
+
+
+class CourseWakeUp(TimeStampBaseModel):
+    """A one-off poll of a course page around the time of one of its
+    items, e.g. the deadline of an exercise. See lms_public.services.polling
+    """
+
+    suffix_url = models.CharField(max_length=32)
+    wake_at = models.DateTimeField()
+    # The field of the item whose time it is, e.g. "exercise_deadline"
+    reason = models.CharField(max_length=32)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["suffix_url", "wake_at"], name="unique_course_wake_up"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["wake_at"], name="course_wake_up_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.suffix_url} @ {self.wake_at} ({self.reason})"
@@ -1,19 +1,47 @@
 import json
 
+from django.conf import settings
 from django_celery_beat.models import (
     CrontabSchedule,
     IntervalSchedule,
     PeriodicTask,
 )
 
-from lms_public.models import UserNotificationPreference
+from common.services import constants
+
+
+async def schedule_course_polls() -> None:
+    """Make sure the periodic tasks polling the course pages exist: one
+    plans the polling interval of every page, the other polls the pages
+    which are due, see `lms_public.services.polling`.
+    """
+
+    plan_schedule, _ = await IntervalSchedule.objects.aget_or_create(
+        every=constants.POLL_PLAN_MINUTES,
+        period=IntervalSchedule.MINUTES,
+    )
+    await PeriodicTask.objects.aupdate_or_create(
+        name="Plan course polls",
+        task="lms_public.tasks.plan_course_polls_task",
+        defaults={"interval": plan_schedule},
+    )
+    tick_schedule, _ = await IntervalSchedule.objects.aget_or_create(
+        every=settings.LMS_POLL_TICK_SECONDS,
+        period=IntervalSchedule.SECONDS,
+    )
+    await PeriodicTask.objects.aupdate_or_create(
+        name="Poll due course pages",
+        task="lms_public.tasks.poll_due_courses_task",
+        defaults={"interval": tick_schedule},
+    )
 
 
 # Schedule to run every Thursday at midnight (UTC)
 async def schedule_periodic_tasks(user_id: int):
-    """Schedule 2 periodic tasks:
+    """Schedule the periodic tasks of a user:
     1. Update courses every Thursday at midnight
-    2. Check messages every 5 minutes
+    2. Check messages, by polling the pages of the user's courses along
+    with those of every other user (see `schedule_course_polls`)
 
     Args:
         user_id (int): The id of the LMSUser instance
@@ -36,20 +64,9 @@ async def schedule_periodic_tasks(user_id: int):
         },
     )
 
-    # Task 2: Every 5 minutes (or user-defined interval)
-    user_pref, _ = await UserNotificationPreference.objects.aget_or_create(
-        user_id=user_id,
-        defaults={"public_lms_interval_minutes": 5},
-    )
-    interval_schedule, _ = await IntervalSchedule.objects.aget_or_create(
-        every=user_pref.public_lms_interval_minutes,
-        period=IntervalSchedule.MINUTES,
-    )
-    await PeriodicTask.objects.aupdate_or_create(
-        name=f"Check messages for user {user_id}",
-        task="lms_public.tasks.check_new_messages_task",
-        defaults={
-            "interval": interval_schedule,
-            "args": json.dumps([user_id]),
-        },
-    )
+    # Task 2: Course pages are polled for all users
+    await schedule_course_polls()
+    # Replaced by the course polls
+    await PeriodicTask.objects.filter(
+        name=f"Check messages for user {user_id}"
+    ).adelete()
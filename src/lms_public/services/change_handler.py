@@ -1,363 +1,376 @@
-from asgiref.sync import sync_to_async
+import re
+from functools import cache
+from typing import Callable, NamedTuple
 
 from common.services import constants
-from lms_public.models import PublicMessage
+from lms_public.models import PublicMessage, WallItem
+from lms_public.services.fingerprint import (
+    FIELD_BITS,
+    TrackedValues,
+    get_changed_fields,
+)
+from lms_public.services.parsers import ParsedMessage
+from lms_public.services.render import MESSAGE_BODY_TEMPLATE, escape_html
+
+# Scraped versions are ParsedMessages, stored ones are WallItems, or only
+# their tracked fields
+Message = WallItem | ParsedMessage | TrackedValues
+
+DIGEST_SEPARATOR = "\n\n➖➖➖➖➖"
+
+# A tag, an entity, or a run of text, of rendered HTML
+HTML_TOKEN = re.compile(r"<[^>]*>|&#?\w+;|[^<&]+|[<&]")
+HTML_TAG_NAME = re.compile(r"</?([a-zA-Z][\w-]*)")
+
+
+class ChangeRule(NamedTuple):
+    """A row of the change classification table. Rules are evaluated in
+    the order of the table, which is their priority: the first applicable
+    rule makes the header of the message, and each later one adds its
+    label to the minor changes in the footer.
+
+    Attributes:
+        fields (tuple[str, ...]): Tracked fields that must all have changed
+            for the rule to apply
+        header (Callable[[Message, Message], str]): Makes the header from
+            the new and old messages
+        minor_label (Callable[[Message, Message], str] | None): Makes the
+            label of the change when it is a minor one. None for rules that
+            only ever come first.
+        unless (tuple[str, ...]): Tracked fields that must not have changed
+        group (str | None): Only the first applicable rule of a group
+            applies
+        is_final (bool): Whether no later rule applies after this one
+    """
 
+    fields: tuple[str, ...]
+    header: Callable[[Message, Message], str]
+    minor_label: Callable[[Message, Message], str] | None
+    unless: tuple[str, ...] = ()
+    group: str | None = None
+    is_final: bool = False
 
-def on_is_exercise(
-    new_message: PublicMessage, old_message: PublicMessage
-) -> None:
-    """Handle exercise status change"""
-    message = new_message if new_message.is_exercise else old_message
-    exercise_name = message.exercise_name if message.exercise_name else ""
-    action = "اضافه شد." if new_message.is_exercise else "حذف شد."
-    new_message.header = f"تمرین {exercise_name} {action}"
 
+def template(text: str) -> Callable[[Message, Message], str]:
+    """A header or label made by formatting `text` with the `new` and `old`
+    messages, e.g. `"... {new.exercise_start} ..."`
+    """
+    if "{" not in text:
+        return lambda new, old: text
+    return lambda new, old: text.format(new=new, old=old)
 
-def on_is_exercise_finished(
-    new_message: PublicMessage, old_message: PublicMessage
-) -> None:
-    """Handle exercise completion status change"""
-    exercise_name = (
-        new_message.exercise_name if new_message.exercise_name else ""
-    )
-    action = (
-        "به پایان رسید." if new_message.is_exercise_finished else "تغییر کرد."
-    )
-    new_message.header = f"مهلت ارسال تمرین {exercise_name} {action}"
-
-
-def on_has_attachment(
-    new_message: PublicMessage,
-    old_message: PublicMessage,
-    has_major_change: bool,
-    minor_changes: list[str],
-) -> None:
-    """Handle attachment status change"""
-    minor_action = "افزودن" if new_message.has_attachment else "حذف"
-    major_action = "اضافه شد." if new_message.has_attachment else "حذف شد."
-    message = new_message if new_message.has_attachment else old_message
-    attachment_name = (
-        message.attachment_name if message.attachment_name else ""
-    )
 
-    if has_major_change:
-        minor_changes.append(f"{minor_action} فایل پیوست")
-    else:
-        new_message.header = f"فایل پیوست {attachment_name} {major_action}"
+def exercise_toggled(new: Message, old: Message) -> str:
+    message = new if new.is_exercise else old
+    action = "اضافه شد." if new.is_exercise else "حذف شد."
+    return f"تمرین {message.exercise_name or ''} {action}"
 
 
-def on_exercise_deadline(
-    new_message: PublicMessage,
-    has_major_change: bool,
-    minor_changes: list[str],
-) -> None:
-    """Handle exercise deadline change"""
-    exercise_name = (
-        new_message.exercise_name if new_message.exercise_name else ""
-    )
+def exercise_finished_toggled(new: Message, old: Message) -> str:
+    action = "به پایان رسید." if new.is_exercise_finished else "تغییر کرد."
+    return f"مهلت ارسال تمرین {new.exercise_name or ''} {action}"
+
+
+def exercise_deadline_changed(new: Message, old: Message) -> str:
     alert_if_still_finished = (
-        "اما مهلت همچنان تمام شده است."
-        if new_message.is_exercise_finished
-        else ""
+        "اما مهلت همچنان تمام شده است." if new.is_exercise_finished else ""
     )
-    if has_major_change:
-        minor_changes.append("تغییر مهلت ارسال تمدید")
-    else:
-        new_message.header = (
-            f"مهلت ارسال تمرین {exercise_name} تغییر کرد. "
-            f"{alert_if_still_finished}"
-        )
+    return (
+        f"مهلت ارسال تمرین {new.exercise_name or ''} تغییر کرد. "
+        f"{alert_if_still_finished}"
+    )
+
+
+def attachment_toggled(new: Message, old: Message) -> str:
+    message = new if new.has_attachment else old
+    action = "اضافه شد." if new.has_attachment else "حذف شد."
+    return f"فایل پیوست {message.attachment_name or ''} {action}"
+
+
+def attachment_toggled_label(new: Message, old: Message) -> str:
+    action = "افزودن" if new.has_attachment else "حذف"
+    return f"{action} فایل پیوست"
 
 
-def on_attachment_link_and_text(
-    new_message: PublicMessage,
-    has_major_change: bool,
-    minor_changes: list[str],
-) -> None:
-    """Handle attachment link and text change"""
+def attachment_replaced(new: Message, old: Message) -> str:
     attachment_name = (
-        f"به نام {new_message.attachment_name}"
-        if new_message.attachment_name
-        else ""
+        f"به نام {new.attachment_name}" if new.attachment_name else ""
     )
-    if has_major_change:
-        minor_changes.append("آپلود فایل پیوست جدید")
-    else:
-        new_message.header = f"فایل پیوست جدیدی {attachment_name} آپلود شد."
-
-
-def on_attachment_link(
-    new_message: PublicMessage,
-    has_major_change: bool,
-    minor_changes: list[str],
-) -> None:
-    """Handle attachment link change"""
-    if has_major_change:
-        minor_changes.append("تغییر لینک فایل پیوست")
-    else:
-        new_message.header = "لینک فایل پیوست تغییر کرد."
-
-
-def on_attachment_name(
-    new_message: PublicMessage,
-    has_major_change: bool,
-    minor_changes: list[str],
-) -> None:
-    """Handle attachment name change"""
-    if has_major_change:
-        minor_changes.append("تغییر نام فایل پیوست")
-    else:
-        new_message.header = "نام فایل پیوست تغییر کرد."
-
-
-def on_exercise_name(
-    new_message: PublicMessage,
-    has_major_change: bool,
-    minor_changes: list[str],
-) -> None:
-    """Handle exercise name change"""
+    return f"فایل پیوست جدیدی {attachment_name} آپلود شد."
+
+
+def exercise_renamed(new: Message, old: Message) -> str:
     name_and_action = (
-        f"به {new_message.exercise_name} تغییر کرد."
-        if new_message.exercise_name
+        f"به {new.exercise_name} تغییر کرد."
+        if new.exercise_name
         else "حذف شد."
     )
-    if has_major_change:
-        minor_changes.append("تغییر نام تمرین")
-    else:
-        new_message.header = f"نام تمرین {name_and_action}"
-
-
-def on_exercise_start(
-    new_message: PublicMessage,
-    has_major_change: bool,
-    minor_changes: list[str],
-) -> None:
-    """Handle exercise start time change"""
-    if has_major_change:
-        minor_changes.append("تغییر زمان شروع تمرین")
-    else:
-        new_message.header = (
-            f"زمان شروع تمرین را به {new_message.exercise_start} تغییر کرد."
-        )
+    return f"نام تمرین {name_and_action}"
+
+
+CHANGE_RULES = (
+    ChangeRule(
+        fields=("is_exercise",),
+        header=exercise_toggled,
+        minor_label=None,
+        is_final=True,
+    ),
+    ChangeRule(
+        fields=("is_exercise_finished",),
+        header=exercise_finished_toggled,
+        minor_label=None,
+    ),
+    ChangeRule(
+        fields=("exercise_deadline",),
+        unless=("is_exercise_finished",),
+        header=exercise_deadline_changed,
+        minor_label=template("تغییر مهلت ارسال تمدید"),
+    ),
+    ChangeRule(
+        fields=("has_attachment",),
+        group="attachment",
+        header=attachment_toggled,
+        minor_label=attachment_toggled_label,
+    ),
+    ChangeRule(
+        fields=("attachment_link", "attachment_name"),
+        group="attachment",
+        header=attachment_replaced,
+        minor_label=template("آپلود فایل پیوست جدید"),
+    ),
+    ChangeRule(
+        fields=("attachment_link",),
+        group="attachment",
+        header=template("لینک فایل پیوست تغییر کرد."),
+        minor_label=template("تغییر لینک فایل پیوست"),
+    ),
+    ChangeRule(
+        fields=("attachment_name",),
+        group="attachment",
+        header=template("نام فایل پیوست تغییر کرد."),
+        minor_label=template("تغییر نام فایل پیوست"),
+    ),
+    ChangeRule(
+        fields=("exercise_name",),
+        header=exercise_renamed,
+        minor_label=template("تغییر نام تمرین"),
+    ),
+    ChangeRule(
+        fields=("exercise_start",),
+        header=template(
+            "زمان شروع تمرین را به {new.exercise_start} تغییر کرد."
+        ),
+        minor_label=template("تغییر زمان شروع تمرین"),
+    ),
+    ChangeRule(
+        fields=("is_online_session",),
+        header=template("یک جلسه‌ی آنلاین جدید ایجاد شد."),
+        minor_label=template("ایجاد یک جلسه‌ی آنلاین"),
+    ),
+    ChangeRule(
+        fields=("online_session_name",),
+        header=template(
+            "نام جلسه آنلاین به {new.online_session_name} تغییر کرد."
+        ),
+        minor_label=template("تغییر نام جلسه آنلاین"),
+    ),
+    ChangeRule(
+        fields=("online_session_link",),
+        header=template("لینک جلسه آنلاین تغییر کرد."),
+        minor_label=template("تغییر لینک جلسه آنلاین"),
+    ),
+    ChangeRule(
+        fields=("online_session_status",),
+        header=template(
+            "وضعیت جلسه آنلاین به {new.online_session_status} تغییر کرد."
+        ),
+        minor_label=template("تغییر وضعیت جلسه آنلاین"),
+    ),
+    ChangeRule(
+        fields=("online_session_start",),
+        header=template(
+            "زمان شروع جلسه آنلاین به {new.online_session_start} تغییر کرد."
+        ),
+        minor_label=template("تغییر زمان شروع جلسه آنلاین"),
+    ),
+    ChangeRule(
+        fields=("online_session_end",),
+        header=template(
+            "زمان پایان جلسه آنلاین به {new.online_session_end} تغییر کرد."
+        ),
+        minor_label=template("تغییر زمان پایان جلسه آنلاین"),
+    ),
+)
+
+
+class CompiledRule(NamedTuple):
+    fields_mask: int
+    unless_mask: int
+    group_mask: int
+    rule: ChangeRule
+
+
+def get_fields_mask(fields: tuple[str, ...]) -> int:
+    mask = 0
+    for field in fields:
+        mask |= FIELD_BITS[field]
+    return mask
+
+
+def compile_rules(rules: tuple[ChangeRule, ...]) -> tuple[CompiledRule, ...]:
+    """Turn the fields of the rules into masks of `FIELD_BITS`, and each
+    group into a bit of its own, so that applying a rule is a few integer
+    operations
+
+    Args:
+        rules (tuple[ChangeRule, ...]): The table, in order
 
+    Returns:
+        (tuple[CompiledRule, ...]): The compiled rules, in the same order
+    """
 
-def on_is_online_session(
-    new_message: PublicMessage,
-    has_major_change: bool,
-    minor_changes: list[str],
-) -> None:
-    """Handle online session status change"""
-    if has_major_change:
-        minor_changes.append("ایجاد یک جلسه‌ی آنلاین")
-    else:
-        new_message.header = "یک جلسه‌ی آنلاین جدید ایجاد شد."
-
-
-def on_online_session_name(
-    new_message: PublicMessage,
-    has_major_change: bool,
-    minor_changes: list[str],
-) -> None:
-    """Handle online session name change"""
-    if has_major_change:
-        minor_changes.append("تغییر نام جلسه آنلاین")
-    else:
-        new_message.header = (
-            f"نام جلسه آنلاین به {new_message.online_session_name} تغییر کرد."
+    group_bits: dict[str, int] = dict()
+    for rule in rules:
+        if rule.group is not None:
+            group_bits.setdefault(rule.group, 1 << len(group_bits))
+    return tuple(
+        CompiledRule(
+            fields_mask=get_fields_mask(rule.fields),
+            unless_mask=get_fields_mask(rule.unless),
+            group_mask=group_bits.get(rule.group, 0),
+            rule=rule,
         )
+        for rule in rules
+    )
 
 
-def on_online_session_link(
-    new_message: PublicMessage,
-    has_major_change: bool,
-    minor_changes: list[str],
-) -> None:
-    """Handle online session link change"""
-    if has_major_change:
-        minor_changes.append("تغییر لینک جلسه آنلاین")
-    else:
-        new_message.header = "لینک جلسه آنلاین تغییر کرد."
-
-
-def on_online_session_status(
-    new_message: PublicMessage,
-    has_major_change: bool,
-    minor_changes: list[str],
-) -> None:
-    """Handle online session status change"""
-    if has_major_change:
-        minor_changes.append("تغییر وضعیت جلسه آنلاین")
-    else:
-        new_message.header = f"وضعیت جلسه آنلاین به {new_message.online_session_status} تغییر کرد."
-
-
-def on_online_session_start(
-    new_message: PublicMessage,
-    has_major_change: bool,
-    minor_changes: list[str],
-) -> None:
-    """Handle online session start time change"""
-    if has_major_change:
-        minor_changes.append("تغییر زمان شروع جلسه آنلاین")
-    else:
-        new_message.header = f"زمان شروع جلسه آنلاین به {new_message.online_session_start} تغییر کرد."
-
-
-def on_online_session_end(
-    new_message: PublicMessage,
-    has_major_change: bool,
-    minor_changes: list[str],
-) -> None:
-    """Handle online session end time change"""
-    if has_major_change:
-        minor_changes.append("تغییر زمان پایان جلسه آنلاین")
-    else:
-        new_message.header = f"زمان پایان جلسه آنلاین به {new_message.online_session_end} تغییر کرد."
-
-
-def is_x_changed(
-    old_message: PublicMessage, new_message: PublicMessage
-) -> dict[str, bool]:
-    """Check which properties have changed between messages"""
-    return {
-        "is_exercise_changed": old_message.is_exercise
-        != new_message.is_exercise,
-        "is_exercise_finished_changed": old_message.is_exercise_finished
-        != new_message.is_exercise_finished,
-        "is_exercise_deadline_changed": old_message.exercise_deadline
-        != new_message.exercise_deadline,
-        "is_has_attachment_changed": old_message.has_attachment
-        != new_message.has_attachment,
-        "is_attachment_link_changed": old_message.attachment_link
-        != new_message.attachment_link,
-        "is_attachment_name_changed": old_message.attachment_name
-        != new_message.attachment_name,
-        "is_exercise_name_changed": old_message.exercise_name
-        != new_message.exercise_name,
-        "is_exercise_start_changed": old_message.exercise_start
-        != new_message.exercise_start,
-        "is_online_session_changed": old_message.is_online_session
-        != new_message.is_online_session,
-        "is_online_session_name_changed": old_message.online_session_name
-        != new_message.online_session_name,
-        "is_online_session_link_changed": old_message.online_session_link
-        != new_message.online_session_link,
-        "is_online_session_status_changed": old_message.online_session_status
-        != new_message.online_session_status,
-        "is_online_session_start_changed": old_message.online_session_start
-        != new_message.online_session_start,
-        "is_online_session_end_changed": old_message.online_session_end
-        != new_message.online_session_end,
-    }
+COMPILED_CHANGE_RULES = compile_rules(CHANGE_RULES)
 
 
-def add_message_header_footer(
-    new_message: PublicMessage, old_message: PublicMessage | None
-) -> None:
-    """Add appropriate header and footer to message based on changes"""
-    has_major_change = False
-    if not old_message:
-        # The major change is being a new message
-        has_major_change = True
-        return has_major_change
-
-    changes = is_x_changed(old_message, new_message)
-    minor_changes: list[str] = list()
-
-    if changes["is_exercise_changed"]:
-        on_is_exercise(new_message, old_message)
-        has_major_change = True
-        return has_major_change
-
-    if changes["is_exercise_finished_changed"]:
-        on_is_exercise_finished(new_message, old_message)
-        has_major_change = True
-
-    if (
-        changes["is_exercise_deadline_changed"]
-        and not changes["is_exercise_finished_changed"]
-    ):
-        on_exercise_deadline(new_message, has_major_change, minor_changes)
-        has_major_change = True
-
-    if changes["is_has_attachment_changed"]:
-        on_has_attachment(
-            new_message, old_message, has_major_change, minor_changes
-        )
-        has_major_change = True
-    elif (
-        changes["is_attachment_link_changed"]
-        and changes["is_attachment_name_changed"]
-    ):
-        on_attachment_link_and_text(
-            new_message, has_major_change, minor_changes
-        )
-        has_major_change = True
-    elif changes["is_attachment_link_changed"]:
-        on_attachment_link(new_message, has_major_change, minor_changes)
-        has_major_change = True
-    elif changes["is_attachment_name_changed"]:
-        on_attachment_name(new_message, has_major_change, minor_changes)
-        has_major_change = True
-
-    if changes["is_exercise_name_changed"]:
-        on_exercise_name(new_message, has_major_change, minor_changes)
-        has_major_change = True
-
-    if changes["is_exercise_start_changed"]:
-        on_exercise_start(new_message, has_major_change, minor_changes)
-        has_major_change = True
-
-    if changes["is_online_session_changed"]:
-        on_is_online_session(new_message, has_major_change, minor_changes)
-        has_major_change = True
-
-    if changes["is_online_session_name_changed"]:
-        on_online_session_name(new_message, has_major_change, minor_changes)
-        has_major_change = True
-
-    if changes["is_online_session_link_changed"]:
-        on_online_session_link(new_message, has_major_change, minor_changes)
-        has_major_change = True
-
-    if changes["is_online_session_status_changed"]:
-        on_online_session_status(new_message, has_major_change, minor_changes)
-        has_major_change = True
-
-    if changes["is_online_session_start_changed"]:
-        on_online_session_start(new_message, has_major_change, minor_changes)
-        has_major_change = True
-
-    if changes["is_online_session_end_changed"]:
-        on_online_session_end(new_message, has_major_change, minor_changes)
-        has_major_change = True
-
-    if minor_changes:
-        footer_items = (
-            "\n- ".join(minor_changes)
-            if isinstance(minor_changes, list)
-            else minor_changes
-        )
-        new_message.footer = footer_items
+class Classification(NamedTuple):
+    header: Callable[[Message, Message], str]
+    minor_labels: tuple[Callable[[Message, Message], str], ...]
+
+
+@cache
+def classify_changes(changed_fields: int) -> Classification | None:
+    """Apply the change rules to a changed-fields mask. The result only
+    depends on the mask, so it is worked out once per mask.
+
+    Args:
+        changed_fields (int): The changed-fields mask of a message, see
+            `fingerprint.get_changed_fields`
+
+    Returns:
+        (Classification | None): What makes the header and the minor
+            changes of the message, or None if no rule applies
+    """
+
+    rules = list()
+    applied_groups = 0
+    for fields_mask, unless_mask, group_mask, rule in COMPILED_CHANGE_RULES:
+        if (
+            changed_fields & fields_mask != fields_mask
+            or changed_fields & unless_mask
+            or applied_groups & group_mask
+        ):
+            continue
+        applied_groups |= group_mask
+        rules.append(rule)
+        if rule.is_final:
+            break
+
+    if not rules:
+        return None
+    return Classification(
+        header=rules[0].header,
+        minor_labels=tuple(rule.minor_label for rule in rules[1:]),
+    )
+
+
+def apply_changes(
+    new_message: Message, old_message: Message, changed_fields: int
+) -> bool:
+    """Set the header and footer of a message from its changed-fields mask
 
-    return has_major_change
+    Returns:
+        bool: Whether a rule applied to the changes
+    """
+    classification = classify_changes(changed_fields)
+    if classification is None:
+        return False
+
+    header, minor_labels = classification
+    new_message.header = header(new_message, old_message)
+    if minor_labels:
+        new_message.footer = "\n- ".join(
+            [
+                minor_label(new_message, old_message)
+                for minor_label in minor_labels
+            ]
+        )
+    return True
 
 
-def has_message_changed(
-    new_message: PublicMessage, old_message: PublicMessage | None
+def add_message_header_footer(
+    new_message: Message, old_message: Message | None
 ) -> bool:
-    """Determine if message has changed"""
+    """Add appropriate header and footer to message based on changes, see
+    `CHANGE_RULES`
+
+    Returns:
+        bool: Whether the message is new, or a tracked field changed
+    """
     if not old_message:
+        # The major change is being a new message
         return True
 
-    changes = is_x_changed(old_message, new_message)
-    return any(changes.values())
+    return apply_changes(
+        new_message=new_message,
+        old_message=old_message,
+        changed_fields=get_changed_fields(old_message, new_message),
+    )
+
+
+def add_headers_footers(
+    new_messages: list[Message], old_messages: list[Message | None]
+) -> list[bool]:
+    """Add headers and footers to many messages at once, as
+    `add_message_header_footer` does to one, e.g. a whole onboarding scrape.
+    The changed fields of all of them are computed in one pass, and the
+    text is only made for the messages that changed.
+
+    Args:
+        new_messages (list[Message]): The scraped versions
+        old_messages (list[Message | None]): The stored versions, in the
+            same order, e.g. `TrackedValues`; None for new messages
+
+    Returns:
+        list[bool]: Whether each message is new, or a tracked field changed
+    """
+    are_changed = [old_message is None for old_message in old_messages]
+    updated = [index for index, is_new in enumerate(are_changed) if not is_new]
+    changed_fields = map(
+        get_changed_fields,
+        [old_messages[index] for index in updated],
+        [new_messages[index] for index in updated],
+    )
+    for index, fields in zip(updated, changed_fields):
+        if fields:
+            are_changed[index] = apply_changes(
+                new_message=new_messages[index],
+                old_message=old_messages[index],
+                changed_fields=fields,
+            )
+    return are_changed
 
 
-async def public_message_to_html(message: PublicMessage) -> str:
+def public_message_to_html(message: PublicMessage) -> str:
     """
-    Converts a PublicMessage object to HTML representation.
+    Converts a PublicMessage object to HTML representation, escaping the
+    LMS-sourced text. Its course and wall item must be preloaded (e.g. with
+    `select_related("lms_course", "wall_item")`), as rendering makes no
+    queries.
 
     Args:
         message: PublicMessage object to convert
@@ -365,70 +378,148 @@ async def public_message_to_html(message: PublicMessage) -> str:
     Returns:
         str: HTML representation of the message
     """
-    course_name = await sync_to_async(lambda: message.lms_course.name)()
-    course_name = f"📚  {course_name}"
+    course_name = escape_html(message.lms_course.name)
+    body = MESSAGE_BODY_TEMPLATE.render(message.wall_item)
+    return f"📚  {course_name}{body}"
+
+
+def public_messages_to_html_pages(
+    messages: list[PublicMessage],
+) -> list[str]:
+    """
+    Converts PublicMessages of the same course to one digest, split into
+    pages that each fit in a Telegram message. Every page starts with the
+    course name; a single message renders as `public_message_to_html` does.
+    Their course and wall item must be preloaded, as for
+    `public_message_to_html`.
 
-    author = f"\n\n👤  {message.author}"
-    header = f"\n\n▫️<b>{message.header}</b>" if message.header else ""
+    Args:
+        messages: PublicMessage objects of one course, in order
 
-    # Assuming 'text' field exists in PublicMessage but wasn't shown in the provided code
-    text = (
-        f"\n\n✍🏻  {message.text}"
-        if hasattr(message, "text") and message.text
-        else ""
+    Returns:
+        list[str]: HTML pages of the digest
+    """
+    course_name = escape_html(messages[0].lms_course.name)
+    bodies = MESSAGE_BODY_TEMPLATE.render_many(
+        message.wall_item for message in messages
     )
+    blocks = bodies[:1] + [DIGEST_SEPARATOR + body for body in bodies[1:]]
+    return split_html_pages(header=f"📚  {course_name}", blocks=blocks)
 
-    footer = ""
-    if hasattr(message, "footer") and message.footer:
-        footer = f"\n\nتغییرات جزئی: \n{message.footer}"
 
-    exercise_description = ""
-    if message.is_exercise:
-        exercise_description = (
-            f"\n\nنام تمرین: {message.exercise_name}\n"
-            f"زمان شروع: {message.exercise_start}\n"
-            f"مهلت ارسال: {message.exercise_deadline}"
-        )
-        if message.is_exercise_finished:
-            exercise_description += "(پایان یافته) "
-
-    attachment_description = ""
-    if message.has_attachment:
-        attachment_description = f'\n\nفایل: <a href="{constants.BASE_URL + message.attachment_link}">{message.attachment_name}</a>'
-
-    online_session_description = ""
-    if message.is_online_session:
-        online_session_status_icon = "⏳"
-        if "در حال" in message.online_session_status:
-            online_session_status_icon = "🟢"
-        elif "ضبط" in message.online_session_status:
-            online_session_status_icon = "🔴"
-        online_session_description = (
-            f'\n\n🌐 عنوان جلسه: <a href="{constants.BASE_URL + message.online_session_link}">{message.online_session_name}</a>'
-            f"\n{online_session_status_icon} وضعیت: {message.online_session_status}"
-            f"\n🚀 زمان شروع: {message.online_session_start}"
-            f"\n🏁 زمان پایان: {message.online_session_end}"
+def telegram_length(text: str) -> int:
+    """Length of a text as Telegram counts it, in UTF-16 code units"""
+    return len(text.encode("utf-16-le")) // 2
+
+
+def find_html_cut(block: str, room: int) -> tuple[int, tuple[str, ...]]:
+    """Find where to break an HTML block that is too long for the room
+    left in a page. It is never broken inside a tag or an entity. The
+    cut is preferably in the second half of the room, outside any
+    element, at a line break, then at a space. If it falls inside
+    elements, they must be closed before it and opened again after it.
+
+    Args:
+        block: The HTML block
+        room: The length left in the page
+
+    Returns:
+        tuple[int, tuple[str, ...]]: The index to cut at, and the opening
+        tags of the elements open there, outermost first
+    """
+    limit = room
+    while telegram_length(block[:limit]) > room:
+        limit -= 1
+
+    # (rank, index, open tags); the best ranked, then the latest, wins
+    candidates = list()
+    open_tags: list[str] = list()
+
+    def add_candidate(index: int, kind: int) -> None:
+        reopened = "".join(open_tags)
+        # The rest of the block must shrink, even with its tags reopened
+        if index > len(reopened):
+            rank = (index >= limit // 2, not open_tags, kind)
+            candidates.append((rank, index, tuple(open_tags)))
+
+    for token in HTML_TOKEN.finditer(block):
+        start, end = token.span()
+        if start > limit:
+            break
+        add_candidate(start, kind=0)
+        text = token.group()
+        if text.startswith("<") and text.endswith(">"):
+            if text.startswith("</"):
+                name = HTML_TAG_NAME.match(text).group(1)
+                for index in range(len(open_tags) - 1, -1, -1):
+                    if HTML_TAG_NAME.match(open_tags[index]).group(1) == name:
+                        del open_tags[index]
+                        break
+            elif not text.endswith("/>"):
+                open_tags.append(text)
+        elif not text.startswith("&"):
+            end = min(end, limit)
+            add_candidate(end, kind=0)
+            for kind, separator in ((2, "\n"), (1, " ")):
+                index = block.rfind(separator, start + 1, end)
+                if index != -1:
+                    add_candidate(index, kind=kind)
+
+    candidates.sort(reverse=True)
+    for _, index, tags in candidates:
+        closing = "".join(
+            f"</{HTML_TAG_NAME.match(tag).group(1)}>" for tag in tags
         )
-    # Assuming 'sentAt' field exists in PublicMessage but wasn't shown in the provided code
-    date = (
-        f"\n\n🕑  {message.sent_at}"
-        if hasattr(message, "sent_at") and message.sent_at
-        else ""
-    )
+        if telegram_length(block[:index]) + len(closing) <= room:
+            return index, tags
+    # A single tag or entity longer than a page
+    return limit, ()
 
-    white_space = "‌"  # Zero-width non-joiner character
-
-    message_html = (
-        f"{course_name}"
-        f"{author}"
-        f"{header}"
-        f"{text}"
-        f"{footer}"
-        f"{exercise_description}"
-        f"{attachment_description}"
-        f"{online_session_description}"
-        f"{date}"
-        f"{white_space}\n"
-    )
 
-    return message_html
+def split_html_pages(
+    header: str,
+    blocks: list[str],
+    max_length: int = constants.TELEGRAM_MESSAGE_MAX_LENGTH,
+) -> list[str]:
+    """
+    Packs blocks of HTML into as few pages as possible, each starting with
+    the header and no longer than `max_length`. A block is only broken when
+    it does not fit in a page by itself, never inside a tag or an entity
+    (see `find_html_cut`); elements it is broken inside are closed at the
+    end of the page and opened again on the next one, so every page is
+    valid HTML.
+
+    Args:
+        header: Text to start every page with
+        blocks: HTML blocks, in order
+        max_length: The maximum length of a page
+
+    Returns:
+        list[str]: The pages
+    """
+    pages = list()
+    page = header
+    for block in blocks:
+        while True:
+            room = max_length - telegram_length(page)
+            if telegram_length(block) <= room:
+                page += block
+                break
+            if page != header and telegram_length(header + block) <= (
+                max_length
+            ):
+                pages.append(page)
+                page = header
+                continue
+
+            # Too long for any page: fill this one and carry over the rest
+            cut, open_tags = find_html_cut(block=block, room=room)
+            closing = "".join(
+                f"</{HTML_TAG_NAME.match(tag).group(1)}>"
+                for tag in reversed(open_tags)
+            )
+            pages.append(page + block[:cut] + closing)
+            page = header
+            block = "".join(open_tags) + block[cut:]
+    pages.append(page)
+    return pages
@@ -0,0 +1,217 @@
+import datetime
+import re
+from zoneinfo import ZoneInfo
+
+# Times on the LMS pages are Jalali, in Tehran time
+LMS_TIME_ZONE = ZoneInfo("Asia/Tehran")
+
+# Persian and Arabic-Indic digits, as the LMS may write them
+DIGITS = str.maketrans("۰۱۲۳۴۵۶۷۸۹٠١٢٣٤٥٦٧٨٩", "01234567890123456789")
+
+# e.g. "1403/01/19 23:59", the time being optional
+JALALI_DATETIME_PATTERN = re.compile(
+    r"(\d{4})/(\d{1,2})/(\d{1,2})(?:\D+?(\d{1,2}):(\d{2}))?"
+)
+
+# e.g. "4 ساعت پیش" or "4 hours ago"
+RELATIVE_TIME_PATTERN = re.compile(
+    r"(\d+)\s*(ثانیه|دقیقه|ساعت|روز|هفته|ماه|سال"
+    r"|second|minute|hour|day|week|month|year)s?\s*(?:پیش|قبل|ago)"
+)
+RELATIVE_TIME_UNITS = {
+    "ثانیه": datetime.timedelta(seconds=1),
+    "دقیقه": datetime.timedelta(minutes=1),
+    "ساعت": datetime.timedelta(hours=1),
+    "روز": datetime.timedelta(days=1),
+    "هفته": datetime.timedelta(weeks=1),
+    "ماه": datetime.timedelta(days=30),
+    "سال": datetime.timedelta(days=365),
+    "second": datetime.timedelta(seconds=1),
+    "minute": datetime.timedelta(minutes=1),
+    "hour": datetime.timedelta(hours=1),
+    "day": datetime.timedelta(days=1),
+    "week": datetime.timedelta(weeks=1),
+    "month": datetime.timedelta(days=30),
+    "year": datetime.timedelta(days=365),
+}
+TIME_OF_DAY_PATTERN = re.compile(r"\b([01]?\d|2[0-3]):([0-5]\d)\b")
+# Times relative to the fetch without a number
+RELATIVE_TIME_WORDS = {
+    "لحظاتی پیش": datetime.timedelta(0),
+    "چند لحظه پیش": datetime.timedelta(0),
+    "همین الان": datetime.timedelta(0),
+    "just now": datetime.timedelta(0),
+    "دیروز": datetime.timedelta(days=1),
+    "yesterday": datetime.timedelta(days=1),
+}
+
+# The datetime column filled from each raw time field of a wall item
+TIME_FIELDS = {
+    "sent_at": "sent_time",
+    "exercise_start": "exercise_start_time",
+    "exercise_deadline": "exercise_deadline_time",
+    "online_session_start": "online_session_start_time",
+    "online_session_end": "online_session_end_time",
+}
+
+# The leap years of the 33-year Jalali cycle, by their remainder mod 33
+JALALI_LEAP_REMAINDERS = frozenset((1, 5, 9, 13, 17, 22, 26, 30))
+
+
+def is_jalali_leap_year(year: int) -> bool:
+    """Whether a Jalali year has 30 days in Esfand, its last month"""
+    return year % 33 in JALALI_LEAP_REMAINDERS
+
+
+def jalali_to_gregorian(year: int, month: int, day: int) -> datetime.date:
+    """Convert a Jalali (Solar Hijri) date to a Gregorian one, with the
+    arithmetic of the 33-year Jalali leap cycle
+
+    Args:
+        year (int): Jalali year
+        month (int): Jalali month, from 1 to 12
+        day (int): Jalali day of the month
+
+    Returns:
+        (datetime.date): The Gregorian date
+
+    Raises:
+        ValueError: If the month or day is out of range, e.g. 30 Esfand of
+            a common year
+    """
+
+    if (
+        not 1 <= month <= 12
+        or not 1 <= day <= 31
+        or (month > 6 and day > 30)
+        or (month == 12 and day == 30 and not is_jalali_leap_year(year))
+    ):
+        raise ValueError(f"Invalid Jalali date: {year}/{month}/{day}")
+
+    # Days since 1 Farvardin of year 0 (= 19 March 621 in the Julian era)
+    year += 1595
+    days = (
+        -355668
+        + 365 * year
+        + (year // 33) * 8
+        + ((year % 33) + 3) // 4
+        + day
+        + ((month - 1) * 31 if month < 7 else (month - 7) * 30 + 186)
+    )
+    gregorian_year = 400 * (days // 146097)
+    days %= 146097
+    if days > 36524:
+        days -= 1
+        gregorian_year += 100 * (days // 36524)
+        days %= 36524
+        if days >= 365:
+            days += 1
+    gregorian_year += 4 * (days // 1461)
+    days %= 1461
+    if days > 365:
+        gregorian_year += (days - 1) // 365
+        days = (days - 1) % 365
+    return datetime.date(gregorian_year, 1, 1) + datetime.timedelta(days)
+
+
+def parse_lms_datetime(text: str) -> datetime.datetime | None:
+    """Parse a Jalali date and time as written on the LMS pages, e.g. the
+    deadline of an exercise or the start of an online session
+
+    Args:
+        text (str): The text holding the date, e.g. "1403/01/19 23:59"
+
+    Returns:
+        (datetime.datetime | None): The aware datetime, at midnight if no
+        time is given, or None if the text holds no valid date
+    """
+
+    match = JALALI_DATETIME_PATTERN.search(text.translate(DIGITS))
+    if match is None:
+        return None
+    year, month, day, hour, minute = match.groups()
+    try:
+        date = jalali_to_gregorian(int(year), int(month), int(day))
+        time = datetime.time(int(hour or 0), int(minute or 0))
+    except ValueError:
+        return None
+    return datetime.datetime.combine(date, time, tzinfo=LMS_TIME_ZONE)
+
+
+def parse_lms_relative_time(
+    text: str, now: datetime.datetime
+) -> datetime.datetime | None:
+    """Parse a time relative to when the page was fetched, as the LMS
+    writes the time of recent posts, e.g. "4 ساعت پیش" (4 hours ago). It
+    is only as precise as its unit.
+
+    Args:
+        text (str): The text holding the time
+        now (datetime.datetime): When the page was fetched
+
+    Returns:
+        (datetime.datetime | None): The time, or None if the text holds no
+        relative time
+    """
+
+    text = text.translate(DIGITS).strip().lower()
+    match = RELATIVE_TIME_PATTERN.search(text)
+    if match is not None:
+        count, unit = match.groups()
+        return now - int(count) * RELATIVE_TIME_UNITS[unit]
+    for words, delta in RELATIVE_TIME_WORDS.items():
+        if words in text:
+            # e.g. "دیروز ساعت 10:00" (yesterday at 10:00)
+            time = TIME_OF_DAY_PATTERN.search(text)
+            if time is None:
+                return now - delta
+            return (
+                (now - delta)
+                .astimezone(LMS_TIME_ZONE)
+                .replace(
+                    hour=int(time.group(1)),
+                    minute=int(time.group(2)),
+                    second=0,
+                    microsecond=0,
+                )
+            )
+    return None
+
+
+def parse_lms_time(
+    text: str, now: datetime.datetime
+) -> datetime.datetime | None:
+    """Parse a time written on the LMS pages, either relative to the fetch
+    (see `parse_lms_relative_time`) or a Jalali date and time (see
+    `parse_lms_datetime`)
+
+    Args:
+        text (str): The text holding the time
+        now (datetime.datetime): When the page was fetched
+
+    Returns:
+        (datetime.datetime | None): The time, or None if it is not one
+    """
+
+    if not text:
+        return None
+    return parse_lms_relative_time(text, now=now) or parse_lms_datetime(text)
+
+
+def parse_item_times(
+    item: object, now: datetime.datetime
+) -> dict[str, datetime.datetime | None]:
+    """Parse the raw time fields of a wall item (see `TIME_FIELDS`)
+
+    Args:
+        item (object): A scraped or stored wall item
+        now (datetime.datetime): When the item was fetched
+
+    Returns:
+        (dict[str, datetime.datetime | None]): The value of every datetime
+        column, by name
+    """
+    return {
+        time_field: parse_lms_time(getattr(item, raw_field), now=now)
+        for raw_field, time_field in TIME_FIELDS.items()
+    }
@@ -0,0 +1,70 @@
+import hashlib
+from collections import namedtuple
+from operator import attrgetter
+
+# The fields compared by `get_changed_fields`. Two versions of a wall item
+# with the same hash produce no header or footer.
+TRACKED_FIELDS = (
+    "is_exercise",
+    "is_exercise_finished",
+    "exercise_deadline",
+    "has_attachment",
+    "attachment_link",
+    "attachment_name",
+    "exercise_name",
+    "exercise_start",
+    "is_online_session",
+    "online_session_name",
+    "online_session_link",
+    "online_session_status",
+    "online_session_start",
+    "online_session_end",
+)
+
+FIELD_SEPARATOR = "\x1f"
+
+# Bit of each tracked field in a changed-fields mask
+FIELD_BITS = {field: 1 << i for i, field in enumerate(TRACKED_FIELDS)}
+
+# The tracked fields of a stored version, e.g. a `values_list` row. It reads
+# like a message, so it can be compared with and make headers from one.
+TrackedValues = namedtuple("TrackedValues", TRACKED_FIELDS)
+
+# get_tracked_values(message) -> tuple: the tracked fields, in bit order
+get_tracked_values = attrgetter(*TRACKED_FIELDS)
+
+
+def get_changed_fields(old_message, new_message) -> int:
+    """Compare the tracked fields of two versions of a message
+
+    Args:
+        old_message (Message): The stored version, e.g. `TrackedValues`
+        new_message (Message): The scraped version
+
+    Returns:
+        (int): The mask of the `FIELD_BITS` of the fields that differ
+    """
+    changed_fields = 0
+    for bit, old_value, new_value in zip(
+        FIELD_BITS.values(),
+        get_tracked_values(old_message),
+        get_tracked_values(new_message),
+    ):
+        if old_value != new_value:
+            changed_fields |= bit
+    return changed_fields
+
+
+def compute_content_hash(values: dict) -> str:
+    """Hash the tracked fields of a message into a short stable digest
+
+    Args:
+        values (dict): Message fields by name, e.g. the parser's output
+
+    Returns:
+        (str): 32-char hex digest
+    """
+    content = FIELD_SEPARATOR.join(
+        str(values[field]) for field in TRACKED_FIELDS
+    )
+    return hashlib.blake2b(content.encode(), digest_size=16).hexdigest()
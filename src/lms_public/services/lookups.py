@@ -0,0 +1,129 @@
+from django.db.models import QuerySet
+
+from lms_public.models import WallItem
+from lms_public.services.fingerprint import TRACKED_FIELDS, TrackedValues
+from lms_public.services.parsers import ParsedMessage
+
+MessageKey = tuple[str, str, str]
+
+VERSION_KEY_FIELDS = ("item_id", "author", "sent_at")
+
+
+def message_key(message: WallItem | ParsedMessage) -> MessageKey:
+    """Build the key that identifies all versions of one item of a course
+    wall
+
+    Args:
+        message (WallItem | ParsedMessage): A scraped or stored item
+
+    Returns:
+        (MessageKey): (item id, author, sent at)
+    """
+    return (message.item_id, message.author, message.sent_at)
+
+
+def latest_versions_queryset(
+    suffix_url: str, item_ids: set[str]
+) -> QuerySet[WallItem]:
+    """Build a query for the latest stored version of the given items.
+    It walks `wall_item_version_idx` in index order and keeps the first
+    (highest pk) row per key with PostgreSQL `DISTINCT ON`.
+
+    Args:
+        suffix_url (str): The URL of the course page of the items
+        item_ids (set[str]): The item ids to look up
+
+    Returns:
+        (QuerySet[WallItem]): One row per version key
+    """
+    return (
+        WallItem.objects.filter(suffix_url=suffix_url, item_id__in=item_ids)
+        .order_by("suffix_url", *VERSION_KEY_FIELDS, "-id")
+        .distinct("suffix_url", *VERSION_KEY_FIELDS)
+    )
+
+
+def latest_page_versions_queryset(suffix_urls: set[str]) -> QuerySet[WallItem]:
+    """Build a query for the latest stored version of every item of the
+    given course pages, as `latest_versions_queryset` does. Filters on other
+    fields than the key apply before `DISTINCT ON`, to every version, so
+    select from it instead, e.g. with `pk__in=queryset.values("pk")`.
+
+    Args:
+        suffix_urls (set[str]): The URLs of the course pages
+
+    Returns:
+        (QuerySet[WallItem]): One row per version key
+    """
+    return (
+        WallItem.objects.filter(suffix_url__in=suffix_urls)
+        .order_by("suffix_url", *VERSION_KEY_FIELDS, "-id")
+        .distinct("suffix_url", *VERSION_KEY_FIELDS)
+    )
+
+
+async def get_latest_hashes(
+    suffix_url: str, messages: list[ParsedMessage]
+) -> dict[MessageKey, tuple[int, str]]:
+    """Load the pk and content hash of the latest stored version of every
+    given item in one query, without loading whole rows
+
+    Args:
+        suffix_url (str): The URL of the course page of the items
+        messages (list[ParsedMessage]): Freshly scraped items
+
+    Returns:
+        (dict[MessageKey, tuple[int, str]]): (pk, content hash) by key
+    """
+
+    if not messages:
+        return dict()
+
+    queryset = latest_versions_queryset(
+        suffix_url=suffix_url,
+        item_ids={message.item_id for message in messages},
+    ).values_list(*VERSION_KEY_FIELDS, "id", "content_hash")
+    return {tuple(row[:-2]): (row[-2], row[-1]) async for row in queryset}
+
+
+async def get_latest_versions(
+    latest_hashes: dict[MessageKey, tuple[int, str]],
+    messages: list[ParsedMessage],
+) -> tuple[list[ParsedMessage], dict[MessageKey, TrackedValues]]:
+    """Find the items which may have changed and load the tracked fields
+    of the latest stored version of each. Items whose content hash equals
+    the stored one are dropped without loading their fields, and no model
+    instance is made for the others.
+
+    Args:
+        latest_hashes (dict[MessageKey, tuple[int, str]]): See
+            `get_latest_hashes`
+        messages (list[ParsedMessage]): Freshly scraped items
+
+    Returns:
+        (tuple[list[ParsedMessage], dict[MessageKey, TrackedValues]]):
+        The possibly changed items, and the latest stored version by key
+        for those which are not new
+    """
+
+    candidates = list()
+    candidate_pks = set()
+    for message in messages:
+        pk, content_hash = latest_hashes.get(message_key(message), (None, ""))
+        if content_hash and content_hash == message.content_hash:
+            continue
+        candidates.append(message)
+        if pk is not None:
+            candidate_pks.add(pk)
+
+    if not candidate_pks:
+        return candidates, dict()
+
+    queryset = WallItem.objects.filter(pk__in=candidate_pks).values_list(
+        *VERSION_KEY_FIELDS, *TRACKED_FIELDS
+    )
+    key_length = len(VERSION_KEY_FIELDS)
+    return candidates, {
+        tuple(row[:key_length]): TrackedValues._make(row[key_length:])
+        async for row in queryset
+    }
@@ -0,0 +1,154 @@
+import logging
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from common.services import constants
+from lms_public.models import PublicMessage, PublicMessageDelivery
+
+logger = logging.getLogger(__name__)
+
+
+def create_deliveries(
+    messages: list[PublicMessage], chat_id: str
+) -> list[PublicMessageDelivery]:
+    """Queue saved messages to be sent to a chat. Call it in the transaction
+    that saves them, so a message is never saved without its notification.
+    The first attempt waits `settings.NOTIFICATION_DEBOUNCE_SECONDS`, so
+    that a burst of messages is sent as one digest per course.
+
+    Args:
+        messages (list[PublicMessage]): Saved messages
+        chat_id (str): A Telegram chat id
+
+    Returns:
+        (list[PublicMessageDelivery]): The created deliveries
+    """
+
+    next_attempt_at = timezone.now() + timedelta(
+        seconds=settings.NOTIFICATION_DEBOUNCE_SECONDS
+    )
+    return PublicMessageDelivery.objects.bulk_create(
+        [
+            PublicMessageDelivery(
+                message=message,
+                chat_id=chat_id,
+                next_attempt_at=next_attempt_at,
+            )
+            for message in messages
+        ]
+    )
+
+
+@sync_to_async
+def claim_deliveries(limit: int) -> list[PublicMessageDelivery]:
+    """Claim up to `limit` due deliveries, along with the not yet due,
+    never attempted ones of the same chats so they go in the same digest.
+    Rows locked by another dispatcher are skipped (`FOR UPDATE SKIP
+    LOCKED`), and claimed rows are leased for
+    `NOTIFICATION_CLAIM_LEASE_SECONDS`: a dispatcher that dies while sending
+    them only delays them until the lease expires.
+
+    Args:
+        limit (int): The number of due deliveries to claim at most
+
+    Returns:
+        (list[PublicMessageDelivery]): The claimed deliveries, with
+            `attempts` counting this one
+    """
+
+    now = timezone.now()
+    with transaction.atomic():
+        due_deliveries = list(
+            PublicMessageDelivery.objects.select_for_update(skip_locked=True)
+            .filter(next_attempt_at__lte=now)
+            .order_by("next_attempt_at")[:limit]
+        )
+        if not due_deliveries:
+            return list()
+
+        chat_ids = {delivery.chat_id for delivery in due_deliveries}
+        debounced_deliveries = list(
+            PublicMessageDelivery.objects.select_for_update(
+                skip_locked=True
+            ).filter(chat_id__in=chat_ids, attempts=0, next_attempt_at__gt=now)
+        )
+
+        deliveries = due_deliveries + debounced_deliveries
+        PublicMessageDelivery.objects.filter(
+            pk__in=[delivery.pk for delivery in deliveries]
+        ).update(
+            attempts=F("attempts") + 1,
+            next_attempt_at=now
+            + timedelta(seconds=constants.NOTIFICATION_CLAIM_LEASE_SECONDS),
+        )
+    for delivery in deliveries:
+        delivery.attempts += 1
+    return deliveries
+
+
+def get_retry_delay(attempts: int) -> timedelta:
+    """Exponential backoff between the attempts of a delivery
+
+    Args:
+        attempts (int): The number of attempts made so far
+
+    Returns:
+        (timedelta): How long to wait before the next one
+    """
+
+    seconds = constants.NOTIFICATION_RETRY_BACKOFF_SECONDS * 2 ** (
+        attempts - 1
+    )
+    return timedelta(
+        seconds=min(seconds, constants.NOTIFICATION_RETRY_BACKOFF_MAX_SECONDS)
+    )
+
+
+@sync_to_async
+def complete_deliveries(
+    deliveries: list[PublicMessageDelivery], sent_message_ids: set[int]
+) -> None:
+    """Record the outcome of claimed deliveries. Sent messages are marked
+    as such and their deliveries removed; the others are retried later, or
+    given up on after `NOTIFICATION_MAX_ATTEMPTS` attempts.
+
+    Args:
+        deliveries (list[PublicMessageDelivery]): Claimed deliveries
+        sent_message_ids (set[int]): Ids of the messages that were sent
+    """
+
+    now = timezone.now()
+    retried_deliveries = list()
+    dropped_deliveries = list()
+    for delivery in deliveries:
+        if delivery.message_id in sent_message_ids:
+            continue
+        if delivery.attempts >= constants.NOTIFICATION_MAX_ATTEMPTS:
+            dropped_deliveries.append(delivery)
+        else:
+            delivery.next_attempt_at = now + get_retry_delay(delivery.attempts)
+            retried_deliveries.append(delivery)
+
+    if dropped_deliveries:
+        logger.error(
+            "Giving up on messages %s after %d attempts",
+            [delivery.message_id for delivery in dropped_deliveries],
+            constants.NOTIFICATION_MAX_ATTEMPTS,
+        )
+
+    with transaction.atomic():
+        PublicMessage.objects.filter(pk__in=sent_message_ids).update(
+            is_sent=True
+        )
+        PublicMessageDelivery.objects.filter(
+            Q(message_id__in=sent_message_ids)
+            | Q(pk__in=[delivery.pk for delivery in dropped_deliveries])
+        ).delete()
+        PublicMessageDelivery.objects.bulk_update(
+            retried_deliveries, ["next_attempt_at"]
+        )
@@ -0,0 +1,46 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable
+
+import django
+from django.conf import settings
+
+_executor: ProcessPoolExecutor | None = None
+
+
+def get_parse_executor() -> ProcessPoolExecutor | None:
+    """Get the process pool used for parsing LMS pages. It is created on
+    first use with `settings.LMS_PARSE_WORKERS` processes and lives as long
+    as the current process.
+
+    Returns:
+        (ProcessPoolExecutor | None): The pool, or None if
+        `LMS_PARSE_WORKERS` is 0
+    """
+    global _executor
+    if not settings.LMS_PARSE_WORKERS:
+        return None
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.LMS_PARSE_WORKERS, initializer=django.setup
+        )
+    return _executor
+
+
+async def run_parser(func: Callable[..., Any], *args: Any) -> Any:
+    """Run a CPU-bound parser without blocking the event loop when a parse
+    pool is configured, so other requests keep flowing meanwhile. `func`
+    and its arguments must be picklable.
+
+    Args:
+        func (Callable[..., Any]): A module level function
+        *args (Any): Its positional arguments
+
+    Returns:
+        (Any): What `func` returns
+    """
+    executor = get_parse_executor()
+    if executor is None:
+        return func(*args)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, func, *args)
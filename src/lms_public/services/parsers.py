@@ -1,24 +1,114 @@
-from bs4 import BeautifulSoup
+import re
+from dataclasses import dataclass, fields
+from datetime import datetime
 
-from lms_public.models import PublicMessage
+from bs4 import BeautifulSoup, SoupStrainer, Tag
+from django.conf import settings
 
+from lms_public.models import WallItem
+from lms_public.services.dates import parse_item_times
+from lms_public.services.fingerprint import compute_content_hash
 
-def parse_public_message(
-    message_container: BeautifulSoup, course: str
-) -> PublicMessage:
+WALL_ITEM_CLASS = "wall-action-item"
+# The list of the wall items, on a course page even if it has none
+WALL_CLASS = "feed"
+COURSES_LIST_ID = "profile_groups"
+
+# A password field: the LMS may serve its login form in place of a page,
+# with a 200, once the cookie has expired
+LOGIN_FORM_PATTERN = re.compile(
+    r"<input\b[^>]*\btype=[\"']?password\b", re.IGNORECASE
+)
+# An element of class `WALL_CLASS` or `WALL_ITEM_CLASS`
+WALL_PATTERN = re.compile(
+    rf"\bclass=[\"'](?:[^\"']*\s)?({WALL_CLASS}|{WALL_ITEM_CLASS})[\"'\s]"
+)
+
+
+@dataclass(slots=True)
+class ParsedMessage:
+    """A wall item as scraped from a course page. Much cheaper to build
+    than an unsaved WallItem, and picklable; a WallItem is only made (see
+    `to_wall_item`) for the items which get saved.
+    """
+
+    item_id: str
+    author: str
+    text: str
+    sent_at: str
+    has_attachment: bool
+    attachment_name: str
+    attachment_link: str
+    is_exercise: bool
+    is_exercise_finished: bool
+    exercise_name: str
+    exercise_start: str
+    exercise_deadline: str
+    is_online_session: bool
+    online_session_name: str
+    online_session_link: str
+    online_session_status: str
+    online_session_start: str
+    online_session_end: str
+    content_hash: str
+    header: str = ""
+    footer: str = ""
+
+    def to_wall_item(self, suffix_url: str, now: datetime) -> WallItem:
+        """Build an unsaved WallItem from this item, with its times parsed
+
+        Args:
+            suffix_url (str): The URL of the course page of the item
+            now (datetime): When the page was fetched, for relative times
+
+        Returns:
+            (WallItem): The wall item
+        """
+        return WallItem(
+            suffix_url=suffix_url,
+            **{
+                field.name: getattr(self, field.name) for field in fields(self)
+            },
+            **parse_item_times(self, now=now),
+        )
+
+
+def has_exact_class(name: str, class_name: str):
+    """Build a `find` filter matching `name[class="class_name"]`, without
+    the cost of a CSS selector
+
+    Args:
+        name (str): Tag name
+        class_name (str): The whole value of the class attribute
+
+    Returns:
+        (Callable[[Tag], bool]): The filter
+    """
+
+    def matches(tag: Tag) -> bool:
+        return tag.name == name and tag.get("class") == [class_name]
+
+    return matches
+
+
+is_body_text = has_exact_class("span", "feed_item_bodytext")
+is_view_more = has_exact_class("span", "view_more")
+is_timestamp = has_exact_class("span", "timestamp")
+is_attachments = has_exact_class("div", "feed_item_attachments")
+
+
+def parse_public_message(message_container: BeautifulSoup) -> ParsedMessage:
     """Parse a message li element and extract all relevant information.
 
     Args:
         message_container (BeautifulSoup): BeautifulSoup element representing the message
-        course (LMSCourse): An LMSCourse instance
 
     Returns:
-        (dict): Dictionary containing message details
+        (ParsedMessage): The message details
     """
     # Initialize message data
     message = {
         "item_id": "",
-        "lms_course": course,
         "author": "",
         "text": "",
         "sent_at": "",
@@ -43,9 +133,7 @@ def parse_public_message(
     message["item_id"] = message_container.get("id")
 
     # Extract author
-    author_element = message_container.select_one(
-        'a[class~="feed_item_username"]'
-    )
+    author_element = message_container.find("a", class_="feed_item_username")
     if author_element:
         # this converts "Fakheran - Ali" to "Ali Fakheran"
         message["author"] = " ".join(
@@ -53,13 +141,14 @@ def parse_public_message(
         )
 
     # Extract text body
-    text_body = message_container.select_one(
-        'span[class="feed_item_bodytext"]'
-    )
+    text_body = message_container.find(is_body_text)
     if text_body:
         # Check for expanded text content
-        text_span = text_body.select_one(
-            'span[class="view_more"][style^="display"]'
+        text_span = text_body.find(
+            lambda tag: (
+                is_view_more(tag)
+                and tag.get("style", "").startswith("display")
+            )
         )
         text_element = (
             text_span if text_span and text_span.text.strip() else text_body
@@ -67,14 +156,12 @@ def parse_public_message(
         message["text"] = text_element.text.strip()
 
     # Extract timestamp
-    timestamp_element = message_container.select_one('span[class="timestamp"]')
+    timestamp_element = message_container.find(is_timestamp)
     if timestamp_element:
         message["sent_at"] = timestamp_element.text.strip()
 
     # Check for attachments
-    attachment_div = message_container.select_one(
-        'div[class="feed_item_attachments"]'
-    )
+    attachment_div = message_container.find(is_attachments)
     if attachment_div:
         online_session_table = attachment_div.find("table")
         if online_session_table:
@@ -162,4 +249,79 @@ def parse_public_message(
                     if "پایان" in message["exercise_deadline"]:
                         message["is_exercise_finished"] = True
 
-    return PublicMessage(**message)
+    message["content_hash"] = compute_content_hash(message)
+    return ParsedMessage(**message)
+
+
+def is_login_page(page_text: str) -> bool:
+    """Whether a page is the login form of the LMS
+
+    Args:
+        page_text (str): The page
+
+    Returns:
+        (bool): True if it has a password field
+    """
+    return LOGIN_FORM_PATTERN.search(page_text) is not None
+
+
+def has_wall(page_text: str) -> bool:
+    """Whether a page has a course wall, even an empty one. A course page
+    without one is not the page the user can see, e.g. it was served to a
+    logged out user.
+
+    Args:
+        page_text (str): The course page
+
+    Returns:
+        (bool): True if it has the wall list or a wall item
+    """
+    return WALL_PATTERN.search(page_text) is not None
+
+
+def parse_wall(page_text: str) -> list[ParsedMessage]:
+    """Parse the wall of a course page. Only the wall items are built into
+    a tree (see `SoupStrainer`), with the tree builder set in
+    `settings.LMS_HTML_PARSER`. Takes and returns plain data, so it can run
+    in a worker process (see `lms_public.services.parse_pool`).
+
+    Args:
+        page_text (str): The course page
+
+    Returns:
+        (list[ParsedMessage]): List of course messages
+    """
+    soup = BeautifulSoup(
+        page_text,
+        settings.LMS_HTML_PARSER,
+        parse_only=SoupStrainer(class_=WALL_ITEM_CLASS),
+    )
+    return [
+        parse_public_message(message_container=msg_container)
+        for msg_container in soup.find_all(class_=WALL_ITEM_CLASS)
+    ]
+
+
+def parse_courses_info(page_text: str) -> list[tuple[str, str]]:
+    """Parse the course list of the home page. Only the list is built into
+    a tree.
+
+    Args:
+        page_text (str): The home page
+
+    Returns:
+        list[tuple[str, str]]: List of (course_suffix_url, course_name) tuples
+    """
+    soup = BeautifulSoup(
+        page_text,
+        settings.LMS_HTML_PARSER,
+        parse_only=SoupStrainer(id=COURSES_LIST_ID),
+    )
+    li_tags = soup.find(id=COURSES_LIST_ID).find_all("li")
+    courses_info = list()
+    for li_tag in li_tags:
+        course_suffix_url = li_tag.find("a").get("href")
+        course_name = li_tag.find_all("div")[1].text.split("\t")[1].strip()
+        single_info = (course_suffix_url, course_name)
+        courses_info.append(single_info)
+    return courses_info
@@ -0,0 +1,538 @@
+import math
+from datetime import datetime, timedelta
+from typing import NamedTuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Min, Q
+from django.db.models.functions import Least, TruncMinute
+from django.utils import timezone
+
+from common.services import constants
+from lms_public.models import (
+    CoursePollSchedule,
+    CourseWakeUp,
+    LMSCourse,
+    WallItem,
+)
+from lms_public.services.lookups import latest_page_versions_queryset
+
+SECONDS_PER_DAY = 24 * 3600
+
+
+class ItemTimes(NamedTuple):
+    """The times of an exercise or an online session of a course page
+
+    Attributes:
+        suffix_url (str): The URL of the course page
+        exercise_deadline (datetime | None): The deadline of an exercise
+        online_session_start (datetime | None): The start of a session
+        online_session_end (datetime | None): The end of a session
+    """
+
+    suffix_url: str
+    exercise_deadline: datetime | None
+    online_session_start: datetime | None
+    online_session_end: datetime | None
+
+
+class PollPlanCost(NamedTuple):
+    """What polling course pages at some intervals costs, and gives
+
+    Attributes:
+        requests_per_second (float): Polls sent to the LMS per second
+        expected_latency_seconds (float): Mean time from a change of a page
+            to its detection, weighted by the change rate of each page
+    """
+
+    requests_per_second: float
+    expected_latency_seconds: float
+
+
+def get_active_suffix_urls() -> set[str]:
+    """Get the course pages with at least one enrolled user to notify"""
+    return set(
+        LMSCourse.objects.filter(is_active=True)
+        .values_list("suffix_url", flat=True)
+        .distinct()
+    )
+
+
+def estimate_changes_per_day(
+    suffix_urls: set[str], now: datetime
+) -> dict[str, float]:
+    """Estimate how often each course page changes, from the wall items
+    stored in the last `POLL_HISTORY_DAYS`. Items stored in the same minute
+    are one change, as they were found by the same poll. The items stored
+    within `POLL_ONBOARDING_SECONDS` of the first item of a page are its
+    backlog, not changes. Every page starts with one change per day, so a
+    new page is not taken as dormant.
+
+    Args:
+        suffix_urls (set[str]): The URLs of the course pages
+        now (datetime): The end of the history
+
+    Returns:
+        (dict[str, float]): Changes per day, by URL
+    """
+
+    since = now - timedelta(days=constants.POLL_HISTORY_DAYS)
+    onboarding = timedelta(seconds=constants.POLL_ONBOARDING_SECONDS)
+    items = WallItem.objects.filter(suffix_url__in=suffix_urls)
+    first_created_at = dict(
+        items.values_list("suffix_url")
+        .annotate(first_created_at=Min("created_at"))
+        .order_by()
+    )
+    changes = dict.fromkeys(suffix_urls, 0)
+    change_minutes = (
+        items.filter(created_at__gte=since)
+        .annotate(minute=TruncMinute("created_at"))
+        .values_list("suffix_url", "minute")
+        .order_by()
+        .distinct()
+    )
+    for suffix_url, minute in change_minutes:
+        if minute >= first_created_at[suffix_url] + onboarding:
+            changes[suffix_url] += 1
+
+    changes_per_day = dict()
+    for suffix_url, count in changes.items():
+        observed_since = max(
+            since, first_created_at.get(suffix_url, now) + onboarding
+        )
+        observed_days = max((now - observed_since) / timedelta(days=1), 0)
+        changes_per_day[suffix_url] = (count + 1) / (observed_days + 1)
+    return changes_per_day
+
+
+def get_item_times(suffix_urls: set[str]) -> list[ItemTimes]:
+    """Get the times of the exercises which are not finished and of the
+    online sessions of course pages, from the latest version of each item
+
+    Args:
+        suffix_urls (set[str]): The URLs of the course pages
+
+    Returns:
+        (list[ItemTimes]): The times of every such item
+    """
+
+    latest_versions = latest_page_versions_queryset(suffix_urls=suffix_urls)
+    items = (
+        WallItem.objects.filter(pk__in=latest_versions.values("pk"))
+        .filter(Q(is_exercise=True) | Q(is_online_session=True))
+        .values_list(
+            "suffix_url",
+            "is_exercise",
+            "is_exercise_finished",
+            "exercise_deadline_time",
+            "online_session_start_time",
+            "online_session_end_time",
+        )
+    )
+    return [
+        ItemTimes(
+            suffix_url=suffix_url,
+            exercise_deadline=deadline if is_exercise else None,
+            online_session_start=None if is_exercise else start,
+            online_session_end=None if is_exercise else end,
+        )
+        for suffix_url, is_exercise, is_finished, deadline, start, end in items
+        if not is_finished
+    ]
+
+
+def get_hot_suffix_urls(
+    item_times: list[ItemTimes], now: datetime
+) -> set[str]:
+    """Find the course pages likely to change soon: an exercise of theirs
+    is due within `POLL_HOT_BEFORE_DEADLINE_SECONDS`, or an online session
+    starts within `POLL_HOT_BEFORE_SESSION_SECONDS` or is being held.
+
+    Args:
+        item_times (list[ItemTimes]): See `get_item_times`
+        now (datetime): The current time
+
+    Returns:
+        (set[str]): The URLs of the hot pages
+    """
+
+    before_deadline = timedelta(
+        seconds=constants.POLL_HOT_BEFORE_DEADLINE_SECONDS
+    )
+    before_session = timedelta(
+        seconds=constants.POLL_HOT_BEFORE_SESSION_SECONDS
+    )
+    hot_suffix_urls = set()
+    for times in item_times:
+        deadline = times.exercise_deadline
+        start = times.online_session_start
+        end = times.online_session_end or start
+        if (
+            deadline is not None and now <= deadline <= now + before_deadline
+        ) or (start is not None and start - before_session <= now <= end):
+            hot_suffix_urls.add(times.suffix_url)
+    return hot_suffix_urls
+
+
+def get_wake_ups(
+    item_times: list[ItemTimes], now: datetime
+) -> list[CourseWakeUp]:
+    """Plan one-off polls of course pages around the times of their items
+    (see `POLL_WAKE_UP_OFFSETS_SECONDS`), when their status is likely to
+    change: e.g. right after a deadline, when an exercise is finished, or
+    after a session, when its recording is posted
+
+    Args:
+        item_times (list[ItemTimes]): See `get_item_times`
+        now (datetime): The current time; only later wake-ups are planned
+
+    Returns:
+        (list[CourseWakeUp]): Unsaved wake-ups
+    """
+
+    wake_ups = list()
+    for times in item_times:
+        for field, offsets in constants.POLL_WAKE_UP_OFFSETS_SECONDS.items():
+            moment = getattr(times, field)
+            if moment is None:
+                continue
+            for offset in offsets:
+                wake_at = moment + timedelta(seconds=offset)
+                if wake_at > now:
+                    wake_ups.append(
+                        CourseWakeUp(
+                            suffix_url=times.suffix_url,
+                            wake_at=wake_at,
+                            reason=field,
+                        )
+                    )
+    return wake_ups
+
+
+def get_next_wake_ups(
+    suffix_urls: list[str], now: datetime
+) -> dict[str, datetime]:
+    """Get the time of the next wake-up of course pages
+
+    Args:
+        suffix_urls (list[str]): The URLs of the course pages
+        now (datetime): The current time
+
+    Returns:
+        (dict[str, datetime]): The time of the next wake-up, by URL, for
+        the pages which have one
+    """
+    return dict(
+        CourseWakeUp.objects.filter(
+            suffix_url__in=suffix_urls, wake_at__gt=now
+        )
+        .values_list("suffix_url")
+        .annotate(next_wake_at=Min("wake_at"))
+        .order_by()
+    )
+
+
+def schedule_wake_ups(item_times: list[ItemTimes], now: datetime) -> int:
+    """Store the wake-ups of course pages (see `get_wake_ups`), and bring
+    their next polls forward to them. Call it in a transaction.
+
+    Args:
+        item_times (list[ItemTimes]): See `get_item_times`
+        now (datetime): The current time
+
+    Returns:
+        (int): The number of wake-ups planned, including known ones
+    """
+
+    wake_ups = get_wake_ups(item_times=item_times, now=now)
+    CourseWakeUp.objects.bulk_create(wake_ups, ignore_conflicts=True)
+    next_wake_ups = get_next_wake_ups(
+        suffix_urls={wake_up.suffix_url for wake_up in wake_ups}, now=now
+    )
+    for suffix_url, next_wake_at in next_wake_ups.items():
+        CoursePollSchedule.objects.filter(suffix_url=suffix_url).update(
+            next_poll_at=Least("next_poll_at", next_wake_at)
+        )
+    return len(wake_ups)
+
+
+def plan_poll_intervals(
+    changes_per_day: dict[str, float],
+    hot_suffix_urls: set[str],
+    requests_per_second: float,
+) -> dict[str, int]:
+    """Share a request budget between course pages. Hot pages are polled
+    every `settings.LMS_POLL_MIN_SECONDS`. The others get intervals
+    proportional to 1/sqrt(change rate), the split that minimises the
+    mean detection latency of their changes for a given number of polls,
+    clamped to `[LMS_POLL_MIN_SECONDS, LMS_POLL_MAX_SECONDS]`. Their scale
+    is found by bisection, so that they spend the rest of the budget.
+    Pages whose bounds do not fit the budget get the maximum interval.
+
+    Args:
+        changes_per_day (dict[str, float]): Change rate by page URL, all
+            above zero (see `estimate_changes_per_day`)
+        hot_suffix_urls (set[str]): URLs of hot pages
+        requests_per_second (float): The budget
+
+    Returns:
+        (dict[str, int]): Interval in seconds, by page URL
+    """
+
+    min_seconds = settings.LMS_POLL_MIN_SECONDS
+    max_seconds = settings.LMS_POLL_MAX_SECONDS
+    intervals = {
+        suffix_url: min_seconds
+        for suffix_url in hot_suffix_urls
+        if suffix_url in changes_per_day
+    }
+    budget = requests_per_second - len(intervals) / min_seconds
+    roots = {
+        suffix_url: math.sqrt(rate)
+        for suffix_url, rate in changes_per_day.items()
+        if suffix_url not in intervals
+    }
+
+    def get_intervals(scale: float) -> dict[str, float]:
+        return {
+            suffix_url: min(max(scale / root, min_seconds), max_seconds)
+            for suffix_url, root in roots.items()
+        }
+
+    if roots and budget <= len(roots) / max_seconds:
+        intervals.update(dict.fromkeys(roots, max_seconds))
+    elif roots:
+        # The polls per second fall as the scale grows. Every page is polled
+        # at the minimum interval at the lowest scale, at the maximum one at
+        # the highest.
+        low = min_seconds * min(roots.values())
+        high = max_seconds * max(roots.values())
+        for _ in range(constants.POLL_PLAN_BISECTIONS):
+            scale = math.sqrt(low * high)
+            cost = sum(
+                1 / seconds for seconds in get_intervals(scale).values()
+            )
+            if cost > budget:
+                low = scale
+            else:
+                high = scale
+        intervals.update(get_intervals(high))
+    return {
+        suffix_url: round(seconds) for suffix_url, seconds in intervals.items()
+    }
+
+
+def get_plan_cost(
+    changes_per_day: dict[str, float], intervals: dict[str, float]
+) -> PollPlanCost:
+    """Compute the cost and the expected detection latency of polling
+    course pages at the given intervals. A change happens at a random time
+    between two polls, so it waits half an interval on average.
+
+    Args:
+        changes_per_day (dict[str, float]): Change rate by page URL
+        intervals (dict[str, float]): Interval in seconds, by page URL
+
+    Returns:
+        (PollPlanCost): The cost and the latency
+    """
+
+    total_rate = sum(changes_per_day.values())
+    if not total_rate:
+        return PollPlanCost(0, 0)
+    return PollPlanCost(
+        requests_per_second=sum(1 / seconds for seconds in intervals.values()),
+        expected_latency_seconds=sum(
+            rate * intervals[suffix_url] / 2
+            for suffix_url, rate in changes_per_day.items()
+        )
+        / total_rate,
+    )
+
+
+def plan_course_polls() -> dict[str, int]:
+    """Plan the polling interval of every active course page, from its
+    history, within `settings.LMS_POLL_REQUESTS_PER_SECOND` (see
+    `plan_poll_intervals`), and its wake-ups (see `get_wake_ups`). Pages
+    which have just become hot are polled within `LMS_POLL_MIN_SECONDS`,
+    new pages right away, and the schedules of pages nobody is enrolled in
+    anymore are removed. The times of the next polls are otherwise left to
+    the pollers.
+
+    Returns:
+        (dict[str, int]): The planned interval in seconds, by page URL
+    """
+
+    now = timezone.now()
+    suffix_urls = get_active_suffix_urls()
+    changes_per_day = estimate_changes_per_day(
+        suffix_urls=suffix_urls, now=now
+    )
+    item_times = get_item_times(suffix_urls=suffix_urls)
+    hot_suffix_urls = get_hot_suffix_urls(item_times=item_times, now=now)
+    intervals = plan_poll_intervals(
+        changes_per_day=changes_per_day,
+        hot_suffix_urls=hot_suffix_urls,
+        requests_per_second=settings.LMS_POLL_REQUESTS_PER_SECOND,
+    )
+
+    with transaction.atomic():
+        CoursePollSchedule.objects.exclude(suffix_url__in=suffix_urls).delete()
+        schedules = {
+            schedule.suffix_url: schedule
+            for schedule in CoursePollSchedule.objects.select_for_update()
+        }
+        new_hot_suffix_urls = {
+            suffix_url
+            for suffix_url in hot_suffix_urls
+            if suffix_url in schedules and not schedules[suffix_url].is_hot
+        }
+        for suffix_url, schedule in schedules.items():
+            schedule.changes_per_day = changes_per_day[suffix_url]
+            schedule.is_hot = suffix_url in hot_suffix_urls
+            schedule.planned_interval_seconds = intervals[suffix_url]
+        CoursePollSchedule.objects.bulk_update(
+            schedules.values(),
+            ["changes_per_day", "is_hot", "planned_interval_seconds"],
+        )
+        CoursePollSchedule.objects.filter(
+            suffix_url__in=new_hot_suffix_urls
+        ).update(
+            next_poll_at=Least(
+                "next_poll_at",
+                now + timedelta(seconds=settings.LMS_POLL_MIN_SECONDS),
+            )
+        )
+        CoursePollSchedule.objects.bulk_create(
+            [
+                CoursePollSchedule(
+                    suffix_url=suffix_url,
+                    changes_per_day=changes_per_day[suffix_url],
+                    is_hot=suffix_url in hot_suffix_urls,
+                    planned_interval_seconds=intervals[suffix_url],
+                    next_poll_at=now,
+                )
+                for suffix_url in suffix_urls
+                if suffix_url not in schedules
+            ]
+        )
+        CourseWakeUp.objects.filter(
+            Q(wake_at__lte=now) | ~Q(suffix_url__in=suffix_urls)
+        ).delete()
+        schedule_wake_ups(item_times=item_times, now=now)
+    return intervals
+
+
+@sync_to_async
+def schedule_page_wake_ups(suffix_url: str) -> int:
+    """Plan the wake-ups of a course page whose wall has just changed,
+    e.g. for a new exercise, see `schedule_wake_ups`
+
+    Args:
+        suffix_url (str): The URL of the course page
+
+    Returns:
+        (int): The number of wake-ups planned, including known ones
+    """
+
+    item_times = get_item_times(suffix_urls={suffix_url})
+    with transaction.atomic():
+        return schedule_wake_ups(item_times=item_times, now=timezone.now())
+
+
+def get_poll_interval(schedule: CoursePollSchedule) -> int:
+    """Get the interval until the next poll of a course page. A page which
+    stays unchanged for more polls than its change rate predicts is
+    dormant: its interval is multiplied by `POLL_BACKOFF_FACTOR` at every
+    further unchanged poll, up to `settings.LMS_POLL_MAX_SECONDS`. Hot
+    pages do not back off.
+
+    Args:
+        schedule (CoursePollSchedule): The schedule of the page
+
+    Returns:
+        (int): The interval in seconds
+    """
+
+    if schedule.is_hot:
+        return settings.LMS_POLL_MIN_SECONDS
+    planned_seconds = schedule.planned_interval_seconds
+    expected_polls = math.ceil(
+        SECONDS_PER_DAY / (schedule.changes_per_day * planned_seconds)
+    )
+    extra_polls = schedule.unchanged_polls - expected_polls
+    if extra_polls <= 0:
+        return planned_seconds
+    return min(
+        planned_seconds
+        * constants.POLL_BACKOFF_FACTOR ** min(extra_polls, 32),
+        settings.LMS_POLL_MAX_SECONDS,
+    )
+
+
+@sync_to_async
+def claim_due_polls(limit: int) -> list[CoursePollSchedule]:
+    """Claim up to `limit` course pages due for a poll, the most overdue
+    first. Rows locked by another poller are skipped (`FOR UPDATE SKIP
+    LOCKED`), and claimed rows are leased for `POLL_CLAIM_LEASE_SECONDS`:
+    a poller that dies only delays their next poll until the lease expires.
+
+    Args:
+        limit (int): The number of pages to claim at most
+
+    Returns:
+        (list[CoursePollSchedule]): The schedules of the claimed pages
+    """
+
+    now = timezone.now()
+    with transaction.atomic():
+        schedules = list(
+            CoursePollSchedule.objects.select_for_update(skip_locked=True)
+            .filter(next_poll_at__lte=now)
+            .order_by("next_poll_at")[:limit]
+        )
+        CoursePollSchedule.objects.filter(
+            pk__in=[schedule.pk for schedule in schedules]
+        ).update(
+            next_poll_at=now
+            + timedelta(seconds=constants.POLL_CLAIM_LEASE_SECONDS)
+        )
+    return schedules
+
+
+@sync_to_async
+def complete_polls(
+    schedules: list[CoursePollSchedule], results: list[bool | None]
+) -> None:
+    """Schedule the next poll of claimed course pages, at their interval
+    or their next wake-up, whichever comes first. A changed page stops
+    backing off; a page whose poll failed keeps its interval.
+
+    Args:
+        schedules (list[CoursePollSchedule]): Claimed schedules
+        results (list[bool | None]): Whether each page had changed, or
+            None if its poll failed
+    """
+
+    now = timezone.now()
+    next_wake_ups = get_next_wake_ups(
+        suffix_urls=[schedule.suffix_url for schedule in schedules], now=now
+    )
+    for schedule, is_changed in zip(schedules, results):
+        if is_changed:
+            schedule.unchanged_polls = 0
+        elif is_changed is not None:
+            schedule.unchanged_polls += 1
+        schedule.last_polled_at = now
+        schedule.next_poll_at = now + timedelta(
+            seconds=get_poll_interval(schedule)
+        )
+        if schedule.suffix_url in next_wake_ups:
+            schedule.next_poll_at = min(
+                schedule.next_poll_at, next_wake_ups[schedule.suffix_url]
+            )
+    CoursePollSchedule.objects.bulk_update(
+        schedules, ["unchanged_polls", "last_polled_at", "next_poll_at"]
+    )
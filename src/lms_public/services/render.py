@@ -0,0 +1,178 @@
+from html import escape
+from operator import attrgetter
+from string import Formatter
+from typing import Callable, Iterable, NamedTuple
+
+from common.services import constants
+from lms_public.models import WallItem
+
+ZWNJ = "‌"  # Zero-width non-joiner character
+
+
+class Section(NamedTuple):
+    """A part of the message layout
+
+    Attributes:
+        template (str): `str.format`-style template of the section, with
+            named fields: message attributes, which are HTML-escaped, or
+            `COMPUTED_FIELDS`. Format specs are not supported.
+        when (tuple[str, ...]): Attributes that must all be truthy for the
+            section to be rendered. Empty to always render it.
+    """
+
+    template: str
+    when: tuple[str, ...] = ()
+
+
+def get_online_session_status_icon(message: WallItem) -> str:
+    if "در حال" in message.online_session_status:
+        return "🟢"
+    if "ضبط" in message.online_session_status:
+        return "🔴"
+    return "⏳"
+
+
+# Fields that are not attributes of a message. They are not escaped.
+COMPUTED_FIELDS: dict[str, Callable[[WallItem], str]] = {
+    "online_session_status_icon": get_online_session_status_icon,
+}
+
+MESSAGE_LAYOUT = (
+    Section("\n\n👤  {author}"),
+    Section("\n\n▫️<b>{header}</b>", when=("header",)),
+    Section("\n\n✍🏻  {text}", when=("text",)),
+    Section("\n\nتغییرات جزئی: \n{footer}", when=("footer",)),
+    Section(
+        "\n\nنام تمرین: {exercise_name}\n"
+        "زمان شروع: {exercise_start}\n"
+        "مهلت ارسال: {exercise_deadline}",
+        when=("is_exercise",),
+    ),
+    Section("(پایان یافته) ", when=("is_exercise", "is_exercise_finished")),
+    Section(
+        f'\n\nفایل: <a href="{constants.BASE_URL}{{attachment_link}}">'
+        "{attachment_name}</a>",
+        when=("has_attachment",),
+    ),
+    Section(
+        "\n\n🌐 عنوان جلسه: "
+        f'<a href="{constants.BASE_URL}{{online_session_link}}">'
+        "{online_session_name}</a>"
+        "\n{online_session_status_icon} وضعیت: {online_session_status}"
+        "\n🚀 زمان شروع: {online_session_start}"
+        "\n🏁 زمان پایان: {online_session_end}",
+        when=("is_online_session",),
+    ),
+    Section("\n\n🕑  {sent_at}", when=("sent_at",)),
+    Section(f"{ZWNJ}\n"),
+)
+
+
+def escape_html(value: str) -> str:
+    """HTML-escape a field value. Most values need no escaping, and are
+    returned as they are without being copied.
+    """
+    if "<" in value or ">" in value or "&" in value or '"' in value:
+        return escape(value)
+    return value
+
+
+def get_escaped(field_name: str) -> Callable[[WallItem], str]:
+    """Build a getter of a message attribute, HTML-escaped"""
+    get_field = attrgetter(field_name)
+
+    def get_escaped_field(message: WallItem) -> str:
+        return escape_html(get_field(message))
+
+    return get_escaped_field
+
+
+def parse_section(section: Section) -> tuple[str, list[Callable]]:
+    """Parse the template of a section of a layout
+
+    Args:
+        section (Section): The section
+
+    Returns:
+        (tuple[str, list[Callable]]): The template with positional fields,
+            and the getters of their values from a message
+    """
+
+    template = ""
+    getters = list()
+    for literal, field_name, _, _ in Formatter().parse(section.template):
+        template += literal.replace("{", "{{").replace("}", "}}")
+        if field_name is not None:
+            template += "{}"
+            getters.append(
+                COMPUTED_FIELDS.get(field_name) or get_escaped(field_name)
+            )
+    return template, getters
+
+
+def compile_layout(layout: tuple[Section, ...]) -> Callable[[WallItem], str]:
+    """Compile a layout, the way template engines do. The sections shown
+    depend only on which of the `when` attributes of a message are truthy,
+    so each combination of them is compiled once, on first use, to one
+    `str.format` template of its sections and the getters of their fields.
+    Rendering a message is then a lookup and one `format` call.
+
+    Args:
+        layout (tuple[Section, ...]): The sections, in order
+
+    Returns:
+        (Callable[[WallItem], str]): `render(message)`, returning its HTML
+    """
+
+    sections = [(section.when, *parse_section(section)) for section in layout]
+    flags = tuple(
+        dict.fromkeys(name for when, *_ in sections for name in when)
+    )
+    flag_getters = tuple(attrgetter(name) for name in flags)
+    compiled = dict()
+
+    def compile_shown(shown: tuple[bool, ...]) -> tuple[Callable, tuple]:
+        is_shown = dict(zip(flags, shown))
+        template = ""
+        getters = list()
+        for when, section_template, section_getters in sections:
+            if all(is_shown[name] for name in when):
+                template += section_template
+                getters += section_getters
+        return template.format, tuple(getters)
+
+    def render(message: WallItem) -> str:
+        shown = tuple([bool(get_flag(message)) for get_flag in flag_getters])
+        if shown not in compiled:
+            compiled[shown] = compile_shown(shown)
+        fill, getters = compiled[shown]
+        return fill(*[get_field(message) for get_field in getters])
+
+    return render
+
+
+class MessageTemplate:
+    """A message layout compiled once, to render many messages. Field values
+    are HTML-escaped, so LMS-sourced text cannot break the markup.
+
+    Args:
+        layout (tuple[Section, ...]): The sections, in order
+    """
+
+    def __init__(self, layout: tuple[Section, ...]) -> None:
+        self.render = compile_layout(layout)
+
+    def render_many(self, messages: Iterable[WallItem]) -> list[str]:
+        """Render messages, e.g. the bodies of a digest
+
+        Args:
+            messages (Iterable[WallItem]): The messages
+
+        Returns:
+            (list[str]): The HTML of each message, in order
+        """
+
+        return list(map(self.render, messages))
+
+
+MESSAGE_BODY_TEMPLATE = MessageTemplate(MESSAGE_LAYOUT)
@@ -1,16 +1,41 @@
 import asyncio
+import logging
+import math
+import time
 
 from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
 
-from bot.tasks import send_notifications_task
 from common.models import LMSUser
-from common.services.cookie import get_cookie
+from common.services import constants
+from common.services.cookie import (
+    CookieExpiredError,
+    get_stored_cookie,
+    is_cookie_cached,
+    refresh_cookie,
+)
+from common.services.coordination import (
+    increment_hourly_counter,
+    observe_hourly_histograms,
+)
+from common.services.http import lms_session
 from lms_public.models import LMSCourse, PublicMessage
-from lms_public.services.change_handler import add_message_header_footer
+from lms_public.services.outbox import create_deliveries
+from lms_public.services.polling import (
+    claim_due_polls,
+    complete_polls,
+    schedule_page_wake_ups,
+)
 from lms_public.services.scrapers import (
-    get_course_messages,
+    get_course_wall,
+    get_courses_items,
     get_courses_suffix_urls,
 )
+from lms_public.services.walls import CourseWall
+
+logger = logging.getLogger(__name__)
 
 
 async def update_user_courses_service(user_id: int) -> None:
@@ -22,8 +47,13 @@ async def update_user_courses_service(user_id: int) -> None:
     """
 
     lms_user = await LMSUser.objects.aget(id=user_id)
-    cookie = await get_cookie(user=lms_user)
-    courses_info = await get_courses_suffix_urls(cookie=cookie)
+    async with lms_session():
+        cookie = await get_stored_cookie(user=lms_user)
+        try:
+            courses_info = await get_courses_suffix_urls(cookie=cookie)
+        except CookieExpiredError:
+            cookie = await refresh_cookie(user=lms_user, expired_cookie=cookie)
+            courses_info = await get_courses_suffix_urls(cookie=cookie)
     all_suffix_urls = [info[0] for info in courses_info]
 
     for crs_info in courses_info:
@@ -42,11 +72,59 @@ async def update_user_courses_service(user_id: int) -> None:
     )
 
 
+@sync_to_async
+def save_messages(
+    user: LMSUser,
+    courses_item_ids: list[tuple[LMSCourse, list[int]]],
+    chat_id: str | None,
+) -> list[PublicMessage]:
+    """Give a user the wall items they do not have yet, queue their
+    notifications, and store the page validators of the fetched courses,
+    inside one transaction
+
+    Args:
+        user (LMSUser): The user
+        courses_item_ids (list[tuple[LMSCourse, list[int]]]): Courses whose
+            pages have changed, with the pks of their wall items
+        chat_id (str | None): The chat to notify, or None not to
+
+    Returns:
+        (list[PublicMessage]): The new messages of the user
+    """
+    item_ids = [
+        item_id
+        for _, course_item_ids in courses_item_ids
+        for item_id in course_item_ids
+    ]
+    with transaction.atomic():
+        known_item_ids = set(
+            PublicMessage.objects.filter(
+                user=user, wall_item_id__in=item_ids
+            ).values_list("wall_item_id", flat=True)
+        )
+        saved_messages = PublicMessage.objects.bulk_create(
+            [
+                PublicMessage(user=user, lms_course=course, wall_item_id=pk)
+                for course, course_item_ids in courses_item_ids
+                for pk in course_item_ids
+                if pk not in known_item_ids
+            ]
+        )
+        if chat_id is not None:
+            create_deliveries(messages=saved_messages, chat_id=chat_id)
+        LMSCourse.objects.bulk_update(
+            [course for course, _ in courses_item_ids],
+            ["etag", "last_modified", "page_hash"],
+        )
+    return saved_messages
+
+
 async def check_new_messages_service(
     user_id: int, is_first_time: bool = False
 ) -> int:
-    """Fetch new messages, compare them with the old ones, send notification
-    for the new ones
+    """Fetch the walls of the user's courses (shared with the other users
+    enrolled in them, see `get_course_wall`), and send notification for the
+    items the user does not have yet
 
     Args:
         user_id (int): The id of the LMSUser instance
@@ -59,38 +137,243 @@ async def check_new_messages_service(
         int: The number of scraped messages
     """
 
-    lms_user = await LMSUser.objects.aget(id=user_id)
-    cookie = await get_cookie(user=lms_user)
-    chat_id = await sync_to_async(lambda: lms_user.chat_id.chat_id)()
-    active_courses = await sync_to_async(list)(
-        LMSCourse.objects.filter(user=lms_user, is_active=True)
+    lms_user = await LMSUser.objects.select_related("chat_id").aget(id=user_id)
+    chat_id = lms_user.chat_id.chat_id
+    active_courses = [
+        course
+        async for course in LMSCourse.objects.filter(
+            user=lms_user, is_active=True
+        )
+    ]
+    # One session for the whole cycle: a single handshake for all courses
+    deadline = time.monotonic() + settings.LMS_FETCH_CYCLE_TIMEOUT_SECONDS
+    latencies: dict[str, float] = dict()
+    async with lms_session():
+        cookie = await get_stored_cookie(user=lms_user)
+        courses_items = await get_courses_items(
+            courses=active_courses,
+            cookie=cookie,
+            timeout=deadline - time.monotonic(),
+            latencies=latencies,
+        )
+
+        # The stored cookie has expired: login once and retry those courses
+        expired = [
+            index
+            for index, result in enumerate(courses_items)
+            if isinstance(result, CookieExpiredError)
+        ]
+        if expired:
+            cookie = await refresh_cookie(user=lms_user, expired_cookie=cookie)
+            retried_items = await get_courses_items(
+                courses=[active_courses[index] for index in expired],
+                cookie=cookie,
+                timeout=deadline - time.monotonic(),
+                latencies=latencies,
+            )
+            for index, result in zip(expired, retried_items):
+                courses_items[index] = result
+    await observe_hourly_histograms(
+        observations={
+            f"lms_fetch_seconds:{suffix_url}": latency
+            for suffix_url, latency in latencies.items()
+        },
+        buckets=constants.LMS_FETCH_LATENCY_BUCKETS_SECONDS,
+    )
+
+    # A course which failed is fetched again on the next poll; its
+    # validators are not saved, so it is not taken as unchanged then
+    courses_item_ids = list()
+    for course, item_ids in zip(active_courses, courses_items):
+        if isinstance(item_ids, BaseException):
+            logger.warning(
+                "User %s: fetching course %s failed: %r",
+                user_id,
+                course.pk,
+                item_ids,
+            )
+            continue
+        if item_ids is None:
+            continue
+        courses_item_ids.append((course, item_ids))
+    logger.info(
+        "User %s: %d of %d course pages unchanged since the last fetch",
+        user_id,
+        len(active_courses) - len(courses_item_ids),
+        len(active_courses),
+    )
+
+    # The dispatcher (bot.dispatcher) sends the notifications
+    saved_messages = await save_messages(
+        user=lms_user,
+        courses_item_ids=courses_item_ids,
+        chat_id=None if is_first_time else chat_id,
+    )
+    return len(saved_messages)
+
+
+async def get_course_wall_as_user(course: LMSCourse) -> CourseWall | None:
+    """Get the wall of a course page with the cookie of the user of
+    `course`, logging them in again once if it has expired
+
+    Args:
+        course (LMSCourse): An LMSCourse instance, with its user
+
+    Returns:
+        (CourseWall | None): See `get_course_wall`
+
+    Raises:
+        CookieExpiredError: If the user could not log in
+    """
+
+    cookie = await get_stored_cookie(user=course.user)
+    if cookie.cookie:
+        try:
+            return await get_course_wall(course=course, cookie=cookie)
+        except CookieExpiredError:
+            cookie = await refresh_cookie(
+                user=course.user, expired_cookie=cookie
+            )
+    if not cookie.cookie:
+        raise CookieExpiredError(f"Logging in user {course.user_id} failed")
+    return await get_course_wall(course=course, cookie=cookie)
+
+
+async def poll_course_service(suffix_url: str) -> bool | None:
+    """Fetch a course page with the cookie of one of its users, and give
+    every user enrolled in it the wall items they do not have yet. Users
+    whose cookie is cached are tried first, and users whose last login
+    failed (their stored cookie is empty) last; if a user cannot log in,
+    the next one is tried. Users whose course has never been fetched get
+    the items without notifications, as on their first check (see
+    `check_new_messages_service`). The wake-ups of a changed page are
+    planned again, for its new items.
+
+    Args:
+        suffix_url (str): The URL of the course page
+
+    Returns:
+        (bool | None): Whether the page had changed for any user, or None
+        if it could not be read
+
+    Raises:
+        CookieExpiredError: If none of its users could log in
+    """
+
+    courses = [
+        course
+        async for course in LMSCourse.objects.select_related("user__chat_id")
+        .annotate(stored_cookie=F("user__cookie__cookie"))
+        .filter(suffix_url=suffix_url, is_active=True)
+        .order_by("pk")
+    ]
+    if not courses:
+        return False
+
+    pollers = sorted(
+        courses,
+        key=lambda course: (
+            not is_cookie_cached(user_id=course.user_id),
+            not course.stored_cookie,
+        ),
     )
-    tasks = [
-        asyncio.create_task(get_course_messages(course=course, cookie=cookie))
-        for course in active_courses
+    started_at = time.monotonic()
+    try:
+        for course in pollers:
+            try:
+                wall = await get_course_wall_as_user(course=course)
+                break
+            except CookieExpiredError as error:
+                logger.warning("Course page %s: %s", suffix_url, error)
+        else:
+            raise CookieExpiredError(
+                f"No user of course page {suffix_url} could log in"
+            )
+    finally:
+        await observe_hourly_histograms(
+            observations={
+                f"lms_fetch_seconds:{suffix_url}": time.monotonic()
+                - started_at
+            },
+            buckets=constants.LMS_FETCH_LATENCY_BUCKETS_SECONDS,
+        )
+    if wall is None:
+        return None
+
+    changed_courses = [
+        course for course in courses if course.page_hash != wall.page_hash
     ]
-    courses_messages = await asyncio.gather(*tasks)
-
-    msg_count = 0
-    for crs_messages in courses_messages:
-        for lms_msg in crs_messages:
-            db_msg = await PublicMessage.objects.filter(
-                user=lms_user,
-                item_id=lms_msg.item_id,
-                lms_course__suffix_url=lms_msg.lms_course.suffix_url,
-                author=lms_msg.author,
-                sent_at=lms_msg.sent_at,
-            ).alast()
-
-            if add_message_header_footer(
-                new_message=lms_msg, old_message=db_msg
-            ):
-                lms_msg.user = lms_user
-                await lms_msg.asave()
-                msg_count += 1
-                if is_first_time:
-                    continue
-                send_notifications_task.delay(
-                    chat_id=chat_id, lms_msg_id=lms_msg.pk
-                )
-    return msg_count
+    for course in changed_courses:
+        is_first_time = not course.page_hash
+        course.etag = wall.etag
+        course.last_modified = wall.last_modified
+        course.page_hash = wall.page_hash
+        # The dispatcher (bot.dispatcher) sends the notifications
+        await save_messages(
+            user=course.user,
+            courses_item_ids=[(course, wall.item_ids)],
+            chat_id=None if is_first_time else course.user.chat_id.chat_id,
+        )
+    if changed_courses:
+        await schedule_page_wake_ups(suffix_url=suffix_url)
+    return bool(changed_courses)
+
+
+async def poll_due_courses_service() -> int:
+    """Poll the course pages due for it (see `lms_public.services.polling`).
+    At most `settings.LMS_POLL_REQUESTS_PER_SECOND` times
+    `LMS_POLL_TICK_SECONDS` pages are claimed, so that ticks run every
+    `LMS_POLL_TICK_SECONDS` keep to the request budget. A failing page is
+    logged and does not stop the others. The pages found unchanged (not
+    modified, or with the same page hash) are logged with the others of
+    the tick, and counted in the hourly `poll_unchanged` counter, as those
+    polls skipped parsing and storing the page.
+
+    Returns:
+        int: The number of changed pages
+    """
+
+    schedules = await claim_due_polls(
+        limit=math.ceil(
+            settings.LMS_POLL_REQUESTS_PER_SECOND
+            * settings.LMS_POLL_TICK_SECONDS
+        )
+    )
+    async with lms_session():
+        results = await asyncio.gather(
+            *(
+                poll_course_service(suffix_url=schedule.suffix_url)
+                for schedule in schedules
+            ),
+            return_exceptions=True,
+        )
+
+    for schedule, result in zip(schedules, results):
+        if isinstance(result, BaseException):
+            logger.error(
+                "Polling course page %s failed",
+                schedule.suffix_url,
+                exc_info=result,
+            )
+    results = [
+        None if isinstance(result, BaseException) else result
+        for result in results
+    ]
+    await complete_polls(schedules=schedules, results=results)
+
+    changed_count = results.count(True)
+    unchanged_count = results.count(False)
+    if schedules:
+        unchanged_hour_count = await increment_hourly_counter(
+            name="poll_unchanged", amount=unchanged_count
+        )
+        logger.info(
+            "Polled %d course pages: %d changed, %d unchanged "
+            "(%d this hour), %d failed",
+            len(schedules),
+            changed_count,
+            unchanged_count,
+            unchanged_hour_count,
+            results.count(None),
+        )
+    return changed_count
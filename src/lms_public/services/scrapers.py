@@ -1,35 +1,103 @@
+import asyncio
+import hashlib
+import time
+from typing import NamedTuple
+
 import aiohttp
-from bs4 import BeautifulSoup
+from django.conf import settings
 
 from common.models import LMSCookie
 from common.services import constants
-from lms_public.models import LMSCourse, PublicMessage
-from lms_public.services.parsers import parse_public_message
+from common.services.coordination import single_flight
+from common.services.cookie import CookieExpiredError, cache_cookie
+from common.services.http import get_host_semaphore, lms_session
+from lms_public.models import LMSCourse
+from lms_public.services.parse_pool import run_parser
+from lms_public.services.parsers import (
+    has_wall,
+    is_login_page,
+    parse_courses_info,
+    parse_wall,
+)
+from lms_public.services.wall_items import sync_wall_items
+from lms_public.services.walls import (
+    CourseWall,
+    get_stored_wall,
+    store_wall,
+)
 
 
-async def get_page_text(suffix_url: str, cookie: LMSCookie) -> str:
-    """Get the page text from LMS. Sends request to URL and return the text.
-    Encoding is set to response.charset (UTF-8). However, some messages have
-    have character which cannot be decoded. So, `errors="replace"` is used.
+class Page(NamedTuple):
+    status: int
+    text: str
+    etag: str
+    last_modified: str
+
+
+async def get_page(
+    suffix_url: str, cookie: LMSCookie, headers: dict[str, str] | None = None
+) -> Page:
+    """Get a page from LMS along with its cache validators. Encoding is set
+    to response.charset (UTF-8). However, some messages have character
+    which cannot be decoded. So, `errors="replace"` is used. The request
+    goes through the shared LMS session of the current scope, once a slot
+    of the LMS host semaphore is free, and times out after
+    `settings.LMS_REQUEST_TIMEOUT_SECONDS`. If the LMS sends it to the
+    login page, or serves the login form, the cookie has expired; if not,
+    the cookie is cached as known to work (see `cache_cookie`).
 
     Args:
         suffix_url (str): URL to send request to
         cookie (LMSCookie): An LMSCookie instance
+        headers (dict[str, str] | None, optional): Extra request headers,
+            e.g. conditional request validators. Defaults to None.
+
+    Raises:
+        CookieExpiredError: If redirected to the login page, or served it
+        asyncio.TimeoutError: If the request timed out
 
     Returns:
-        (str): Page text
+        (Page): Status, text (empty unless 200) and validators of the page
     """
-    BASE_URL = constants.BASE_URL
-
-    async with aiohttp.ClientSession(
-        base_url=BASE_URL, cookies=cookie.as_dict
-    ) as session:
-        async with session.get(url=suffix_url) as response:
+    timeout = aiohttp.ClientTimeout(total=settings.LMS_REQUEST_TIMEOUT_SECONDS)
+    async with lms_session() as session, get_host_semaphore():
+        async with session.get(
+            url=suffix_url,
+            cookies=cookie.as_dict,
+            headers=headers,
+            timeout=timeout,
+        ) as response:
+            if response.url.path.startswith(constants.LOGIN_SUFFIX_URL):
+                raise CookieExpiredError(suffix_url)
+            text = ""
             if response.status == 200:
-                return await response.text(
+                text = await response.text(
                     encoding=response.charset, errors="replace"
                 )
-            return ""
+                if is_login_page(text):
+                    raise CookieExpiredError(suffix_url)
+            if response.status in (200, 304) and cookie.user_id is not None:
+                cache_cookie(cookie=cookie)
+            return Page(
+                status=response.status,
+                text=text,
+                etag=response.headers.get("ETag", ""),
+                last_modified=response.headers.get("Last-Modified", ""),
+            )
+
+
+async def get_page_text(suffix_url: str, cookie: LMSCookie) -> str:
+    """Get the page text from LMS. Sends request to URL and return the text.
+
+    Args:
+        suffix_url (str): URL to send request to
+        cookie (LMSCookie): An LMSCookie instance
+
+    Returns:
+        (str): Page text
+    """
+    page = await get_page(suffix_url=suffix_url, cookie=cookie)
+    return page.text
 
 
 async def get_courses_suffix_urls(
@@ -45,43 +113,173 @@ async def get_courses_suffix_urls(
     """
     HOME_SUFFIX_URL = constants.HOME_SUFFIX_URL
     page_text = await get_page_text(suffix_url=HOME_SUFFIX_URL, cookie=cookie)
-    soup = BeautifulSoup(page_text, "html.parser")
-    li_tags = soup.find(id="profile_groups").find_all("li")
-    courses_info = list()
-    for li_tag in li_tags:
-        course_suffix_url = li_tag.find("a").get("href")
-        course_name = li_tag.find_all("div")[1].text.split("\t")[1].strip()
-        single_info = (course_suffix_url, course_name)
-        courses_info.append(single_info)
-    return courses_info
-
-
-async def get_course_messages(
+    return parse_courses_info(page_text=page_text)
+
+
+def get_conditional_headers(
+    validators: LMSCourse | CourseWall,
+) -> dict[str, str]:
+    """Build conditional request headers from the validators of the last
+    fetch of a course page
+
+    Args:
+        validators (LMSCourse | CourseWall): An LMSCourse instance, or the
+            stored wall of its page
+
+    Returns:
+        (dict[str, str]): `If-None-Match`/`If-Modified-Since` headers
+    """
+    headers = dict()
+    if validators.etag:
+        headers["If-None-Match"] = validators.etag
+    if validators.last_modified:
+        headers["If-Modified-Since"] = validators.last_modified
+    return headers
+
+
+async def get_course_wall(
     course: LMSCourse, cookie: LMSCookie
-) -> list[PublicMessage]:
-    """Get the course messages from LMS. Sends request to course page.
-    Parses the text using bs4.
+) -> CourseWall | None:
+    """Get the wall of a course page, shared by every user enrolled in the
+    course. A wall fetched within `settings.LMS_SHARED_WALL_SECONDS` is
+    reused; otherwise one worker fetches the page with `cookie` while those
+    of the other users wait for it (see `single_flight`). The request is
+    conditional on the validators of the stored wall, or of `course` if
+    there is none; if the stored wall has expired and the page is not
+    modified since `course` was fetched, it is fetched again without them,
+    since the items of other users' courses are only known from a wall.
+    Only if its body has changed is the page parsed, and its new items
+    stored once for all users (see `sync_wall_items`).
+
+    Args:
+        course (LMSCourse): An LMSCourse instance
+        cookie (LMSCookie): An LMSCookie of a user enrolled in the course
+
+    Returns:
+        (CourseWall | None): The wall, or None if it could not be read
+
+    Raises:
+        CookieExpiredError: If the page was served without its wall, or
+            see `get_page`
+    """
+    wall = await get_stored_wall(suffix_url=course.suffix_url)
+    if wall is not None and wall.is_fresh:
+        return wall
+
+    async with single_flight(key=f"wall:{course.suffix_url}"):
+        wall = await get_stored_wall(suffix_url=course.suffix_url)
+        if wall is not None and wall.is_fresh:
+            return wall
+
+        page = await get_page(
+            suffix_url=course.suffix_url,
+            cookie=cookie,
+            headers=get_conditional_headers(validators=wall or course),
+        )
+        if page.status == 304 and wall is None:
+            # Not modified since `course` was fetched, but the items of the
+            # page are only known from a stored wall
+            page = await get_page(suffix_url=course.suffix_url, cookie=cookie)
+        if page.status == 304 and wall is not None:
+            wall = wall._replace(fetched_at=time.time())
+        elif page.status != 200:
+            return None
+        elif not has_wall(page.text):
+            # Not the page an enrolled user sees
+            raise CookieExpiredError(course.suffix_url)
+        else:
+            page_hash = hashlib.blake2b(
+                page.text.encode(), digest_size=16
+            ).hexdigest()
+            if wall is None or page_hash != wall.page_hash:
+                messages = await run_parser(parse_wall, page.text)
+                item_ids = await sync_wall_items(
+                    suffix_url=course.suffix_url, messages=messages
+                )
+            else:
+                item_ids = wall.item_ids
+            wall = CourseWall(
+                page_hash=page_hash,
+                etag=page.etag,
+                last_modified=page.last_modified,
+                item_ids=item_ids,
+                fetched_at=time.time(),
+            )
+        await store_wall(suffix_url=course.suffix_url, wall=wall)
+    return wall
+
+
+async def get_course_items(
+    course: LMSCourse, cookie: LMSCookie
+) -> list[int] | None:
+    """Get the items of a course wall from LMS, from the wall shared by the
+    users enrolled in the course (see `get_course_wall`). If the wall has
+    the same page hash as the last one of `course`, there is nothing new.
+    The new validators are set on `course`, but not saved; the caller saves
+    them once the messages are stored.
 
     Args:
         course (LMSCourse): An LMSCourser instance
         cookie (LMSCookie): An LMSCookie instance
 
     Returns:
-        (list[PublicMessage]): List of course messages
+        (list[int] | None): The pk of the latest version of every item of
+        the wall, or None if the page has not changed since the last fetch
     """
-    page_text = await get_page_text(
-        suffix_url=course.suffix_url, cookie=cookie
-    )
-
-    # Begin scrape
-    soup = BeautifulSoup(page_text, "html.parser")
-    message_containers = soup.find_all(class_="wall-action-item")
-    parsed_messages = list()
-    for msg_container in message_containers:
-        parsed_messages.append(
-            parse_public_message(
-                message_container=msg_container,
-                course=course,
-            )
-        )
-    return parsed_messages
+    wall = await get_course_wall(course=course, cookie=cookie)
+    if wall is None or wall.page_hash == course.page_hash:
+        return None
+    course.etag = wall.etag
+    course.last_modified = wall.last_modified
+    course.page_hash = wall.page_hash
+    return wall.item_ids
+
+
+async def get_courses_items(
+    courses: list[LMSCourse],
+    cookie: LMSCookie,
+    timeout: float,
+    latencies: dict[str, float],
+) -> list[list[int] | None | BaseException]:
+    """Get the wall items of many courses concurrently (see
+    `get_course_items`), within a deadline. A course which fails, or is
+    not done within `timeout`, gets its exception as its result, and does
+    not affect the others.
+
+    Args:
+        courses (list[LMSCourse]): LMSCourse instances
+        cookie (LMSCookie): An LMSCookie instance
+        timeout (float): Seconds to wait for all of them
+        latencies (dict[str, float]): Where to put how long each course
+            took, by page URL, including the ones which failed
+
+    Returns:
+        (list[list[int] | None | BaseException]): The result of
+        each course, in order; `asyncio.TimeoutError` for those not done
+        in time
+    """
+
+    async def get_timed_course_items(course: LMSCourse) -> list[int] | None:
+        started_at = time.monotonic()
+        try:
+            return await get_course_items(course=course, cookie=cookie)
+        finally:
+            latencies[course.suffix_url] = time.monotonic() - started_at
+
+    tasks = [
+        asyncio.create_task(get_timed_course_items(course=course))
+        for course in courses
+    ]
+    if not tasks:
+        return list()
+
+    _, pending = await asyncio.wait(tasks, timeout=max(timeout, 0))
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+    return [
+        asyncio.TimeoutError()
+        if task in pending
+        else task.exception() or task.result()
+        for task in tasks
+    ]
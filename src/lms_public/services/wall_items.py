@@ -0,0 +1,96 @@
+from asgiref.sync import sync_to_async
+from django.utils import timezone
+
+from lms_public.models import WallItem
+from lms_public.services.change_handler import (
+    add_headers_footers,
+    add_message_header_footer,
+)
+from lms_public.services.lookups import (
+    get_latest_hashes,
+    get_latest_versions,
+    message_key,
+)
+from lms_public.services.parsers import ParsedMessage
+
+
+@sync_to_async
+def save_wall_items(wall_items: list[WallItem]) -> list[WallItem]:
+    """Insert wall items with a single bulk INSERT
+
+    Args:
+        wall_items (list[WallItem]): Unsaved WallItem instances
+
+    Returns:
+        (list[WallItem]): The same wall items, with their pk set
+    """
+    return WallItem.objects.bulk_create(wall_items)
+
+
+async def sync_wall_items(
+    suffix_url: str, messages: list[ParsedMessage]
+) -> list[int]:
+    """Store the new and changed items of a course wall, with their header
+    and footer, once for all the users enrolled in the course. Run it once
+    per change of the page, e.g. under its lock: two concurrent runs would
+    store the same versions twice.
+
+    Args:
+        suffix_url (str): The URL of the course page
+        messages (list[ParsedMessage]): The items of its wall, in order
+
+    Returns:
+        (list[int]): The pk of the latest version of every item of the
+        wall, in order
+    """
+
+    latest_hashes = await get_latest_hashes(
+        suffix_url=suffix_url, messages=messages
+    )
+    candidates, latest_versions = await get_latest_versions(
+        latest_hashes=latest_hashes, messages=messages
+    )
+
+    # Diff the first scraped version of every item in bulk. An item scraped
+    # more than once is rare; its later versions are each compared with the
+    # latest one before them.
+    first_msgs, repeated_msgs, keys = list(), list(), set()
+    for lms_msg in candidates:
+        key = message_key(lms_msg)
+        (repeated_msgs if key in keys else first_msgs).append(lms_msg)
+        keys.add(key)
+
+    are_changed = add_headers_footers(
+        new_messages=first_msgs,
+        old_messages=[
+            latest_versions.get(message_key(lms_msg)) for lms_msg in first_msgs
+        ],
+    )
+    changed_msgs = [
+        lms_msg
+        for lms_msg, is_changed in zip(first_msgs, are_changed)
+        if is_changed
+    ]
+    for lms_msg in changed_msgs:
+        latest_versions[message_key(lms_msg)] = lms_msg
+    for lms_msg in repeated_msgs:
+        key = message_key(lms_msg)
+        db_msg = latest_versions.get(key)
+
+        if add_message_header_footer(new_message=lms_msg, old_message=db_msg):
+            latest_versions[key] = lms_msg
+            changed_msgs.append(lms_msg)
+
+    now = timezone.now()
+    saved_items = await save_wall_items(
+        [
+            lms_msg.to_wall_item(suffix_url=suffix_url, now=now)
+            for lms_msg in changed_msgs
+        ]
+    )
+    latest_pks = {key: pk for key, (pk, _) in latest_hashes.items()}
+    for wall_item in saved_items:
+        latest_pks[message_key(wall_item)] = wall_item.pk
+    return list(
+        dict.fromkeys(latest_pks[message_key(lms_msg)] for lms_msg in messages)
+    )
@@ -0,0 +1,89 @@
+import json
+import time
+from typing import NamedTuple
+
+from django.conf import settings
+
+from common.services import constants
+from common.services.coordination import get_shared_value, set_shared_value
+
+
+class CourseWall(NamedTuple):
+    """The last fetch of a course page, shared by every user enrolled in
+    the course
+
+    Attributes:
+        page_hash (str): Hash of the page text
+        etag (str): `ETag` of the page
+        last_modified (str): `Last-Modified` of the page
+        item_ids (list[int]): The pk of the latest version of every item
+            of the wall (see `WallItem`), in order
+        fetched_at (float): When the page was last fetched, or found not
+            modified (Unix time)
+    """
+
+    page_hash: str
+    etag: str
+    last_modified: str
+    item_ids: list[int]
+    fetched_at: float
+
+    @property
+    def is_fresh(self) -> bool:
+        """Whether it was fetched within `settings.LMS_SHARED_WALL_SECONDS`,
+        so it is used instead of fetching the page again
+        """
+        return time.time() - self.fetched_at < settings.LMS_SHARED_WALL_SECONDS
+
+
+def get_wall_key(suffix_url: str) -> str:
+    return f"course_wall:{suffix_url}"
+
+
+async def get_stored_wall(suffix_url: str) -> CourseWall | None:
+    """Get the last wall stored for a course page by any worker
+
+    Args:
+        suffix_url (str): The URL of the course page
+
+    Returns:
+        (CourseWall | None): The wall, or None if there is none
+    """
+
+    value = await get_shared_value(key=get_wall_key(suffix_url))
+    if value is None:
+        return None
+    wall = json.loads(value)
+    return CourseWall(
+        page_hash=wall["page_hash"],
+        etag=wall["etag"],
+        last_modified=wall["last_modified"],
+        item_ids=wall["item_ids"],
+        fetched_at=wall["fetched_at"],
+    )
+
+
+async def store_wall(suffix_url: str, wall: CourseWall) -> None:
+    """Store the wall of a course page for every worker, for
+    `WALL_CACHE_TTL_SECONDS`. It is kept longer than it is fresh for, so
+    its validators let the next fetch be a conditional request.
+
+    Args:
+        suffix_url (str): The URL of the course page
+        wall (CourseWall): The wall
+    """
+
+    value = json.dumps(
+        {
+            "page_hash": wall.page_hash,
+            "etag": wall.etag,
+            "last_modified": wall.last_modified,
+            "item_ids": wall.item_ids,
+            "fetched_at": wall.fetched_at,
+        }
+    )
+    await set_shared_value(
+        key=get_wall_key(suffix_url),
+        value=value,
+        ttl_seconds=constants.WALL_CACHE_TTL_SECONDS,
+    )
@@ -2,7 +2,9 @@ import asyncio
 
 from celery import shared_task
 
+from lms_public.services.polling import plan_course_polls
 from lms_public.services.scheduled_tasks import check_new_messages_service
+from lms_public.services.scheduled_tasks import poll_due_courses_service
 from lms_public.services.scheduled_tasks import update_user_courses_service
 
 
@@ -18,3 +20,13 @@ def check_new_messages_task(user_id: int, is_first_time: bool = False) -> int:
             user_id=user_id, is_first_time=is_first_time
         )
     )
+
+
+@shared_task
+def poll_due_courses_task() -> int:
+    return asyncio.run(poll_due_courses_service())
+
+
+@shared_task(ignore_result=True)
+def plan_course_polls_task() -> None:
+    plan_course_polls()
@@ -0,0 +1,934 @@
+import gzip
+import json
+import re
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from html.parser import HTMLParser
+from io import StringIO
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from asgiref.sync import sync_to_async
+from django.apps import apps
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.test import (
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.utils import timezone
+
+from common.models import LMSCookie, LMSUser
+from common.services import constants
+from common.services.cookie import (
+    CookieExpiredError,
+    _cookie_cache,
+    is_cookie_cached,
+)
+from common.services.coordination import (
+    _local_histograms,
+    get_hourly_histogram,
+)
+from lms_public.models import (
+    CoursePollSchedule,
+    LMSCourse,
+    PublicMessage,
+    PublicMessageDelivery,
+    WallItem,
+)
+from lms_public.services.change_handler import (
+    add_headers_footers,
+    add_message_header_footer,
+    public_message_to_html,
+    public_messages_to_html_pages,
+    split_html_pages,
+    telegram_length,
+)
+from lms_public.services.dates import (
+    LMS_TIME_ZONE,
+    jalali_to_gregorian,
+    parse_lms_time,
+)
+from lms_public.services.fingerprint import TRACKED_FIELDS, TrackedValues
+from lms_public.services.lookups import latest_versions_queryset
+from lms_public.services.outbox import (
+    claim_deliveries,
+    complete_deliveries,
+    create_deliveries,
+)
+from lms_public.services.parsers import parse_wall
+from lms_public.services.polling import (
+    ItemTimes,
+    get_item_times,
+    get_poll_interval,
+    plan_poll_intervals,
+)
+from lms_public.services.scheduled_tasks import poll_course_service
+from lms_public.services.scrapers import get_course_wall, get_page
+
+TEST_DATA = Path(__file__).parent / "test_data"
+
+# A plan line scanning the index, e.g. "Index Scan using <index>" or
+# "Bitmap Index Scan on <index>"
+INDEX_SCAN = r"Index (Only )?Scan (using|on) %s"
+
+
+class LatestVersionsQueryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # 50 course pages of 100 items, of two versions each
+        WallItem.objects.bulk_create(
+            WallItem(
+                suffix_url=f"/group/{page}",
+                item_id=str(item),
+                author="استاد",
+                sent_at="1403/01/01",
+                text=str(version),
+            )
+            for page in range(50)
+            for item in range(100)
+            for version in range(2)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {WallItem._meta.db_table}")
+
+    def test_uses_version_index(self):
+        plan = latest_versions_queryset(
+            suffix_url="/group/3", item_ids={"1", "2", "3"}
+        ).explain()
+        self.assertRegex(plan, INDEX_SCAN % "wall_item_version_idx")
+        self.assertNotIn("Seq Scan", plan)
+
+    def test_latest_versions(self):
+        latest = latest_versions_queryset(
+            suffix_url="/group/3", item_ids={"1", "2"}
+        )
+        self.assertEqual(
+            sorted((item.item_id, item.text) for item in latest),
+            [("1", "1"), ("2", "1")],
+        )
+
+
+class ParseWallTests(SimpleTestCase):
+    """`parse_wall` against a saved course page, `course_wall.html`, with
+    plain, expanded, attachment, link, exercise and online session items,
+    and the fields expected of each in `course_wall.json`
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.page = (TEST_DATA / "course_wall.html").read_text()
+        with open(TEST_DATA / "course_wall.json") as file:
+            cls.expected = json.load(file)
+
+    def assertParsed(self) -> None:
+        messages = parse_wall(self.page)
+        self.assertEqual(len(messages), len(self.expected))
+        for message, expected in zip(messages, self.expected):
+            self.assertEqual(
+                {field: getattr(message, field) for field in expected},
+                expected,
+            )
+
+    def test_html_parser(self):
+        with override_settings(LMS_HTML_PARSER="html.parser"):
+            self.assertParsed()
+
+    def test_lxml(self):
+        try:
+            import lxml  # noqa: F401
+        except ImportError:
+            self.skipTest("lxml is not installed")
+        with override_settings(LMS_HTML_PARSER="lxml"):
+            self.assertParsed()
+
+    def test_unknown_parser(self):
+        app_config = apps.get_app_config("lms_public")
+        with override_settings(LMS_HTML_PARSER="html6"):
+            with self.assertRaises(ImproperlyConfigured):
+                app_config.ready()
+
+
+class RenderQueriesTests(TestCase):
+    """Notifications are rendered from messages loaded as
+    `bot.services.send_notifications_service` loads them, without queries
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        user = LMSUser.objects.create(username="4001", password="p")
+        course = LMSCourse.objects.create(
+            user=user, name="ریاضی ۱", suffix_url="/group/1"
+        )
+        items = [
+            dict(text="متن <ساده> & کوتاه"),
+            dict(
+                has_attachment=True,
+                attachment_name="جزوه.pdf",
+                attachment_link="/file/1",
+            ),
+            dict(
+                is_exercise=True,
+                exercise_name="تمرین ۱",
+                exercise_start="1403/01/01 08:00",
+                exercise_deadline="1403/01/19 23:59",
+            ),
+            dict(
+                is_online_session=True,
+                online_session_name="جلسه ۱",
+                online_session_link="/session/1",
+                online_session_status="در حال برگزاری",
+                online_session_start="1403/01/20 10:00",
+                online_session_end="1403/01/20 11:30",
+                header="یک جلسه‌ی آنلاین جدید ایجاد شد.",
+                footer="تغییر نام جلسه آنلاین",
+            ),
+        ]
+        cls.message_ids = [
+            PublicMessage.objects.create(
+                user=user,
+                lms_course=course,
+                wall_item=WallItem.objects.create(
+                    suffix_url="/group/1",
+                    item_id=str(index),
+                    author="استاد",
+                    sent_at="2 ساعت پیش",
+                    **fields,
+                ),
+            ).pk
+            for index, fields in enumerate(items)
+        ]
+
+    def test_render_preloaded(self):
+        messages = PublicMessage.objects.select_related(
+            "lms_course", "wall_item"
+        ).in_bulk(self.message_ids)
+        messages = [messages[pk] for pk in self.message_ids]
+        with self.assertNumQueries(0):
+            for message in messages:
+                public_message_to_html(message)
+            pages = public_messages_to_html_pages(messages=messages)
+        self.assertEqual(len(pages), 1)
+        self.assertIn("&lt;ساده&gt; &amp; کوتاه", pages[0])
+
+
+# The tracked fields which are booleans
+BOOLEAN_FIELDS = (
+    "is_exercise",
+    "is_exercise_finished",
+    "has_attachment",
+    "is_online_session",
+)
+
+
+def make_tracked_values(version: str) -> dict:
+    """The tracked fields of a version made up for the headers fixture:
+    booleans are True in the `new` version, and strings name the version
+    """
+    return {
+        field: version == "new"
+        if field in BOOLEAN_FIELDS
+        else f"{version} {field}"
+        for field in TRACKED_FIELDS
+    }
+
+
+def make_messages(rows: list, first: str, second: str) -> list:
+    """One message per changed-fields mask, whose masked fields are of the
+    `second` version and the others of the `first`
+    """
+    old_values = make_tracked_values(first)
+    new_values = make_tracked_values(second)
+    return [
+        SimpleNamespace(
+            **{
+                field: new_values[field] if mask >> bit & 1 else value
+                for bit, (field, value) in enumerate(old_values.items())
+            },
+            header="",
+            footer="",
+        )
+        for mask in range(len(rows))
+    ]
+
+
+class ChangeHeadersTests(SimpleTestCase):
+    """The change rules against the headers and footers of the if/elif
+    chain they replaced, frozen for every changed-fields mask in both
+    directions, in `test_data/change_headers.json.gz`
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        with gzip.open(TEST_DATA / "change_headers.json.gz", "rt") as file:
+            cls.frozen = json.load(file)
+
+    def get_expected(self, row: list[int]) -> tuple[bool, str, str]:
+        changed, header, footer = row
+        labels = self.frozen["footers"][footer]
+        return (
+            bool(changed),
+            self.frozen["headers"][header],
+            "\n- ".join(self.frozen["minor_labels"][i] for i in labels),
+        )
+
+    def test_every_mask(self):
+        for direction, rows in self.frozen["masks"].items():
+            first, second = direction.split("_to_")
+            old_message = TrackedValues(**make_tracked_values(first))
+            self.assertEqual(len(rows), 1 << len(TRACKED_FIELDS))
+            messages = make_messages(rows, first, second)
+            for mask, (message, row) in enumerate(zip(messages, rows)):
+                changed = add_message_header_footer(message, old_message)
+                self.assertEqual(
+                    (changed, message.header, message.footer),
+                    self.get_expected(row),
+                    f"{direction} {mask:014b}",
+                )
+
+    def test_many_messages(self):
+        rows = self.frozen["masks"]["old_to_new"]
+        messages = make_messages(rows, "old", "new")
+        old_message = TrackedValues(**make_tracked_values("old"))
+        are_changed = add_headers_footers(
+            messages, [old_message] * len(messages)
+        )
+        for mask, (message, row) in enumerate(zip(messages, rows)):
+            self.assertEqual(
+                (are_changed[mask], message.header, message.footer),
+                self.get_expected(row),
+                f"{mask:014b}",
+            )
+
+
+# An "&" which does not start an entity
+BROKEN_ENTITY = re.compile(r"&(?!#?\w+;)")
+
+
+class TagChecker(HTMLParser):
+    """Records the elements left open, or closed without being open"""
+
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=False)
+        self.open_tags = list()
+        self.errors = list()
+
+    def handle_starttag(self, tag, attrs):
+        self.open_tags.append(tag)
+
+    def handle_endtag(self, tag):
+        if not self.open_tags or self.open_tags.pop() != tag:
+            self.errors.append(tag)
+
+
+def make_message(**fields) -> PublicMessage:
+    wall_item = WallItem(
+        suffix_url="/group/1", item_id="1", author="استاد", **fields
+    )
+    return PublicMessage(
+        lms_course=LMSCourse(name="ریاضی ۱", suffix_url="/group/1"),
+        wall_item=wall_item,
+    )
+
+
+class SplitHtmlPagesTests(SimpleTestCase):
+    def assertValidPages(self, pages: list[str], max_length: int) -> None:
+        for page in pages:
+            self.assertLessEqual(telegram_length(page), max_length)
+            self.assertIsNone(BROKEN_ENTITY.search(page), page[-40:])
+            checker = TagChecker()
+            checker.feed(page)
+            checker.close()
+            self.assertEqual(checker.errors, [], page)
+            self.assertEqual(checker.open_tags, [], page)
+
+    def test_long_attachment_name(self):
+        messages = [
+            make_message(
+                text="متن " * 400,
+                has_attachment=True,
+                attachment_name="جزوه " * 700,
+                attachment_link="/file/1",
+            )
+        ]
+        pages = public_messages_to_html_pages(messages=messages)
+        self.assertGreater(len(pages), 1)
+        self.assertValidPages(pages, max_length=4096)
+        self.assertIn("جزوه", pages[-1])
+
+    def test_escaped_text(self):
+        for offset in range(8):
+            messages = [make_message(text="x" * offset + "R&D " * 2000)]
+            pages = public_messages_to_html_pages(messages=messages)
+            self.assertGreater(len(pages), 1)
+            self.assertValidPages(pages, max_length=4096)
+
+    def test_text_is_kept(self):
+        blocks = ["<b>" + "a&amp;b " * 50 + "</b>", "\n" + "c " * 100]
+        pages = split_html_pages(header="H", blocks=blocks, max_length=120)
+        self.assertValidPages(pages, max_length=120)
+        text = "".join(
+            re.sub(r"</?b>", "", page.removeprefix("H")) for page in pages
+        )
+        self.assertEqual(text, re.sub(r"</?b>", "", "".join(blocks)))
+
+
+@override_settings(LMS_POLL_MIN_SECONDS=60, LMS_POLL_MAX_SECONDS=3600)
+class PlanPollIntervalsTests(SimpleTestCase):
+    def assertWithinBudget(
+        self, intervals: dict[str, int], requests_per_second: float
+    ) -> None:
+        self.assertAlmostEqual(
+            sum(1 / seconds for seconds in intervals.values()),
+            requests_per_second,
+            places=3,
+        )
+
+    def test_inverse_square_root(self):
+        # The square roots of the rates add up to 7
+        intervals = plan_poll_intervals(
+            changes_per_day={"/group/1": 1, "/group/2": 4, "/group/3": 16},
+            hot_suffix_urls=set(),
+            requests_per_second=7 / 960,
+        )
+        self.assertEqual(
+            intervals, {"/group/1": 960, "/group/2": 480, "/group/3": 240}
+        )
+        self.assertWithinBudget(intervals, 7 / 960)
+
+    def test_hot_pages(self):
+        intervals = plan_poll_intervals(
+            changes_per_day={"/group/1": 1, "/group/2": 4, "/group/9": 1},
+            hot_suffix_urls={"/group/9", "/group/10"},
+            requests_per_second=1 / 60 + 3 / 960,
+        )
+        self.assertEqual(
+            intervals, {"/group/1": 960, "/group/2": 480, "/group/9": 60}
+        )
+
+    def test_clamped_pages(self):
+        # /group/3 would be polled every 51 s, and /group/4 every 27 hours
+        intervals = plan_poll_intervals(
+            changes_per_day={
+                "/group/1": 1,
+                "/group/2": 1,
+                "/group/3": 10000,
+                "/group/4": 0.0001,
+            },
+            hot_suffix_urls=set(),
+            requests_per_second=0.02,
+        )
+        self.assertEqual(intervals["/group/3"], 60)
+        self.assertEqual(intervals["/group/4"], 3600)
+        # The rest of the budget is split between the other pages
+        self.assertEqual(intervals["/group/1"], intervals["/group/2"])
+        self.assertWithinBudget(intervals, 0.02)
+
+    def test_budget_too_small(self):
+        intervals = plan_poll_intervals(
+            changes_per_day={"/group/1": 1, "/group/2": 100},
+            hot_suffix_urls=set(),
+            requests_per_second=1 / 3600,
+        )
+        self.assertEqual(intervals, {"/group/1": 3600, "/group/2": 3600})
+
+
+@override_settings(LMS_POLL_MIN_SECONDS=60, LMS_POLL_MAX_SECONDS=3600)
+class GetPollIntervalTests(SimpleTestCase):
+    def get_interval(self, unchanged_polls: int, is_hot=False) -> int:
+        # A change every hour is expected within 6 polls
+        schedule = CoursePollSchedule(
+            suffix_url="/group/1",
+            changes_per_day=24,
+            is_hot=is_hot,
+            planned_interval_seconds=600,
+            unchanged_polls=unchanged_polls,
+        )
+        return get_poll_interval(schedule)
+
+    def test_planned_interval(self):
+        for unchanged_polls in range(7):
+            self.assertEqual(self.get_interval(unchanged_polls), 600)
+
+    def test_backoff(self):
+        self.assertEqual(self.get_interval(7), 1200)
+        self.assertEqual(self.get_interval(8), 2400)
+        self.assertEqual(self.get_interval(9), 3600)
+        self.assertEqual(self.get_interval(10_000), 3600)
+
+    def test_hot_page(self):
+        self.assertEqual(self.get_interval(10, is_hot=True), 60)
+
+
+class ItemTimesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.deadline = timezone.now() + timedelta(days=1)
+        exercise = dict(
+            author="استاد",
+            sent_at="1403/01/10 08:00",
+            is_exercise=True,
+            exercise_deadline="1403/01/19 23:59",
+            exercise_deadline_time=cls.deadline,
+        )
+        WallItem.objects.bulk_create(
+            [
+                # Still an exercise
+                WallItem(suffix_url="/group/1", item_id="1", **exercise),
+                # Edited into a plain item
+                WallItem(suffix_url="/group/1", item_id="2", **exercise),
+                WallItem(
+                    suffix_url="/group/1",
+                    item_id="2",
+                    **{**exercise, "is_exercise": False},
+                ),
+                # Finished since
+                WallItem(suffix_url="/group/2", item_id="3", **exercise),
+                WallItem(
+                    suffix_url="/group/2",
+                    item_id="3",
+                    **{**exercise, "is_exercise_finished": True},
+                ),
+            ]
+        )
+
+    def test_latest_versions(self):
+        self.assertEqual(
+            get_item_times(suffix_urls={"/group/1", "/group/2"}),
+            [ItemTimes("/group/1", self.deadline, None, None)],
+        )
+
+
+class DatesTests(SimpleTestCase):
+    now = datetime(2024, 4, 7, 12, 0, tzinfo=LMS_TIME_ZONE)
+
+    def test_year_boundaries(self):
+        for jalali, gregorian in (
+            ((1399, 10, 11), (2020, 12, 31)),
+            ((1399, 10, 12), (2021, 1, 1)),
+            ((1402, 12, 29), (2024, 3, 19)),
+            ((1403, 1, 1), (2024, 3, 20)),
+            ((1403, 12, 30), (2025, 3, 20)),
+            ((1404, 1, 1), (2025, 3, 21)),
+            ((1404, 12, 29), (2026, 3, 20)),
+            ((1405, 1, 1), (2026, 3, 21)),
+        ):
+            self.assertEqual(
+                jalali_to_gregorian(*jalali), datetime(*gregorian).date()
+            )
+
+    def test_30_esfand(self):
+        # Of the years 1399 to 1408, only 1399, 1403 and 1408 are leap
+        for year in range(1399, 1409):
+            if year in (1399, 1403, 1408):
+                jalali_to_gregorian(year, 12, 30)
+            else:
+                with self.assertRaises(ValueError):
+                    jalali_to_gregorian(year, 12, 30)
+
+    def test_jalali_datetime(self):
+        for text in ("1403/01/19 23:59", "۱۴۰۳/۰۱/۱۹ ۲۳:۵۹"):
+            self.assertEqual(
+                parse_lms_time(text, now=self.now),
+                datetime(2024, 4, 7, 23, 59, tzinfo=LMS_TIME_ZONE),
+            )
+        self.assertEqual(
+            parse_lms_time("1403/01/19", now=self.now),
+            datetime(2024, 4, 7, tzinfo=LMS_TIME_ZONE),
+        )
+
+    def test_relative_time(self):
+        for text, time in (
+            ("4 ساعت پیش", self.now - timedelta(hours=4)),
+            ("۳ روز پیش", self.now - timedelta(days=3)),
+            ("2 weeks ago", self.now - timedelta(weeks=2)),
+            ("لحظاتی پیش", self.now),
+            (
+                "دیروز ساعت 18:20",
+                datetime(2024, 4, 6, 18, 20, tzinfo=LMS_TIME_ZONE),
+            ),
+        ):
+            self.assertEqual(parse_lms_time(text, now=self.now), time, text)
+
+    def test_unparseable(self):
+        for text in (
+            "",
+            "پایان یافته",
+            "1403/13/01",
+            "1402/12/30",
+            "1403/01/19 25:00",
+            "soon",
+        ):
+            self.assertIsNone(parse_lms_time(text, now=self.now), text)
+
+
+class BackfillWallItemTimesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        item = dict(suffix_url="/group/1", author="استاد")
+        WallItem.objects.bulk_create(
+            [
+                WallItem(
+                    item_id="1",
+                    sent_at="1403/01/10 08:00",
+                    are_times_parsed=False,
+                    **item,
+                ),
+                WallItem(
+                    item_id="2",
+                    sent_at="نامعلوم",
+                    are_times_parsed=False,
+                    **item,
+                ),
+                # Parsed when it was stored
+                WallItem(item_id="3", sent_at="1403/01/10 08:00", **item),
+            ]
+        )
+
+    def backfill(self) -> str:
+        out = StringIO()
+        call_command("backfill_wall_item_times", stdout=out)
+        return out.getvalue()
+
+    def test_backfill_once(self):
+        self.assertEqual(self.backfill(), "2 wall items updated\n")
+        sent_times = dict(WallItem.objects.values_list("item_id", "sent_time"))
+        self.assertEqual(
+            sent_times,
+            {
+                "1": datetime(2024, 3, 29, 8, 0, tzinfo=LMS_TIME_ZONE),
+                "2": None,
+                "3": None,
+            },
+        )
+        self.assertFalse(
+            WallItem.objects.filter(are_times_parsed=False).exists()
+        )
+        # The item whose time does not parse is not tried again
+        self.assertEqual(self.backfill(), "")
+
+
+LOGIN_FORM = (
+    '<form id="user_form_login" action="/login" method="post">'
+    '<input type="email" name="email">'
+    '<input type="password" name="password"></form>'
+)
+
+
+def serve_page(text: str):
+    async def handler(request: web.Request) -> web.Response:
+        return web.Response(text=text, content_type="text/html")
+
+    return handler
+
+
+async def redirect_to_login(request: web.Request) -> web.Response:
+    raise web.HTTPFound(constants.LOGIN_SUFFIX_URL)
+
+
+@override_settings(REDIS_URL="")
+class GetPageTests(SimpleTestCase):
+    """`get_page` against a local server in place of the LMS, which serves
+    the login form at /group/2, and redirects to it from /group/3
+    """
+
+    def setUp(self):
+        _cookie_cache.clear()
+        self.cookie = LMSCookie(user_id=7, cookie="c")
+
+    async def fetch(self, fetch_page):
+        app = web.Application()
+        app.router.add_get(
+            "/group/1",
+            serve_page((TEST_DATA / "course_wall.html").read_text()),
+        )
+        app.router.add_get("/group/2", serve_page(LOGIN_FORM))
+        app.router.add_get("/group/3", redirect_to_login)
+        app.router.add_get("/group/4", serve_page("<p>Not found</p>"))
+        app.router.add_get(constants.LOGIN_SUFFIX_URL, serve_page(LOGIN_FORM))
+        async with TestServer(app) as server:
+            with mock.patch.object(
+                constants, "BASE_URL", str(server.make_url("/"))
+            ):
+                return await fetch_page()
+
+    async def test_page(self):
+        page = await self.fetch(lambda: get_page("/group/1", self.cookie))
+        self.assertEqual(page.status, 200)
+        self.assertIn("activity-item-101", page.text)
+        self.assertTrue(is_cookie_cached(user_id=7))
+
+    async def test_login_page(self):
+        for suffix_url in ("/group/2", "/group/3"):
+            with self.assertRaises(CookieExpiredError):
+                await self.fetch(lambda: get_page(suffix_url, self.cookie))
+        self.assertFalse(is_cookie_cached(user_id=7))
+
+    async def test_page_without_wall(self):
+        course = LMSCourse(user_id=7, name="ریاضی ۱", suffix_url="/group/4")
+        with self.assertRaises(CookieExpiredError):
+            await self.fetch(
+                lambda: get_course_wall(course=course, cookie=self.cookie)
+            )
+
+
+@override_settings(REDIS_URL="")
+class PollCourseTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for username in ("4001", "4002"):
+            user = LMSUser.objects.create(username=username, password="p")
+            LMSCourse.objects.create(
+                user=user, name="ریاضی ۱", suffix_url="/group/1"
+            )
+
+    def setUp(self):
+        _local_histograms.clear()
+
+    async def test_latency_by_page(self):
+        with mock.patch(
+            "lms_public.services.scheduled_tasks.get_course_wall_as_user",
+            mock.AsyncMock(return_value=None),
+        ):
+            self.assertIsNone(await poll_course_service("/group/1"))
+        # One fetch of the page, whichever user it was fetched as
+        histogram = await get_hourly_histogram(
+            name="lms_fetch_seconds:/group/1", hour=timezone.now()
+        )
+        self.assertEqual(histogram["count"], 1)
+
+
+@contextmanager
+def lock_delivery(pk: int):
+    """Hold a row lock on a delivery from another connection, as a
+    dispatcher sending it would
+    """
+
+    locked = threading.Event()
+    release = threading.Event()
+
+    def hold_lock():
+        try:
+            with transaction.atomic():
+                list(
+                    PublicMessageDelivery.objects.select_for_update().filter(
+                        pk=pk
+                    )
+                )
+                locked.set()
+                # A claim that waited for the lock fails, rather than hangs
+                release.wait(timeout=5)
+        finally:
+            connection.close()
+
+    thread = threading.Thread(target=hold_lock)
+    thread.start()
+    locked.wait()
+    try:
+        yield
+    finally:
+        release.set()
+        thread.join()
+
+
+class OutboxTests(TransactionTestCase):
+    """Claiming deliveries across transactions, so their row locks are
+    real. Time is moved by patching `timezone.now`
+    """
+
+    def setUp(self):
+        self.now = timezone.now()
+        user = LMSUser.objects.create(username="4001", password="p")
+        course = LMSCourse.objects.create(
+            user=user, name="ریاضی ۱", suffix_url="/group/1"
+        )
+        self.messages = [
+            PublicMessage.objects.create(
+                user=user,
+                lms_course=course,
+                wall_item=WallItem.objects.create(
+                    suffix_url="/group/1",
+                    item_id=str(index),
+                    author="استاد",
+                    sent_at="1403/01/01",
+                ),
+            )
+            for index in range(4)
+        ]
+
+    def at(self, seconds: float):
+        return mock.patch(
+            "django.utils.timezone.now",
+            return_value=self.now + timedelta(seconds=seconds),
+        )
+
+    async def create(
+        self, chat_id: str, messages: list, seconds: float = 0
+    ) -> list:
+        with self.at(seconds):
+            return await sync_to_async(create_deliveries)(
+                messages=messages, chat_id=chat_id
+            )
+
+    async def claim(self, seconds: float, limit: int = 10) -> set[int]:
+        with self.at(seconds):
+            deliveries = await claim_deliveries(limit=limit)
+        return {delivery.message_id for delivery in deliveries}
+
+    async def test_skip_locked(self):
+        (first,) = await self.create("1", self.messages[:1])
+        (second,) = await self.create("2", self.messages[1:2])
+        with lock_delivery(first.pk):
+            self.assertEqual(await self.claim(60), {second.message_id})
+        self.assertEqual(await self.claim(60), {first.message_id})
+
+    async def test_lease_expiry(self):
+        (delivery,) = await self.create("1", self.messages[:1])
+        self.assertEqual(await self.claim(60), {delivery.message_id})
+        # The dispatcher died while sending it
+        lease = constants.NOTIFICATION_CLAIM_LEASE_SECONDS
+        self.assertEqual(await self.claim(60 + lease - 1), set())
+        self.assertEqual(
+            await self.claim(60 + lease + 1), {delivery.message_id}
+        )
+        delivery = await PublicMessageDelivery.objects.aget(pk=delivery.pk)
+        self.assertEqual(delivery.attempts, 2)
+
+    async def test_debounced_deliveries_of_chat(self):
+        (due,) = await self.create("1", self.messages[:1])
+        debounced = await self.create("1", self.messages[1:3], seconds=60)
+        await self.create("2", self.messages[3:], seconds=60)
+        # Only the first is due, and it brings the others of its chat
+        self.assertEqual(
+            await self.claim(60, limit=1),
+            {due.message_id} | {delivery.message_id for delivery in debounced},
+        )
+
+    async def test_retry_backoff(self):
+        sent, failed = await self.create("1", self.messages[:2])
+        backoff = constants.NOTIFICATION_RETRY_BACKOFF_SECONDS
+        retried_at = 60
+        for attempt in range(1, 4):
+            with self.at(retried_at):
+                deliveries = await claim_deliveries(limit=10)
+                await complete_deliveries(
+                    deliveries=deliveries, sent_message_ids={sent.message_id}
+                )
+            retried_at += backoff * 2 ** (attempt - 1)
+            delivery = await PublicMessageDelivery.objects.aget(pk=failed.pk)
+            self.assertEqual(delivery.attempts, attempt)
+            self.assertEqual(
+                delivery.next_attempt_at,
+                self.now + timedelta(seconds=retried_at),
+            )
+        self.assertFalse(
+            await PublicMessageDelivery.objects.filter(pk=sent.pk).aexists()
+        )
+        message = await PublicMessage.objects.aget(pk=sent.message_id)
+        self.assertTrue(message.is_sent)
+
+    async def test_drop_after_max_attempts(self):
+        (delivery,) = await self.create("1", self.messages[:1])
+        await PublicMessageDelivery.objects.filter(pk=delivery.pk).aupdate(
+            attempts=constants.NOTIFICATION_MAX_ATTEMPTS - 1
+        )
+        with self.at(60), self.assertLogs("lms_public.services.outbox"):
+            deliveries = await claim_deliveries(limit=10)
+            await complete_deliveries(
+                deliveries=deliveries, sent_message_ids=set()
+            )
+        self.assertFalse(await PublicMessageDelivery.objects.aexists())
+        message = await PublicMessage.objects.aget(pk=delivery.message_id)
+        self.assertFalse(message.is_sent)
+
+
+class MoveMessagesToWallItemsTests(TransactionTestCase):
+    """Migration 0008, from the messages of each user to wall items shared
+    by the users of a course page
+    """
+
+    migrate_from = [("lms_public", "0007_wallitem")]
+    migrate_to = [("lms_public", "0008_move_messages_to_wall_items")]
+
+    def migrate(self, targets) -> MigrationExecutor:
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor
+
+    def setUp(self):
+        executor = self.migrate(self.migrate_from)
+        self.addCleanup(self.migrate_to_latest)
+        old_apps = executor.loader.project_state(self.migrate_from).apps
+        LMSUser = old_apps.get_model("common", "LMSUser")
+        LMSCourse = old_apps.get_model("lms_public", "LMSCourse")
+        PublicMessage = old_apps.get_model("lms_public", "PublicMessage")
+
+        courses = [
+            LMSCourse.objects.create(
+                user=LMSUser.objects.create(username=username, password="p"),
+                name="ریاضی ۱",
+                suffix_url="/group/1",
+            )
+            for username in ("4001", "4002")
+        ]
+        edited = dict(header="متن پیام تغییر کرد.")
+        # The versions of an item as each user got them, in order: an
+        # edit, then its revert. The second user joined after the edit,
+        # so got its first version with another header.
+        self.versions = [
+            (0, "کلاس تشکیل نمی‌شود.", dict()),
+            (0, "کلاس تشکیل می‌شود.", edited),
+            (1, "کلاس تشکیل می‌شود.", dict()),
+            (0, "کلاس تشکیل نمی‌شود.", edited),
+            (1, "کلاس تشکیل نمی‌شود.", edited),
+        ]
+        self.message_pks = [
+            PublicMessage.objects.create(
+                user_id=courses[user].user_id,
+                lms_course=courses[user],
+                item_id="101",
+                author="استاد",
+                sent_at="1403/01/10 08:00",
+                text=text,
+                content_hash=str(len(text)),
+                **header,
+            ).pk
+            for user, text, header in self.versions
+        ]
+        executor = self.migrate(self.migrate_to)
+        self.apps = executor.loader.project_state(self.migrate_to).apps
+
+    def migrate_to_latest(self):
+        executor = MigrationExecutor(connection)
+        self.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_versions_shared_by_users(self):
+        WallItem = self.apps.get_model("lms_public", "WallItem")
+        PublicMessage = self.apps.get_model("lms_public", "PublicMessage")
+        wall_items = list(WallItem.objects.order_by("pk"))
+        self.assertEqual(
+            [(item.text, item.header) for item in wall_items],
+            [
+                ("کلاس تشکیل نمی‌شود.", ""),
+                ("کلاس تشکیل می‌شود.", "متن پیام تغییر کرد."),
+                ("کلاس تشکیل نمی‌شود.", "متن پیام تغییر کرد."),
+            ],
+        )
+        wall_item_pks = dict(
+            PublicMessage.objects.values_list("pk", "wall_item_id")
+        )
+        self.assertEqual(
+            [wall_item_pks[pk] for pk in self.message_pks],
+            [wall_items[index].pk for index in (0, 1, 1, 2, 2)],
+        )